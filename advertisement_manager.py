@@ -19,12 +19,19 @@ Advertisement Manager Module
 
 import logging
 import json
+import os
 import random
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from enum import Enum
+from contextlib import contextmanager
 import sqlite3
+from db_migrations import migrate
+from database import get_shared_batcher, get_shared_pool
+from db_retry import begin_immediate
+from cache_invalidation import get_invalidator
+from performance_optimizer import cached
 
 logger = logging.getLogger(__name__)
 
@@ -102,70 +109,51 @@ class AdvertisementManager:
         """
         self.db_file = db_file
         self.config = AdDisplayConfig()
+        self.pool = get_shared_pool(db_file)
+        self.batcher = get_shared_batcher(db_file)
         
         # 初始化数据库表
         self._init_database()
         
+        # 任何进程修改广告后清空有效广告缓存
+        self.invalidator = get_invalidator(db_file)
+        self.invalidator.subscribe('advertisements', self._get_active_ad_rows.clear_cache)
+        
         logger.info("广告管理器初始化完成")
     
+    @contextmanager
+    def _connect(self):
+        """从进程级共享连接池借出连接，正常退出时提交，出现异常时回滚"""
+        with self.pool.connection() as conn:
+            conn.row_factory = None
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    @contextmanager
+    def _transaction(self, site: str):
+        """
+        写事务：以 BEGIN IMMEDIATE 获取写锁（锁竞争时退避重试），
+        正常退出时提交，出现异常时回滚并重新抛出
+        """
+        with self.pool.connection() as conn:
+            conn.row_factory = None
+            begin_immediate(conn, site)
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
     def _init_database(self):
         """初始化数据库表"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                
-                # 广告表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS advertisements (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL,
-                        type TEXT NOT NULL,
-                        position TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        url TEXT,
-                        button_text TEXT,
-                        media_path TEXT,
-                        priority INTEGER DEFAULT 1,
-                        weight INTEGER DEFAULT 1,
-                        status TEXT DEFAULT 'draft',
-                        start_date TIMESTAMP,
-                        end_date TIMESTAMP,
-                        max_displays INTEGER,
-                        display_count INTEGER DEFAULT 0,
-                        click_count INTEGER DEFAULT 0,
-                        created_by INTEGER DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        tags TEXT,
-                        target_content_types TEXT
-                    )
-                ''')
-                
-                # 广告展示记录表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS ad_display_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        ad_id INTEGER,
-                        submission_id INTEGER,
-                        channel_message_id INTEGER,
-                        position TEXT,
-                        displayed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        user_clicked BOOLEAN DEFAULT FALSE,
-                        clicked_at TIMESTAMP,
-                        FOREIGN KEY (ad_id) REFERENCES advertisements (id)
-                    )
-                ''')
-                
-                # 广告配置表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS ad_config (
-                        id INTEGER PRIMARY KEY,
-                        config_data TEXT NOT NULL,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                conn.commit()
+            with self._connect() as conn:
+                migrate(conn)
                 logger.info("广告数据库表初始化完成")
                 
         except Exception as e:
@@ -183,7 +171,7 @@ class AdvertisementManager:
             int: 新创建的广告ID
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._transaction('AdvertisementManager.create_advertisement') as conn:
                 cursor = conn.cursor()
                 
                 # 设置创建时间
@@ -208,7 +196,6 @@ class AdvertisementManager:
                 ))
                 
                 ad_id = cursor.lastrowid
-                conn.commit()
                 
                 logger.info(f"创建广告成功: {ad.name} (ID: {ad_id})")
                 return ad_id
@@ -240,7 +227,7 @@ class AdvertisementManager:
             values = list(updates.values())
             values.append(ad_id)
             
-            with sqlite3.connect(self.db_file) as conn:
+            with self._transaction('AdvertisementManager.update_advertisement') as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute(f'''
@@ -249,8 +236,6 @@ class AdvertisementManager:
                     WHERE id = ?
                 ''', values)
                 
-                conn.commit()
-                
                 if cursor.rowcount > 0:
                     logger.info(f"更新广告成功: ID {ad_id}")
                     return True
@@ -273,11 +258,10 @@ class AdvertisementManager:
             bool: 是否删除成功
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._transaction('AdvertisementManager.delete_advertisement') as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('DELETE FROM advertisements WHERE id = ?', (ad_id,))
-                conn.commit()
                 
                 if cursor.rowcount > 0:
                     logger.info(f"删除广告成功: ID {ad_id}")
@@ -301,7 +285,7 @@ class AdvertisementManager:
             Advertisement: 广告对象
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('SELECT * FROM advertisements WHERE id = ?', (ad_id,))
@@ -333,8 +317,14 @@ class AdvertisementManager:
         Returns:
             List[Advertisement]: 广告列表
         """
+        rows = self._get_advertisement_rows(status, position, ad_type, active_only)
+        return [self._dict_to_advertisement(row) for row in rows]
+    
+    def _get_advertisement_rows(self, status: Optional[AdStatus], position: Optional[AdPosition],
+                                ad_type: Optional[AdType], active_only: bool) -> List[Dict[str, Any]]:
+        """查询广告表，返回 列名 -> 值 的字典列表（参数同 get_advertisements）"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # 构建查询条件
@@ -368,14 +358,30 @@ class AdvertisementManager:
                 query = f'SELECT * FROM advertisements WHERE {where_clause} ORDER BY priority DESC, weight DESC'
                 
                 cursor.execute(query, params)
-                rows = cursor.fetchall()
+                columns = [col[0] for col in cursor.description]
                 
-                return [self._row_to_advertisement(row, cursor.description) for row in rows]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
                 
         except Exception as e:
             logger.error(f"获取广告列表失败: {e}")
             return []
     
+    @cached(ttl=60, stale_ttl=30, namespace='ads',
+            key_func=lambda self, position: f"{os.path.abspath(self.db_file)}|{position.value}")
+    def _get_active_ad_rows(self, position: AdPosition) -> List[Dict[str, Any]]:
+        """
+        获取某个位置当前有效的广告行（缓存）
+        
+        投放时间窗口由缓存TTL兜底，广告本身的增删改通过 cache_versions 立即失效；
+        缓存过期后先返回旧列表并在后台刷新，发布高峰期不会同时查询数据库。
+        缓存的是数据库行（普通字典），可以写入跨进程共享的磁盘缓存。
+        """
+        return self._get_advertisement_rows(None, position, None, True)
+    
+    def _get_active_ads(self, position: AdPosition) -> List[Advertisement]:
+        """获取某个位置当前有效的广告"""
+        return [self._dict_to_advertisement(row) for row in self._get_active_ad_rows(position)]
+    
     def select_ads_for_content(self, 
                               content_type: str = None,
                               target_positions: List[AdPosition] = None) -> Dict[AdPosition, List[Advertisement]]:
@@ -395,10 +401,13 @@ class AdvertisementManager:
         target_positions = target_positions or list(AdPosition)
         result = {}
         
+        # 同步检查其他进程对广告的修改，有修改时清空缓存
+        self.invalidator.check()
+        
         try:
             for position in target_positions:
                 # 获取该位置的有效广告
-                ads = self.get_advertisements(position=position, active_only=True)
+                ads = self._get_active_ads(position)
                 
                 # 按内容类型过滤
                 if content_type:
@@ -647,26 +656,26 @@ class AdvertisementManager:
         Returns:
             bool: 是否记录成功
         """
+        def write(conn):
+            # 记录展示日志
+            cursor = conn.execute('''
+                INSERT INTO ad_display_logs (ad_id, submission_id, channel_message_id, position)
+                VALUES (?, ?, ?, ?)
+            ''', (ad_id, submission_id, channel_message_id, position.value if position else None))
+            
+            # 更新广告展示计数
+            conn.execute('''
+                UPDATE advertisements 
+                SET display_count = display_count + 1 
+                WHERE id = ?
+            ''', (ad_id,))
+            return cursor.lastrowid
+        
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                
-                # 记录展示日志
-                cursor.execute('''
-                    INSERT INTO ad_display_logs (ad_id, submission_id, channel_message_id, position)
-                    VALUES (?, ?, ?, ?)
-                ''', (ad_id, submission_id, channel_message_id, position.value if position else None))
-                
-                # 更新广告展示计数
-                cursor.execute('''
-                    UPDATE advertisements 
-                    SET display_count = display_count + 1 
-                    WHERE id = ?
-                ''', (ad_id,))
-                
-                conn.commit()
-                logger.debug(f"记录广告展示: ID {ad_id}")
-                return True
+            # 展示记录在发布高峰期集中写入，交给批处理器组提交
+            self.batcher.submit(write).result()
+            logger.debug(f"记录广告展示: ID {ad_id}")
+            return True
                 
         except Exception as e:
             logger.error(f"记录广告展示失败: {e}")
@@ -684,7 +693,7 @@ class AdvertisementManager:
             bool: 是否记录成功
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._transaction('AdvertisementManager.record_ad_click') as conn:
                 cursor = conn.cursor()
                 
                 # 更新展示日志
@@ -702,7 +711,6 @@ class AdvertisementManager:
                     WHERE id = ?
                 ''', (ad_id,))
                 
-                conn.commit()
                 logger.debug(f"记录广告点击: ID {ad_id}")
                 return True
                 
@@ -721,7 +729,7 @@ class AdvertisementManager:
             Dict: 统计信息
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 if ad_id:
@@ -791,7 +799,7 @@ class AdvertisementManager:
             self.config = config
             
             # 保存到数据库
-            with sqlite3.connect(self.db_file) as conn:
+            with self._transaction('AdvertisementManager.update_config') as conn:
                 cursor = conn.cursor()
                 
                 config_data = json.dumps(asdict(config), default=str)
@@ -800,8 +808,6 @@ class AdvertisementManager:
                     VALUES (1, ?, CURRENT_TIMESTAMP)
                 ''', (config_data,))
                 
-                conn.commit()
-                
             logger.info("广告配置更新成功")
             return True
             
@@ -817,7 +823,7 @@ class AdvertisementManager:
             bool: 是否加载成功
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('SELECT config_data FROM ad_config WHERE id = 1')
@@ -859,7 +865,19 @@ class AdvertisementManager:
             Advertisement: 广告对象
         """
         # 创建字段名到值的映射
-        data = dict(zip([col[0] for col in description], row))
+        return self._dict_to_advertisement(dict(zip([col[0] for col in description], row)))
+    
+    def _dict_to_advertisement(self, row: Dict[str, Any]) -> Advertisement:
+        """
+        将 列名 -> 值 的字典转换为Advertisement对象（不修改传入的字典，它可能来自缓存）
+        
+        Args:
+            row: 数据库行
+            
+        Returns:
+            Advertisement: 广告对象
+        """
+        data = dict(row)
         
         # 转换枚举字段
         data['type'] = AdType(data['type'])
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+权限检查服务
+Authorization Service
+
+每个命令和回调都要检查权限，检查过程不能访问数据库：
+- 配置文件中的超级管理员列表只解析一次
+- dynamic_admins 表缓存在内存中
+- 只有 dynamic_admins 表变更时才重新加载（见 cache_invalidation），
+  包括本进程和其他机器人进程的写入
+
+同一进程内每个数据库文件只有一个服务实例（get_authorization_service）。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional
+
+from cache_invalidation import get_invalidator
+from db_migrations import migrate
+from db_retry import BUSY_TIMEOUT_MS, configure_connection
+
+logger = logging.getLogger(__name__)
+
+class AuthorizationService:
+    """
+    权限检查服务
+    Authorization Service
+    """
+
+    def __init__(self, db_file: str, super_admins: Iterable[int]):
+        """
+        初始化权限检查服务
+
+        Args:
+            db_file: 数据库文件路径
+            super_admins: 配置文件中的超级管理员ID
+        """
+        self.db_file = db_file
+        self.super_admins = frozenset(super_admins)
+
+        self._dynamic_admins: Optional[Dict[int, str]] = None   # user_id -> 权限级别
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        # 新数据库上还没有 dynamic_admins 表
+        migrate(self._connection())
+
+        self._invalidator = get_invalidator(db_file)
+        self._invalidator.subscribe('dynamic_admins', self.invalidate)
+
+    def invalidate(self):
+        """使动态管理员缓存失效，下次检查时重新加载"""
+        with self._lock:
+            self._dynamic_admins = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """专用于加载管理员的连接"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False,
+                                         timeout=BUSY_TIMEOUT_MS / 1000)
+            configure_connection(self._conn)
+        return self._conn
+
+    def _get_dynamic_admins(self) -> Dict[int, str]:
+        """获取动态管理员（缓存有效时不读取表）"""
+        # 回调会获取 self._lock，必须在加锁之前检查
+        self._invalidator.check()
+        with self._lock:
+            try:
+                if self._dynamic_admins is None:
+                    rows = self._connection().execute('''
+                        SELECT user_id, permissions FROM dynamic_admins WHERE is_active = TRUE
+                    ''').fetchall()
+                    self._dynamic_admins = {user_id: permissions or 'basic' for user_id, permissions in rows}
+                return self._dynamic_admins
+            except sqlite3.Error as e:
+                # 数据库暂时不可用时沿用上一次加载的结果
+                logger.error(f"加载动态管理员失败: {e}")
+                return self._dynamic_admins or {}
+
+    def is_super_admin(self, user_id: int) -> bool:
+        """检查用户是否为超级管理员（配置文件中的管理员）"""
+        return user_id in self.super_admins
+
+    def is_admin(self, user_id: int) -> bool:
+        """检查用户是否为管理员（包括动态管理员）"""
+        return user_id in self.super_admins or user_id in self._get_dynamic_admins()
+
+    def get_admin_level(self, user_id: int) -> str:
+        """获取管理员级别：super、动态管理员的权限级别或 none"""
+        if user_id in self.super_admins:
+            return "super"
+        return self._get_dynamic_admins().get(user_id, "none")
+
+    def close(self):
+        """关闭专用连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# 同一进程内按数据库文件共享的权限检查服务
+_services: Dict[str, AuthorizationService] = {}
+_services_lock = threading.Lock()
+
+def get_authorization_service(db_file: str, super_admins: Iterable[int]) -> AuthorizationService:
+    """获取（必要时创建）指定数据库文件的进程级权限检查服务，超级管理员列表以最新配置为准"""
+    key = os.path.abspath(db_file)
+    super_admins = frozenset(super_admins)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = AuthorizationService(db_file, super_admins)
+            _services[key] = service
+        elif service.super_admins != super_admins:
+            service.super_admins = super_admins
+        return service
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数据库微基准测试
+Database Micro-benchmarks
+
+对 DatabaseManager 和 AdvertisementManager 的每个公开方法计时，
+分别在 1k、100k、1M 条投稿的数据库上运行，观察调用耗时随数据量的变化：
+
+- 种子数据库按数据量和结构版本缓存在 benchmarks/.seed/ 中，每次运行复制一份使用
+- 每个方法预热后重复调用，记录 p50、p95 和每秒调用次数（单个方法有时间上限）
+- 结果追加到历史文件（JSON），并与最近几次运行的中位数比较，标出变慢的方法
+
+注意 get_config 和 select_ads_for_content 带有进程内缓存，测到的主要是缓存命中。
+
+用法:
+    python benchmarks/db_bench.py                          # 1k、100k、1M
+    python benchmarks/db_bench.py --sizes 1000 --only get_user_stats,get_global_stats
+    python benchmarks/db_bench.py --fail-on-regression     # 有回退时返回非零
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advertisement_manager import (
+    AdDisplayConfig, AdPosition, AdStatus, AdType, Advertisement, AdvertisementManager
+)
+from database import DatabaseManager, close_shared_pool
+from db_migrations import LATEST_VERSION
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED_DIR = os.path.join(BENCH_DIR, '.seed')
+DEFAULT_HISTORY = os.path.join(BENCH_DIR, 'results', 'db_bench_history.json')
+
+# 种子数据中的广告数
+SEED_ADS = 20
+
+@dataclass
+class Benchmark:
+    """一个被测方法"""
+    name: str
+    func: Callable[..., Any]                                     # func(ctx, *args)
+    prepare: Optional[Callable[['BenchContext', int], List[tuple]]] = None   # 生成每次调用的参数（不计时）
+
+class BenchContext:
+    """
+    一次运行中被测对象和种子数据信息
+    Benchmark Context
+    """
+
+    def __init__(self, db_file: str, size: int):
+        self.db_file = db_file
+        self.size = size
+        self.db = DatabaseManager(db_file)
+        self.ads = AdvertisementManager(db_file)
+        self.rng = random.Random(size)
+        self.users = max(10, size // 20)
+
+        with self.db.connection() as conn:
+            self.max_id = conn.execute('SELECT MAX(id) FROM submissions').fetchone()[0] or 0
+            self.ad_ids = [row[0] for row in conn.execute('SELECT id FROM advertisements')]
+            self.pending_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM submissions WHERE status = 'pending' LIMIT 1000")]
+            self.display_ids = [row[0] for row in conn.execute(
+                'SELECT id FROM ad_display_logs ORDER BY id DESC LIMIT 1000')]
+
+    def user_id(self) -> int:
+        return 100000 + self.rng.randrange(self.users)
+
+    def submission_id(self) -> int:
+        return self.rng.randint(1, self.max_id)
+
+    def insert_submissions(self, count: int, status: str) -> List[tuple]:
+        """插入指定状态的投稿，返回 [(id,), ...] 作为写操作的参数"""
+        with self.db.transaction('benchmark.prepare') as conn:
+            return [
+                conn.execute('''
+                    INSERT INTO submissions (user_id, username, content_type, content, status)
+                    VALUES (?, 'bench', 'text', 'benchmark', ?)
+                    RETURNING id
+                ''', (self.user_id(), status)).fetchone()
+                for _ in range(count)
+            ]
+
+    def close(self):
+        close_shared_pool(self.db_file)
+
+def _repeat(make: Callable[['BenchContext'], tuple]):
+    """生成 count 组参数"""
+    return lambda ctx, count: [make(ctx) for _ in range(count)]
+
+def _fresh(status: str):
+    return lambda ctx, count: ctx.insert_submissions(count, status)
+
+def _bench_ad(ctx: BenchContext, n: int) -> Advertisement:
+    return Advertisement(
+        id=0, name=f'bench-{n}', type=AdType.TEXT, position=AdPosition.AFTER_CONTENT,
+        content='基准测试广告', status=AdStatus.ACTIVE, weight=1 + n % 5
+    )
+
+def _created_ads(ctx: BenchContext, count: int) -> List[tuple]:
+    return [(ctx.ads.create_advertisement(_bench_ad(ctx, n)),) for n in range(count)]
+
+BENCHMARKS: List[Benchmark] = [
+    # DatabaseManager: 投稿
+    Benchmark('add_submission', lambda ctx, user_id: ctx.db.add_submission(
+        user_id, f'user{user_id}', 'text', '基准测试投稿'), _repeat(lambda ctx: (ctx.user_id(),))),
+    Benchmark('get_pending_submissions', lambda ctx: ctx.db.get_pending_submissions()),
+    Benchmark('next_pending', lambda ctx, after_id: ctx.db.next_pending(after_id, limit=5),
+              _repeat(lambda ctx: (ctx.rng.choice(ctx.pending_ids) if ctx.pending_ids else None,))),
+    Benchmark('count_pending', lambda ctx: ctx.db.count_pending()),
+    Benchmark('claim_next_pending', lambda ctx, reviewer: ctx.db.claim_next_pending(reviewer),
+              _repeat(lambda ctx: (ctx.rng.randrange(50),))),
+    Benchmark('approve_submission', lambda ctx, sid: ctx.db.approve_submission(sid, 1), _fresh('pending')),
+    Benchmark('reject_submission', lambda ctx, sid: ctx.db.reject_submission(sid, 1, 'benchmark'), _fresh('pending')),
+    Benchmark('mark_published', lambda ctx, sid: ctx.db.mark_published(sid), _fresh('approved')),
+    Benchmark('mark_publish_failed', lambda ctx, sid: ctx.db.mark_publish_failed(sid, 'benchmark'), _fresh('approved')),
+    Benchmark('record_publish_attempt', lambda ctx, sid: ctx.db.record_publish_attempt(sid, 'benchmark'),
+              _fresh('approved')),
+    Benchmark('get_submission_by_id', lambda ctx, sid: ctx.db.get_submission_by_id(sid),
+              _repeat(lambda ctx: (ctx.submission_id(),))),
+    Benchmark('get_approved_submissions', lambda ctx: ctx.db.get_approved_submissions()),
+    Benchmark('get_user_stats', lambda ctx, user_id: ctx.db.get_user_stats(user_id),
+              _repeat(lambda ctx: (ctx.user_id(),))),
+    Benchmark('get_global_stats', lambda ctx: ctx.db.get_global_stats()),
+
+    # DatabaseManager: 用户和管理员
+    Benchmark('ban_user', lambda ctx, user_id: ctx.db.ban_user(user_id, 1), _repeat(lambda ctx: (ctx.user_id(),))),
+    Benchmark('unban_user', lambda ctx, user_id: ctx.db.unban_user(user_id, 1), _repeat(lambda ctx: (ctx.user_id(),))),
+    Benchmark('is_user_banned', lambda ctx, user_id: ctx.db.is_user_banned(user_id),
+              _repeat(lambda ctx: (ctx.user_id(),))),
+    Benchmark('add_dynamic_admin', lambda ctx, user_id: ctx.db.add_dynamic_admin(user_id, 'bench', 'basic', 1),
+              _repeat(lambda ctx: (ctx.rng.randrange(1000),))),
+    Benchmark('remove_dynamic_admin', lambda ctx, user_id: ctx.db.remove_dynamic_admin(user_id, 1),
+              _repeat(lambda ctx: (ctx.rng.randrange(1000),))),
+    Benchmark('get_dynamic_admins', lambda ctx: ctx.db.get_dynamic_admins()),
+    Benchmark('is_dynamic_admin', lambda ctx, user_id: ctx.db.is_dynamic_admin(user_id),
+              _repeat(lambda ctx: (ctx.rng.randrange(1000),))),
+    Benchmark('get_admin_permissions', lambda ctx, user_id: ctx.db.get_admin_permissions(user_id),
+              _repeat(lambda ctx: (ctx.rng.randrange(1000),))),
+
+    # DatabaseManager: 配置和机器人状态
+    Benchmark('set_config', lambda ctx, n: ctx.db.set_config(f'bench_{n}', str(n), 1),
+              _repeat(lambda ctx: (ctx.rng.randrange(100),))),
+    Benchmark('get_config', lambda ctx, n: ctx.db.get_config(f'bench_{n}'),
+              _repeat(lambda ctx: (ctx.rng.randrange(100),))),
+    Benchmark('update_bot_status', lambda ctx, n: ctx.db.update_bot_status(f'bot{n}', 'running'),
+              _repeat(lambda ctx: (ctx.rng.randrange(3),))),
+    Benchmark('get_bot_status', lambda ctx, n: ctx.db.get_bot_status(f'bot{n}'),
+              _repeat(lambda ctx: (ctx.rng.randrange(3),))),
+    Benchmark('increment_restart_count', lambda ctx, n: ctx.db.increment_restart_count(f'bot{n}'),
+              _repeat(lambda ctx: (ctx.rng.randrange(3),))),
+
+    # AdvertisementManager
+    Benchmark('create_advertisement', lambda ctx, n: ctx.ads.create_advertisement(_bench_ad(ctx, n)),
+              _repeat(lambda ctx: (ctx.rng.randrange(1000),))),
+    Benchmark('update_advertisement', lambda ctx, ad_id: ctx.ads.update_advertisement(ad_id, {'weight': 3}),
+              _repeat(lambda ctx: (ctx.rng.choice(ctx.ad_ids),))),
+    Benchmark('delete_advertisement', lambda ctx, ad_id: ctx.ads.delete_advertisement(ad_id), _created_ads),
+    Benchmark('get_advertisement', lambda ctx, ad_id: ctx.ads.get_advertisement(ad_id),
+              _repeat(lambda ctx: (ctx.rng.choice(ctx.ad_ids),))),
+    Benchmark('get_advertisements', lambda ctx: ctx.ads.get_advertisements(active_only=True)),
+    Benchmark('select_ads_for_content', lambda ctx: ctx.ads.select_ads_for_content(
+        content_type='text', target_positions=[AdPosition.BEFORE_CONTENT, AdPosition.AFTER_CONTENT])),
+    Benchmark('format_ads_for_display', lambda ctx, ads: ctx.ads.format_ads_for_display(ads),
+              lambda ctx, count: [(ctx.ads.select_ads_for_content(content_type='text'),)] * count),
+    Benchmark('record_ad_display', lambda ctx, ad_id, sid: ctx.ads.record_ad_display(
+        ad_id, sid, 1, AdPosition.AFTER_CONTENT),
+              _repeat(lambda ctx: (ctx.rng.choice(ctx.ad_ids), ctx.submission_id()))),
+    Benchmark('record_ad_click', lambda ctx, ad_id, log_id: ctx.ads.record_ad_click(ad_id, log_id),
+              _repeat(lambda ctx: (ctx.rng.choice(ctx.ad_ids),
+                                   ctx.rng.choice(ctx.display_ids) if ctx.display_ids else None))),
+    Benchmark('get_ad_statistics', lambda ctx, ad_id: ctx.ads.get_ad_statistics(ad_id),
+              _repeat(lambda ctx: (ctx.rng.choice(ctx.ad_ids + [None]),))),
+    Benchmark('update_config', lambda ctx: ctx.ads.update_config(AdDisplayConfig())),
+    Benchmark('load_config', lambda ctx: ctx.ads.load_config()),
+]
+
+def seed_database(path: str, size: int):
+    """
+    生成种子数据库：size 条投稿（约 size/20 个用户，状态和时间分布接近实际）、
+    SEED_ADS 个广告和 size/4 条广告展示记录
+    """
+    DatabaseManager(path)  # 建表、迁移到最新版本
+
+    ads = AdvertisementManager(path)
+    positions = list(AdPosition)
+    for n in range(SEED_ADS):
+        ads.create_advertisement(Advertisement(
+            id=0, name=f'seed-{n}', type=AdType.TEXT, position=positions[n % len(positions)],
+            content=f'种子广告 {n}', status=AdStatus.ACTIVE if n % 4 else AdStatus.PAUSED,
+            priority=1 + n % 10, weight=1 + n % 3
+        ))
+    close_shared_pool(path)  # 之后用独立连接批量插入，种子文件会被重命名
+
+    users = max(10, size // 20)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('BEGIN')
+        # 时间均匀分布在最近一年；状态: 1% 待审核、0.5% 已批准、0.1% 发布失败、10% 拒绝，其余已发布
+        conn.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :size)
+            INSERT INTO submissions (user_id, username, content_type, content, media_file_id, caption,
+                                     status, submit_time, review_time, publish_time, reviewer_id)
+            SELECT user_id, 'user' || user_id, content_type,
+                   CASE WHEN content_type = 'text' THEN '种子投稿内容 ' || n END,
+                   CASE WHEN content_type != 'text' THEN 'seed-file-' || n END,
+                   CASE WHEN content_type != 'text' THEN '种子说明 ' || n END,
+                   status, submit_time,
+                   CASE WHEN status NOT IN ('pending') THEN datetime(submit_time, '+10 minutes') END,
+                   CASE WHEN status = 'published' THEN datetime(submit_time, '+11 minutes') END,
+                   CASE WHEN status NOT IN ('pending') THEN 1 END
+            FROM (
+                SELECT n,
+                       100000 + abs(random()) % :users AS user_id,
+                       CASE abs(random()) % 10 WHEN 0 THEN 'photo' WHEN 1 THEN 'photo' WHEN 2 THEN 'video'
+                            ELSE 'text' END AS content_type,
+                       CASE WHEN r < 10 THEN 'pending' WHEN r < 15 THEN 'approved' WHEN r < 16 THEN 'failed'
+                            WHEN r < 116 THEN 'rejected' ELSE 'published' END AS status,
+                       datetime('now', '-' || ((:size - n) * 31536000 / :size) || ' seconds') AS submit_time
+                FROM (SELECT n, abs(random()) % 1000 AS r FROM seq)
+            )
+        ''', {'size': size, 'users': users})
+        conn.execute('''
+            INSERT INTO users (user_id, username, submission_count, last_submission)
+            SELECT user_id, 'user' || user_id, COUNT(*), MAX(submit_time)
+            FROM submissions GROUP BY user_id
+        ''')
+        conn.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :logs)
+            INSERT INTO ad_display_logs (ad_id, submission_id, channel_message_id, position, displayed_at, user_clicked)
+            SELECT (SELECT MIN(id) FROM advertisements) + n % :ads, 1 + abs(random()) % :size, n,
+                   'after_content', datetime('now', '-' || (n % 365) || ' days'), abs(random()) % 20 = 0
+            FROM seq
+        ''', {'logs': max(1, size // 4), 'ads': SEED_ADS, 'size': size})
+        conn.commit()
+    finally:
+        conn.close()
+
+def seed_path(size: int) -> str:
+    """种子数据库路径（不存在时生成）"""
+    path = os.path.join(SEED_DIR, f'seed_v{LATEST_VERSION}_{size}.db')
+    if not os.path.exists(path):
+        os.makedirs(SEED_DIR, exist_ok=True)
+        print(f"生成 {size} 条投稿的种子数据库 ...", flush=True)
+        start = time.monotonic()
+        tmp_path = path + '.tmp'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+        seed_database(tmp_path, size)
+        # 合并 WAL 后再重命名，复制时只需要主文件
+        conn = sqlite3.connect(tmp_path)
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+        os.replace(tmp_path, path)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+        print(f"  完成，用时 {time.monotonic() - start:.1f}s", flush=True)
+    return path
+
+def run_benchmark(ctx: BenchContext, bench: Benchmark, iterations: int, max_seconds: float,
+                  warmup: int = 3) -> Dict[str, float]:
+    """重复调用一个方法并统计耗时（秒）"""
+    prepare = bench.prepare or (lambda ctx, count: [()] * count)
+    calls = prepare(ctx, iterations + warmup)
+
+    for args in calls[:warmup]:
+        bench.func(ctx, *args)
+
+    timings = []
+    deadline = time.perf_counter() + max_seconds
+    for args in calls[warmup:]:
+        start = time.perf_counter()
+        bench.func(ctx, *args)
+        timings.append(time.perf_counter() - start)
+        if start > deadline:
+            break
+
+    timings.sort()
+    return {
+        'iterations': len(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'mean': statistics.fmean(timings),
+        'ops_per_sec': len(timings) / sum(timings) if sum(timings) else 0.0,
+    }
+
+def run_size(size: int, benchmarks: List[Benchmark], iterations: int, max_seconds: float) -> Dict[str, dict]:
+    """在种子数据库的副本上运行全部方法"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='db-bench-') as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        shutil.copyfile(seed_path(size), db_file)
+        ctx = BenchContext(db_file, size)
+        try:
+            for bench in benchmarks:
+                try:
+                    results[bench.name] = run_benchmark(ctx, bench, iterations, max_seconds)
+                except Exception as e:
+                    print(f"  {bench.name} 失败: {e}")
+        finally:
+            ctx.close()
+    return results
+
+def load_history(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_history(path: str, history: List[dict]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def baseline(history: List[dict], size: int, name: str, window: int) -> Optional[float]:
+    """最近 window 次运行中该方法 p50 的中位数"""
+    values = [
+        run['results'][str(size)][name]['p50']
+        for run in history
+        if name in run.get('results', {}).get(str(size), {})
+    ][-window:]
+    return statistics.median(values) if values else None
+
+def compare(results: Dict[str, Dict[str, dict]], history: List[dict], window: int,
+            threshold: float, min_delta: float) -> List[str]:
+    """
+    打印结果并与历史基线比较
+
+    Returns:
+        List[str]: 变慢超过阈值的方法（"数据量/方法"）
+    """
+    regressions = []
+    for size, size_results in results.items():
+        print(f"\n== {int(size):,} 条投稿 ==")
+        print(f"{'方法':<28}{'p50':>10}{'p95':>10}{'次/秒':>10}{'基线p50':>10}{'变化':>9}")
+        for name, r in size_results.items():
+            base = baseline(history, int(size), name, window)
+            change, flag = '', ''
+            if base:
+                ratio = r['p50'] / base - 1
+                change = f"{ratio:+.0%}"
+                if ratio > threshold and r['p50'] - base > min_delta:
+                    flag = '  <-- 回退'
+                    regressions.append(f"{size}/{name}")
+            base_text = f"{base * 1000:.3f}ms" if base else '-'
+            print(f"{name:<28}{r['p50'] * 1000:>9.3f}ms{r['p95'] * 1000:>8.3f}ms"
+                  f"{r['ops_per_sec']:>10.0f}{base_text:>10}{change:>9}{flag}")
+    return regressions
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='DatabaseManager / AdvertisementManager 微基准测试')
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='投稿数量，逗号分隔')
+    parser.add_argument('--only', help='只运行这些方法，逗号分隔')
+    parser.add_argument('--iterations', type=int, default=200, help='每个方法的调用次数')
+    parser.add_argument('--max-seconds', type=float, default=5.0, help='每个方法的最长计时（秒）')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='历史结果文件（JSON）')
+    parser.add_argument('--window', type=int, default=5, help='基线取最近几次运行的中位数')
+    parser.add_argument('--threshold', type=float, default=0.25, help='p50 变慢超过该比例视为回退')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='忽略小于该值的变化（毫秒）')
+    parser.add_argument('--no-save', action='store_true', help='不写入历史文件')
+    parser.add_argument('--fail-on-regression', action='store_true', help='有回退时返回 1')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    benchmarks = BENCHMARKS
+    if args.only:
+        names = set(args.only.split(','))
+        benchmarks = [b for b in BENCHMARKS if b.name in names]
+
+    results = {}
+    for size in sizes:
+        print(f"运行 {size:,} 条投稿 ...", flush=True)
+        results[str(size)] = run_size(size, benchmarks, args.iterations, args.max_seconds)
+
+    history = load_history(args.history)
+    regressions = compare(results, history, args.window, args.threshold, args.min_delta_ms / 1000)
+
+    if not args.no_save:
+        history.append({
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'schema_version': LATEST_VERSION,
+            'results': results,
+        })
+        save_history(args.history, history)
+
+    if regressions:
+        print(f"\n⚠️ {len(regressions)} 个方法变慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1 if args.fail_on_regression else 0
+    print("\n未发现回退")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
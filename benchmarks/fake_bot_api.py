@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地模拟 Bot API 服务
+Fake Telegram Bot API Server
+
+在本机提供 Bot API 的 HTTP 接口，供压测时替代 api.telegram.org
+（机器人配置 api_base_url = http://127.0.0.1:<端口>/bot）：
+
+- getUpdates: 长轮询，返回通过 push_update() 注入的更新
+- sendMessage / sendPhoto / sendVideo 等 send*: 返回模拟消息
+- editMessageText / editMessageCaption / editMessageReplyMarkup: 返回修改后的消息
+- answerCallbackQuery、deleteWebhook 等其他方法: 返回 True
+- getMe: 返回由 token 生成的机器人用户
+
+每次调用都会通知 add_listener() 注册的回调，压测脚本据此记录消息送达时间。
+inject_error() 让之后的调用返回错误（例如 429 Too Many Requests），用于验证限流和重试。
+只支持表单和 JSON 请求体（上传文件的 multipart 请求不支持，压测使用 file_id）。
+
+单独运行:
+    python benchmarks/fake_bot_api.py --port 8081 --latency 0.05
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+# 返回消息对象的方法
+SEND_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendVideoNote', 'sendDocument', 'sendAudio',
+    'sendVoice', 'sendSticker', 'sendAnimation', 'sendLocation', 'sendContact', 'forwardMessage',
+}
+EDIT_METHODS = {'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'}
+
+# 请求中是文件 file_id 的参数
+MEDIA_FIELDS = ('photo', 'video', 'video_note', 'document', 'audio', 'voice', 'sticker', 'animation')
+
+class FakeAPIError(Exception):
+    """模拟 Bot API 返回的错误响应"""
+
+    def __init__(self, error_code: int, description: str, retry_after: Optional[int] = None):
+        super().__init__(description)
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after
+
+    def payload(self) -> dict:
+        payload = {'ok': False, 'error_code': self.error_code, 'description': self.description}
+        if self.retry_after is not None:
+            payload['parameters'] = {'retry_after': self.retry_after}
+        return payload
+
+class FakeBotAPI:
+    """
+    模拟 Bot API 服务
+    Fake Bot API
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动选择
+            latency: 每次调用（getUpdates 除外）额外等待的秒数，模拟网络往返
+        """
+        self.latency = latency
+        self.calls: Counter = Counter()                  # (token, method) -> 次数
+        self.polling = set()                             # 已经开始 getUpdates 的 token
+
+        self._updates: Dict[str, List[dict]] = {}        # token -> 未确认的更新
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._listeners: List[Callable[[str, str, dict, Any], None]] = []
+        self._faults: List[dict] = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+        handler = type('FakeBotAPIHandler', (_Handler,), {'api': self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """机器人配置使用的 api_base_url"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/bot'
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-bot-api', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止服务，正在长轮询的请求立即返回"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def add_listener(self, callback: Callable[[str, str, dict, Any], None]):
+        """
+        注册调用回调
+
+        Args:
+            callback: (token, method, params, result)，在服务线程中调用
+        """
+        self._listeners.append(callback)
+
+    def push_update(self, token: str, update: dict) -> int:
+        """
+        为机器人注入一个更新
+
+        Args:
+            token: 机器人 token
+            update: 不含 update_id 的更新，例如 {'message': {...}}
+
+        Returns:
+            int: 分配的 update_id
+        """
+        with self._condition:
+            update_id = next(self._update_ids)
+            self._updates.setdefault(token, []).append(dict(update, update_id=update_id))
+            self._condition.notify_all()
+        return update_id
+
+    def wait_for_polling(self, tokens, timeout: float = 30.0) -> bool:
+        """等待机器人开始 getUpdates"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not set(tokens) <= self.polling:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def pending(self, token: str) -> int:
+        """机器人尚未确认（未开始处理）的更新数"""
+        with self._condition:
+            return len(self._updates.get(token, []))
+
+    def inject_error(self, method: str, error_code: int = 429, description: Optional[str] = None,
+                     retry_after: Optional[int] = None, chat_id: Any = None, count: int = 1):
+        """
+        让之后 count 次匹配的调用返回错误
+
+        Args:
+            method: API 方法，例如 sendMessage
+            error_code: HTTP 状态码（429 限流、400 请求错误、403 被屏蔽、502 网关错误等）
+            description: 错误说明，默认按状态码生成
+            retry_after: 429 响应中的 retry_after（秒）
+            chat_id: 只匹配发往该聊天的调用，None 表示不限
+            count: 返回错误的次数
+        """
+        if error_code == 429 and retry_after is None:
+            retry_after = 1
+        if description is None:
+            description = (f'Too Many Requests: retry after {retry_after}' if error_code == 429
+                           else f'Error {error_code}')
+        with self._condition:
+            self._faults.append({'method': method, 'chat_id': None if chat_id is None else str(chat_id),
+                                 'error': FakeAPIError(error_code, description, retry_after), 'count': count})
+
+    def _take_fault(self, method: str, params: dict) -> Optional[FakeAPIError]:
+        with self._condition:
+            for fault in self._faults:
+                if fault['method'] == method and fault['chat_id'] in (None, str(params.get('chat_id'))):
+                    fault['count'] -= 1
+                    if fault['count'] <= 0:
+                        self._faults.remove(fault)
+                    return fault['error']
+        return None
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    def handle(self, token: str, method: str, params: dict) -> Any:
+        """执行一次 API 调用，返回 result 字段（注入的错误抛出 FakeAPIError）"""
+        self.calls[(token, method)] += 1
+
+        fault = self._take_fault(method, params)
+        if fault is not None:
+            raise fault
+        if method == 'getUpdates':
+            result = self._get_updates(token, params)
+        else:
+            if self.latency:
+                time.sleep(self.latency)
+            result = self._respond(token, method, params)
+
+        for listener in self._listeners:
+            try:
+                listener(token, method, params, result)
+            except Exception as e:
+                logger.error(f"模拟服务回调失败 ({method}): {e}")
+        return result
+
+    def _get_updates(self, token: str, params: dict) -> List[dict]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+
+        with self._condition:
+            if token not in self.polling:
+                self.polling.add(token)
+                self._condition.notify_all()
+            while True:
+                # offset 之前的更新已被确认
+                pending = [u for u in self._updates.get(token, []) if u['update_id'] >= offset]
+                self._updates[token] = pending
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0 or self._closed:
+                    return pending[:limit]
+                self._condition.wait(remaining)
+
+    def _bot_user(self, token: str) -> dict:
+        bot_id = int(token.split(':', 1)[0]) if token.split(':', 1)[0].isdigit() else 1
+        return {'id': bot_id, 'is_bot': True, 'first_name': f'bot{bot_id}', 'username': f'bot{bot_id}_bot'}
+
+    def _message(self, token: str, params: dict, message_id: Optional[int] = None) -> dict:
+        chat_id = params.get('chat_id', 0)
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        message = {
+            'message_id': message_id or self.next_message_id(),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if isinstance(chat_id, int) and chat_id > 0 else 'supergroup'},
+            'from': self._bot_user(token),
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        if 'caption' in params:
+            message['caption'] = params['caption']
+        for field in MEDIA_FIELDS:
+            if field in params:
+                file = {'file_id': params[field], 'file_unique_id': params[field][:32]}
+                message[field] = [dict(file, width=1, height=1)] if field == 'photo' else file
+        if 'reply_markup' in params:
+            markup = params['reply_markup']
+            message['reply_markup'] = json.loads(markup) if isinstance(markup, str) else markup
+        return message
+
+    def _respond(self, token: str, method: str, params: dict) -> Any:
+        if method == 'getMe':
+            return dict(self._bot_user(token), can_join_groups=True,
+                        can_read_all_group_messages=False, supports_inline_queries=False)
+        if method == 'deleteWebhook' and str(params.get('drop_pending_updates')).lower() == 'true':
+            with self._condition:
+                self._updates[token] = []
+            return True
+        if method in SEND_METHODS:
+            return self._message(token, params)
+        if method in EDIT_METHODS:
+            if 'inline_message_id' in params:
+                return True
+            return self._message(token, params, int(params.get('message_id') or 0) or None)
+        return True
+
+class _Handler(BaseHTTPRequestHandler):
+    # 保持连接，与真实 Bot API 一样允许客户端复用连接
+    protocol_version = 'HTTP/1.1'
+    api: FakeBotAPI = None
+
+    def do_GET(self):
+        self._dispatch(b'')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self._dispatch(self.rfile.read(length) if length else b'')
+
+    def _dispatch(self, body: bytes):
+        # 路径: /bot<token>/<method>
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+        token, method = parts[0][3:], parts[1]
+
+        content_type = self.headers.get('Content-Type', '')
+        try:
+            if content_type.startswith('application/json'):
+                params = json.loads(body or b'{}')
+            elif content_type.startswith('multipart/'):
+                self._reply(400, {'ok': False, 'error_code': 400,
+                                  'description': 'Bad Request: multipart uploads are not supported'})
+                return
+            else:
+                params = dict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+            result = self.api.handle(token, method, params)
+        except FakeAPIError as e:
+            self._reply(e.error_code, e.payload())
+            return
+        except Exception as e:
+            logger.exception(f"模拟服务处理 {method} 失败")
+            self._reply(500, {'ok': False, 'error_code': 500, 'description': str(e)})
+            return
+        self._reply(200, {'ok': True, 'result': result})
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 机器人关闭时会断开仍在长轮询的连接
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟 Bot API 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='每次调用额外等待的秒数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    api = FakeBotAPI(args.host, args.port, args.latency)
+    api.start()
+    print(f"模拟 Bot API 已启动，api_base_url = {api.base_url}")
+    try:
+        while True:
+            time.sleep(60)
+            print(', '.join(f"{method}: {n}" for (_, method), n in sorted(api.calls.items())))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+端到端压测
+End-to-end Load Test
+
+在临时目录中生成配置，把投稿机器人和发布机器人（独立进程，与生产部署相同）
+指向本地模拟 Bot API（benchmarks/fake_bot_api.py），然后按固定速率注入投稿：
+
+1. 向投稿机器人注入私聊消息（文字或图片），内容带有编号标记
+2. 审核卡片送达审核群时记录"投稿 -> 审核卡片"延迟
+3. 按 --approve-ratio 向发布机器人注入批准或拒绝回调，
+   记录"回调 -> 频道发布"和"回调 -> 审核结果"延迟
+
+输出吞吐量（审核卡片/秒）和各段延迟的 p50/p95/p99。
+其他性能改动都应该在这个压测下对比前后结果。
+
+用法:
+    python benchmarks/load_test.py --rate 20 --duration 30
+    python benchmarks/load_test.py --rate 50 --duration 60 --photo-ratio 0.5 --latency 0.05 --json result.json
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUBMISSION_TOKEN = '1001:load-test-submission'
+PUBLISH_TOKEN = '1002:load-test-publish'
+ADMIN_TOKEN = '1003:load-test-admin'
+CHANNEL_ID = -1001
+REVIEW_GROUP_ID = -1002
+ADMIN_GROUP_ID = -1003
+ADMIN_USER_ID = 42
+
+MARKER = re.compile(r'bench-(\d+)')
+SUBMISSION_ID = re.compile(r'#(\d+)')
+
+CONFIG_TEMPLATE = """[telegram]
+submission_bot_token = {submission_token}
+publish_bot_token = {publish_token}
+admin_bot_token = {admin_token}
+api_base_url = {api_base_url}
+channel_id = {channel_id}
+admin_group_id = {admin_group_id}
+review_group_id = {review_group_id}
+admin_users = {admin_user_id}
+
+[database]
+db_file = {db_file}
+
+[settings]
+require_approval = true
+auto_publish_delay = 0
+
+[metrics]
+{metrics}
+[rate_limit]
+enabled = {rate_limit}
+"""
+
+def write_config(workdir: str, api_base_url: str, admin_users=(ADMIN_USER_ID,),
+                 metrics_ports: Optional[Dict[str, int]] = None, rate_limit: bool = False):
+    """
+    在工作目录中写入机器人使用的 config.ini
+
+    Args:
+        workdir: 工作目录（数据库也放在这里）
+        api_base_url: 模拟 Bot API 地址
+        admin_users: 管理员用户ID
+        metrics_ports: 各机器人的指标服务端口，None 表示关闭指标服务
+        rate_limit: 是否开启发送限流（审核群每分钟 20 条的限制会把吞吐量压到每分钟 20 个投稿）
+    """
+    if metrics_ports:
+        metrics = 'enabled = true\n' + ''.join(f'{bot}_port = {port}\n' for bot, port in metrics_ports.items())
+    else:
+        metrics = 'enabled = false\n'
+    with open(os.path.join(workdir, 'config.ini'), 'w', encoding='utf-8') as f:
+        f.write(CONFIG_TEMPLATE.format(
+            submission_token=SUBMISSION_TOKEN, publish_token=PUBLISH_TOKEN, admin_token=ADMIN_TOKEN,
+            api_base_url=api_base_url, channel_id=CHANNEL_ID, admin_group_id=ADMIN_GROUP_ID,
+            review_group_id=REVIEW_GROUP_ID, admin_user_id=','.join(str(u) for u in admin_users),
+            db_file=os.path.join(workdir, 'load_test.db'), metrics=metrics,
+            rate_limit=str(rate_limit).lower(),
+        ))
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """延迟摘要（毫秒）"""
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+        'max_ms': round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+class LoadTest:
+    """
+    压测过程
+    Load Test
+    """
+
+    def __init__(self, api: FakeBotAPI, photo_ratio: float, approve_ratio: float, users: int):
+        self.api = api
+        self.photo_ratio = photo_ratio
+        self.approve_ratio = approve_ratio
+        self.users = users
+
+        self.submitted: Dict[int, float] = {}        # 编号 -> 注入时间
+        self.carded: Dict[int, float] = {}           # 编号 -> 审核卡片送达时间
+        self.reviewed: Dict[int, float] = {}         # 编号 -> 回调注入时间
+        self.published: Dict[int, float] = {}        # 编号 -> 频道发布时间
+        self.review_done: Dict[int, float] = {}      # 编号 -> 审核结果（编辑卡片）时间
+        self.approved = set()
+        self._card_messages: Dict[int, int] = {}     # 卡片 message_id -> 编号
+        self._lock = threading.Lock()
+
+        api.add_listener(self.on_call)
+
+    def submit(self, n: int):
+        """向投稿机器人注入第 n 条投稿"""
+        user_id = 100000 + n % self.users
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}
+        message = {
+            'message_id': self.api.next_message_id(),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+            'from': user,
+        }
+        if random.random() < self.photo_ratio:
+            message['photo'] = [{'file_id': f'bench-photo-{n}', 'file_unique_id': f'p{n}', 'width': 800, 'height': 600}]
+            message['caption'] = f'压测图片 bench-{n}'
+        else:
+            message['text'] = f'压测投稿 bench-{n} ' + '内容' * 20
+
+        with self._lock:
+            self.submitted[n] = time.monotonic()
+        self.api.push_update(SUBMISSION_TOKEN, {'message': message})
+
+    def review(self, n: int, card: dict):
+        """对审核卡片注入批准或拒绝回调"""
+        text = card.get('text') or card.get('caption') or ''
+        match = SUBMISSION_ID.search(text)
+        if not match:
+            return
+        action = 'approve' if random.random() < self.approve_ratio else 'reject'
+        callback = {
+            'id': f'cb{n}',
+            'from': {'id': ADMIN_USER_ID, 'is_bot': False, 'first_name': 'admin'},
+            'chat_instance': 'load-test',
+            'data': f'{action}_{match.group(1)}',
+            'message': card,
+        }
+        with self._lock:
+            self._card_messages[card['message_id']] = n
+            self.reviewed[n] = time.monotonic()
+            if action == 'approve':
+                self.approved.add(n)
+        self.api.push_update(PUBLISH_TOKEN, {'callback_query': callback})
+
+    def on_call(self, token: str, method: str, params: dict, result):
+        """模拟服务的调用回调，记录消息送达时间"""
+        if token != PUBLISH_TOKEN:
+            return
+        now = time.monotonic()
+        chat_id = str(params.get('chat_id'))
+
+        if method.startswith('send') and isinstance(result, dict):
+            match = MARKER.search(params.get('text') or params.get('caption') or '')
+            if not match:
+                return
+            n = int(match.group(1))
+            if chat_id == str(REVIEW_GROUP_ID):
+                with self._lock:
+                    self.carded.setdefault(n, now)
+                if self.approve_ratio >= 0:
+                    self.review(n, result)
+            elif chat_id == str(CHANNEL_ID):
+                with self._lock:
+                    self.published.setdefault(n, now)
+
+        elif method in ('editMessageText', 'editMessageCaption'):
+            with self._lock:
+                n = self._card_messages.get(int(params.get('message_id') or 0))
+                if n is not None:
+                    self.review_done.setdefault(n, now)
+
+    def finished(self) -> bool:
+        with self._lock:
+            return (len(self.carded) >= len(self.submitted)
+                    and len(self.review_done) >= len(self.reviewed)
+                    and len(self.published) >= len(self.approved))
+
+    def report(self, duration: float) -> dict:
+        with self._lock:
+            card_latency = [self.carded[n] - self.submitted[n] for n in self.carded if n in self.submitted]
+            publish_latency = [self.published[n] - self.reviewed[n] for n in self.published if n in self.reviewed]
+            review_latency = [self.review_done[n] - self.reviewed[n] for n in self.review_done]
+            first = min(self.submitted.values(), default=0.0)
+            last = max(self.carded.values(), default=first)
+            return {
+                'submitted': len(self.submitted),
+                'review_cards': len(self.carded),
+                'published': len(self.published),
+                'missing_cards': len(self.submitted) - len(self.carded),
+                'offered_rate': round(len(self.submitted) / duration, 2) if duration else 0.0,
+                'submissions_per_sec': round(len(self.carded) / (last - first), 2) if last > first else 0.0,
+                'submission_to_card': summarize(card_latency),
+                'approve_to_publish': summarize(publish_latency),
+                'callback_to_review_result': summarize(review_latency),
+                'api_calls': {f'{token.split(":")[0]}.{method}': count
+                              for (token, method), count in sorted(self.api.calls.items())},
+            }
+
+def start_bot(script: str, workdir: str) -> subprocess.Popen:
+    """在工作目录中启动机器人进程（读取该目录下的 config.ini）"""
+    log = open(os.path.join(workdir, f'{os.path.splitext(script)[0]}.out'), 'w')
+    return subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, script)],
+        cwd=workdir, stdout=log, stderr=subprocess.STDOUT
+    )
+
+def stop_bot(process: subprocess.Popen, timeout: float = 20.0):
+    """发送 SIGINT 让机器人正常关闭，超时后强制结束"""
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def print_report(report: dict):
+    print(f"\n投稿: 注入 {report['submitted']}，审核卡片 {report['review_cards']}，"
+          f"未送达 {report['missing_cards']}，发布 {report['published']}")
+    print(f"吞吐量: {report['submissions_per_sec']} 投稿/秒（注入速率 {report['offered_rate']}/秒）")
+    for key, title in (('submission_to_card', '投稿 -> 审核卡片'),
+                       ('approve_to_publish', '批准 -> 频道发布'),
+                       ('callback_to_review_result', '回调 -> 审核结果')):
+        s = report[key]
+        print(f"{title}: n={s['count']} p50 {s['p50_ms']}ms  p95 {s['p95_ms']}ms  "
+              f"p99 {s['p99_ms']}ms  max {s['max_ms']}ms")
+    print("API 调用: " + ', '.join(f"{name}={count}" for name, count in report['api_calls'].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description='投稿/审核端到端压测（本地模拟 Bot API）')
+    parser.add_argument('--rate', type=float, default=10.0, help='每秒注入的投稿数')
+    parser.add_argument('--duration', type=float, default=20.0, help='注入持续时间（秒）')
+    parser.add_argument('--users', type=int, default=50, help='模拟投稿用户数')
+    parser.add_argument('--photo-ratio', type=float, default=0.3, help='图片投稿比例')
+    parser.add_argument('--approve-ratio', type=float, default=0.8,
+                        help='审核卡片中批准的比例，其余拒绝；设为 -1 不注入审核回调')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟 Bot API 每次调用的延迟（秒）')
+    parser.add_argument('--drain-timeout', type=float, default=30.0, help='注入结束后等待处理完成的最长时间（秒）')
+    parser.add_argument('--rate-limit', action='store_true', help='开启机器人的发送限流（默认关闭）')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--keep', action='store_true', help='保留临时目录（数据库和机器人日志）')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bot-load-test-')
+    api = FakeBotAPI(latency=args.latency)
+    api.start()
+
+    write_config(workdir, api.base_url, rate_limit=args.rate_limit)
+
+    test = LoadTest(api, args.photo_ratio, args.approve_ratio, args.users)
+    bots = [start_bot('submission_bot.py', workdir), start_bot('publish_bot.py', workdir)]
+    report: Optional[dict] = None
+    try:
+        if not api.wait_for_polling([SUBMISSION_TOKEN, PUBLISH_TOKEN], timeout=60):
+            print(f"机器人未能启动，日志见 {workdir}")
+            return 1
+        print(f"机器人已启动，注入 {args.rate}/秒 x {args.duration}s ...")
+
+        start = time.monotonic()
+        total = int(args.rate * args.duration)
+        for n in range(total):
+            # 按计划时间注入，不因处理变慢而降低注入速率
+            delay = start + n / args.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            test.submit(n)
+        elapsed = time.monotonic() - start
+
+        deadline = time.monotonic() + args.drain_timeout
+        while not test.finished() and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        report = test.report(elapsed)
+        report['config'] = vars(args)
+        print_report(report)
+    finally:
+        for bot in bots:
+            stop_bot(bot)
+        api.stop()
+        if args.keep:
+            print(f"临时目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json and report is not None:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多进程锁竞争基准测试
+Multi-process Lock Contention Benchmark
+
+模拟多个机器人进程同时写同一个数据库文件。每个写事务先读后写
+（与审核、统计等实际写路径相同），对比两种执行方式：
+
+- deferred: 原有方式，BEGIN（延迟加锁）+ 默认超时，不重试
+- immediate: DatabaseManager.transaction()，busy_timeout + BEGIN IMMEDIATE + 退避重试
+
+用法:
+    python benchmarks/lock_contention.py --processes 6 --ops 300
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, close_shared_pool
+from db_retry import get_lock_stats
+
+def _write(conn: sqlite3.Connection, worker: int, i: int):
+    """一次先读后写的事务体"""
+    conn.execute('SELECT COUNT(*) FROM submissions WHERE user_id = ?', (worker,)).fetchone()
+    conn.execute(
+        "INSERT INTO submissions (user_id, username, content_type, content) VALUES (?, ?, 'text', ?)",
+        (worker, f'worker{worker}', f'op {i}')
+    )
+
+def _deferred_worker(db_file: str, worker: int, ops: int, results):
+    conn = sqlite3.connect(db_file)
+    done = errors = 0
+    start = time.monotonic()
+    for i in range(ops):
+        try:
+            conn.execute('BEGIN')
+            _write(conn, worker, i)
+            conn.commit()
+            done += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    results.put((done, errors, time.monotonic() - start, {}))
+
+def _immediate_worker(db_file: str, worker: int, ops: int, results):
+    db = DatabaseManager(db_file)
+    done = errors = 0
+    start = time.monotonic()
+    for i in range(ops):
+        try:
+            with db.transaction('benchmark.write') as conn:
+                _write(conn, worker, i)
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put((done, errors, time.monotonic() - start, get_lock_stats().get_stats()))
+    close_shared_pool(db_file)
+
+def run(mode: str, db_file: str, processes: int, ops: int):
+    """启动多个写进程并汇总结果"""
+    target = _deferred_worker if mode == 'deferred' else _immediate_worker
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=target, args=(db_file, n, ops, results))
+        for n in range(processes)
+    ]
+
+    start = time.monotonic()
+    for p in workers:
+        p.start()
+    outcomes = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    elapsed = time.monotonic() - start
+
+    done = sum(o[0] for o in outcomes)
+    errors = sum(o[1] for o in outcomes)
+    print(f"[{mode}] {processes} 进程 x {ops} 次写入: "
+          f"成功 {done}，失败 {errors}，耗时 {elapsed:.2f}s，{done / elapsed:.0f} 次/秒")
+
+    for _, _, _, stats in outcomes:
+        for site, s in stats.items():
+            print(f"    {site}: 加锁 {s['acquisitions']} 次，等待 {s['waits']} 次，"
+                  f"平均 {s['avg_wait'] * 1000:.2f}ms，最长 {s['max_wait'] * 1000:.1f}ms，"
+                  f"重试 {s['retries']} 次，失败 {s['failures']} 次")
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程SQLite锁竞争基准测试')
+    parser.add_argument('--processes', type=int, default=6, help='写进程数')
+    parser.add_argument('--ops', type=int, default=300, help='每个进程的写事务数')
+    parser.add_argument('--mode', choices=['deferred', 'immediate', 'both'], default='both')
+    args = parser.parse_args()
+
+    modes = ['deferred', 'immediate'] if args.mode == 'both' else [args.mode]
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in modes:
+            db_file = os.path.join(tmp, f'{mode}.db')
+            DatabaseManager(db_file)  # 建表并切换到WAL模式
+            close_shared_pool(db_file)
+            run(mode, db_file, args.processes, args.ops)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+录制更新回放
+Recorded Update Replay
+
+把 update_recorder 录制的 JSONL 文件按原始时间间隔（或加速）回放给机器人，
+机器人连接本地模拟 Bot API（benchmarks/fake_bot_api.py），在临时目录的新数据库上运行。
+回放结束后从各机器人的指标服务读取处理器耗时（/perf），输出各处理器和按钮的 p50/p95/p99。
+
+- 录制中标记为管理员的（匿名化后的）用户写入临时配置的 admin_users
+- 回调数据中的投稿ID按录制开始时的最大投稿ID换算为回放数据库中的ID，
+  要求投稿机器人在同一时间段内也在录制；录制开始前已存在的投稿在回放中不存在
+- 默认不回放控制机器人（其按钮会启动、停止进程），需要时用 --bots 指定
+
+用法:
+    python benchmarks/replay.py recordings/*.jsonl
+    python benchmarks/replay.py recordings/*.jsonl --speed 10 --json replay.json
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI
+from load_test import (
+    ADMIN_TOKEN, PUBLISH_TOKEN, SUBMISSION_TOKEN, percentile, start_bot, stop_bot, write_config
+)
+
+BOTS = {
+    'submission': (SUBMISSION_TOKEN, 'submission_bot.py'),
+    'publish': (PUBLISH_TOKEN, 'publish_bot.py'),
+    'control': (ADMIN_TOKEN, 'control_bot.py'),
+}
+
+# 回调数据中携带投稿ID的按钮
+SUBMISSION_CALLBACK = re.compile(r'^((?:approve|reject|refresh|view_full|next_submission)_)(\d+)$')
+
+def load_recordings(paths: List[str], bots: List[str]):
+    """
+    读取录制文件
+
+    Returns:
+        tuple: (按时间排序的更新记录, 录制开始时的最大投稿ID或None)
+    """
+    records = []
+    base_ids = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get('type') == 'header':
+                    if record.get('max_submission_id') is not None:
+                        base_ids.append(record['max_submission_id'])
+                elif record.get('bot') in bots:
+                    records.append(record)
+    records.sort(key=lambda r: r['t'])
+    return records, (min(base_ids) if base_ids else None)
+
+def effective_user_id(update: dict) -> Optional[int]:
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get('from'), dict):
+            return value['from'].get('id')
+    return None
+
+def remap_submission_ids(update: dict, base_id: Optional[int]):
+    """把回调数据中录制时的投稿ID换算为回放数据库中的ID（回放从空数据库开始）"""
+    callback = update.get('callback_query')
+    if base_id is None or not callback or not isinstance(callback.get('data'), str):
+        return
+    match = SUBMISSION_CALLBACK.match(callback['data'])
+    if match and int(match.group(2)) > base_id:
+        callback['data'] = f'{match.group(1)}{int(match.group(2)) - base_id}'
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def fetch_perf(port: int) -> Optional[list]:
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/perf', timeout=5) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='回放录制的更新（本地模拟 Bot API）')
+    parser.add_argument('recordings', nargs='+', help='录制文件（JSONL）')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，0 表示不等待尽快回放')
+    parser.add_argument('--bots', default='submission,publish', help='回放哪些机器人的更新，逗号分隔')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟 Bot API 每次调用的延迟（秒）')
+    parser.add_argument('--settle', type=float, default=3.0, help='更新全部取走后等待处理完成的时间（秒）')
+    parser.add_argument('--rate-limit', action='store_true', help='开启机器人的发送限流（默认关闭）')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--keep', action='store_true', help='保留临时目录（数据库和机器人日志）')
+    args = parser.parse_args()
+
+    bots = [b for b in args.bots.split(',') if b in BOTS]
+    records, base_id = load_recordings(args.recordings, bots)
+    if not records:
+        print("录制文件中没有可回放的更新")
+        return 1
+    bots = [b for b in bots if any(r['bot'] == b for r in records)]
+    admins = sorted({effective_user_id(r['u']) for r in records if r.get('admin')} - {None})
+    span = records[-1]['t'] - records[0]['t']
+    print(f"{len(records)} 个更新（{', '.join(bots)}），录制时长 {span:.1f}s，管理员 {len(admins)} 个")
+
+    workdir = tempfile.mkdtemp(prefix='bot-replay-')
+    api = FakeBotAPI(latency=args.latency)
+    api.start()
+    ports = {bot: free_port() for bot in bots}
+    write_config(workdir, api.base_url, admin_users=admins or [0], metrics_ports=ports,
+                 rate_limit=args.rate_limit)
+
+    processes = [start_bot(BOTS[bot][1], workdir) for bot in bots]
+    report: Optional[dict] = None
+    try:
+        if not api.wait_for_polling([BOTS[bot][0] for bot in bots], timeout=60):
+            print(f"机器人未能启动，日志见 {workdir}")
+            return 1
+
+        lags = []
+        start = time.monotonic()
+        for record in records:
+            if args.speed > 0:
+                target = (record['t'] - records[0]['t']) / args.speed
+                delay = start + target - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                lags.append(max(0.0, time.monotonic() - start - target))
+            update = record['u']
+            remap_submission_ids(update, base_id)
+            api.push_update(BOTS[record['bot']][0], update)
+        injected = time.monotonic() - start
+
+        # 等待机器人取走全部更新，再留出处理时间
+        while any(api.pending(BOTS[bot][0]) for bot in bots):
+            time.sleep(0.1)
+        drained = time.monotonic() - start
+        time.sleep(args.settle)
+
+        report = {
+            'updates': len(records),
+            'by_bot': {bot: sum(1 for r in records if r['bot'] == bot) for bot in bots},
+            'recorded_seconds': round(span, 2),
+            'replay_seconds': round(injected, 2),
+            'drain_seconds': round(drained, 2),
+            'schedule_lag_p99_ms': round(percentile(lags, 0.99) * 1000, 1),
+            'api_calls': {f'{token.split(":")[0]}.{method}': count
+                          for (token, method), count in sorted(api.calls.items())},
+            'handlers': {bot: fetch_perf(port) for bot, port in ports.items()},
+            'config': vars(args),
+        }
+    finally:
+        for process in processes:
+            stop_bot(process)
+        api.stop()
+        if args.keep:
+            print(f"临时目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"回放 {report['updates']} 个更新用时 {report['replay_seconds']}s"
+          f"（录制 {report['recorded_seconds']}s），全部取走 {report['drain_seconds']}s，"
+          f"调度延迟 p99 {report['schedule_lag_p99_ms']}ms")
+    for bot, rows in report['handlers'].items():
+        print(f"\n[{bot}]")
+        if rows is None:
+            print("  无法读取处理器耗时")
+            continue
+        for row in rows:
+            name = row['handler'].rsplit('.', 1)[-1] + (f"[{row['action']}]" if row['action'] else '')
+            wall = row['wall']
+            print(f"  {name:<40} x{row['calls']:<6.0f} p50 {wall['p50'] * 1000:7.1f}ms  "
+                  f"p95 {wall['p95'] * 1000:7.1f}ms  p99 {wall['p99'] * 1000:7.1f}ms  "
+                  f"DB p95 {row['db']['p95'] * 1000:6.1f}ms  API p95 {row['api']['p95'] * 1000:6.1f}ms")
+    print("\nAPI 调用: " + ', '.join(f"{name}={count}" for name, count in report['api_calls'].items()))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+跨进程缓存失效模块
+Cross-process Cache Invalidation Module
+
+三个机器人是共享同一个数据库文件的独立进程，进程内缓存需要感知其他进程的写入：
+- 数据库触发器在相关表变更时递增 cache_versions 表中对应键的版本号
+- 每个进程用一个专用连接读取 PRAGMA data_version，数据库没有任何提交时不读表
+- data_version 变化后读取 cache_versions，对版本号变化的键调用订阅回调
+- 订阅同时注册为进程内数据变更监听器，本进程的写入立即生效
+
+用法:
+    invalidator = get_invalidator(db_file)
+    invalidator.subscribe('dynamic_admins', cache.clear)
+    invalidator.check()  # 读路径上同步检查；后台线程也会定期检查
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional
+
+from database import add_change_listener, remove_change_listener
+from db_retry import BUSY_TIMEOUT_MS, configure_connection
+
+logger = logging.getLogger(__name__)
+
+class CacheInvalidator:
+    """
+    缓存失效通知
+    Cache Invalidator
+    """
+
+    def __init__(self, db_file: str, poll_interval: float = 1.0):
+        """
+        初始化缓存失效通知
+
+        Args:
+            db_file: 数据库文件路径
+            poll_interval: 后台检查间隔（秒）
+        """
+        self.db_file = db_file
+        self.poll_interval = poll_interval
+
+        self._subscribers: Dict[str, List[Callable[[], None]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self._stats = {'checks': 0, 'reloads': 0, 'invalidations': 0}
+
+    def subscribe(self, key: str, callback: Callable[[], None]):
+        """
+        订阅键的变更
+
+        Args:
+            key: cache_versions 中的键（与表名相同）
+            callback: 键变更时调用的无参数函数，可能在后台线程中调用；重复订阅同一回调只登记一次
+        """
+        with self._lock:
+            callbacks = self._subscribers.setdefault(key, [])
+            if callback not in callbacks:
+                callbacks.append(callback)
+        add_change_listener(key, callback)
+        # 订阅时记录版本基线，之后其他进程的写入才能被识别为变更
+        if self._data_version is None:
+            self.check()
+        self.start()
+
+    def unsubscribe(self, key: str, callback: Callable[[], None]):
+        """取消订阅"""
+        with self._lock:
+            callbacks = self._subscribers.get(key, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+        remove_change_listener(key, callback)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False,
+                                         timeout=BUSY_TIMEOUT_MS / 1000)
+            configure_connection(self._conn)
+        return self._conn
+
+    def check(self) -> List[str]:
+        """
+        检查其他连接的写入，对版本号变化的键调用订阅回调
+
+        Returns:
+            List[str]: 本次检查发现变化的键
+        """
+        with self._lock:
+            self._stats['checks'] += 1
+            try:
+                conn = self._connection()
+                data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+                if data_version == self._data_version:
+                    return []
+
+                self._stats['reloads'] += 1
+                versions = dict(conn.execute('SELECT key, version FROM cache_versions').fetchall())
+            except sqlite3.Error as e:
+                logger.error(f"读取缓存版本失败: {e}")
+                return []
+
+            # 首次读取只记录版本号
+            first_load = self._data_version is None
+            self._data_version = data_version
+            changed = [
+                key for key, version in versions.items()
+                if not first_load and self._versions.get(key) != version
+            ]
+            self._versions = versions
+            callbacks = [(key, cb) for key in changed for cb in self._subscribers.get(key, [])]
+            self._stats['invalidations'] += len(changed)
+
+        for key, callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"缓存失效回调执行失败 ({key}): {e}")
+
+        if changed:
+            logger.debug(f"缓存失效: {', '.join(changed)}")
+        return changed
+
+    def start(self):
+        """启动后台检查线程"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='cache-invalidator', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台检查线程并关闭专用连接"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval + 1)
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._data_version = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.check()
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取检查统计"""
+        with self._lock:
+            return dict(self._stats, subscribed_keys=len(self._subscribers))
+
+# 同一进程内按数据库文件共享的缓存失效通知
+_invalidators: Dict[str, CacheInvalidator] = {}
+_invalidators_lock = threading.Lock()
+
+def get_invalidator(db_file: str) -> CacheInvalidator:
+    """获取（必要时创建）指定数据库文件的进程级缓存失效通知"""
+    key = os.path.abspath(db_file)
+    with _invalidators_lock:
+        invalidator = _invalidators.get(key)
+        if invalidator is None:
+            invalidator = CacheInvalidator(db_file)
+            _invalidators[key] = invalidator
+        return invalidator
@@ -1,7 +1,10 @@
 import configparser
+import hashlib
+import logging
 import os
 import sys
-from typing import List
+import time
+from typing import Dict, List, Optional
 
 # 修复Python模块导入路径
 def fix_import_paths():
@@ -21,10 +24,23 @@ def fix_import_paths():
 # 在模块加载时自动修复路径
 fix_import_paths()
 
+logger = logging.getLogger(__name__)
+
+# Bot API 默认地址（与 python-telegram-bot 的默认值相同）
+DEFAULT_API_BASE_URL = 'https://api.telegram.org/bot'
+
+# 各机器人指标服务的默认端口
+DEFAULT_METRICS_PORTS = {'submission': 9101, 'publish': 9102, 'control': 9103}
+
+# 权限检查服务创建失败（数据库被锁、不存在或 SQLite 版本过低）后多久重试（秒）
+AUTHORIZATION_RETRY_INTERVAL = 30
+
 class ConfigManager:
     def __init__(self, config_file: str = "config.ini"):
         self.config_file = config_file
         self.config = configparser.ConfigParser()
+        self._authorization = None
+        self._authorization_retry_at = 0.0
         self.load_config()
     
     def load_config(self):
@@ -52,6 +68,10 @@ class ConfigManager:
         """获取管理机器人token"""
         return self.config.get('telegram', 'admin_bot_token')
     
+    def get_api_base_url(self) -> str:
+        """获取 Bot API 地址（压测时可指向本地模拟服务，见 benchmarks/load_test.py）"""
+        return self.config.get('telegram', 'api_base_url', fallback=DEFAULT_API_BASE_URL)
+    
     def get_channel_id(self) -> str:
         """获取频道ID"""
         return self.config.get('telegram', 'channel_id')
@@ -73,6 +93,84 @@ class ConfigManager:
         """获取数据库文件路径"""
         return self.config.get('database', 'db_file')
     
+    def get_cache_db_file(self) -> str:
+        """获取磁盘缓存文件路径（默认与数据库文件同目录）"""
+        default = os.path.splitext(self.get_db_file())[0] + '.cache.db'
+        return self.config.get('database', 'cache_db_file', fallback=default)
+    
+    def get_metrics_host(self) -> str:
+        """获取指标服务监听地址（默认只监听本机）"""
+        return self.config.get('metrics', 'host', fallback='127.0.0.1')
+    
+    def get_metrics_port(self, bot_name: str) -> Optional[int]:
+        """
+        获取指定机器人的指标服务端口
+        
+        Args:
+            bot_name: submission、publish 或 control
+            
+        Returns:
+            Optional[int]: 端口；指标服务未启用时返回None
+        """
+        if not self.config.getboolean('metrics', 'enabled', fallback=True):
+            return None
+        return self.config.getint('metrics', f'{bot_name}_port', fallback=DEFAULT_METRICS_PORTS[bot_name])
+    
+    def get_recording_path(self, bot_name: str) -> Optional[str]:
+        """
+        获取更新录制文件路径
+        
+        Args:
+            bot_name: submission、publish 或 control
+            
+        Returns:
+            Optional[str]: JSONL 文件路径；未启用录制时返回None
+        """
+        if not self.config.getboolean('recording', 'enabled', fallback=False):
+            return None
+        return self.config.get('recording', 'path', fallback='recordings/{bot}.jsonl').format(bot=bot_name)
+    
+    def get_recording_salt(self) -> str:
+        """
+        获取用户ID匿名化使用的盐（三个机器人必须相同，同一用户才能对应起来）
+        
+        未配置时由机器人 token 派生，不会写入录制文件。
+        """
+        salt = self.config.get('recording', 'salt', fallback='')
+        if salt:
+            return salt
+        tokens = ''.join(self.config.get('telegram', key, fallback='') for key in
+                         ('submission_bot_token', 'publish_bot_token', 'admin_bot_token'))
+        return hashlib.sha256(tokens.encode('utf-8')).hexdigest()
+    
+    def get_recording_text_limit(self) -> int:
+        """录制时文字和说明保留的最大字符数"""
+        return self.config.getint('recording', 'text_limit', fallback=64)
+    
+    def get_rate_limits(self, token: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """
+        获取发送限流配置（rate_limiter.PriorityRateLimiter 的参数）
+        
+        发布机器人的 token 同时被发布机器人和投稿机器人（向审核群发送投稿）两个进程使用，
+        限流器按进程计数，因此该 token 的全局和群组速率按 publish_token_share 分配给每个进程。
+        
+        Args:
+            token: 机器人 token
+            
+        Returns:
+            Optional[Dict[str, float]]: 全局、群组、私聊速率；关闭限流时返回None
+        """
+        if not self.config.getboolean('rate_limit', 'enabled', fallback=True):
+            return None
+        share = 1.0
+        if token is not None and token == self.config.get('telegram', 'publish_bot_token', fallback=None):
+            share = self.config.getfloat('rate_limit', 'publish_token_share', fallback=0.5)
+        return {
+            'global_per_second': self.config.getfloat('rate_limit', 'global_per_second', fallback=30.0) * share,
+            'group_per_minute': self.config.getfloat('rate_limit', 'group_per_minute', fallback=20.0) * share,
+            'chat_per_second': self.config.getfloat('rate_limit', 'chat_per_second', fallback=1.0),
+        }
+    
     def require_approval(self) -> bool:
         """是否需要管理员审核"""
         return self.config.getboolean('settings', 'require_approval')
@@ -81,35 +179,37 @@ class ConfigManager:
         """获取自动发布延迟时间"""
         return self.config.getint('settings', 'auto_publish_delay')
     
+    @property
+    def authorization(self):
+        """
+        权限检查服务（进程内按数据库文件共享；超级管理员列表只解析一次，动态管理员缓存在内存中）
+        
+        服务创建失败时返回 None，权限检查只认配置文件中的超级管理员，
+        AUTHORIZATION_RETRY_INTERVAL 秒后再尝试创建
+        """
+        if self._authorization is None and time.monotonic() >= self._authorization_retry_at:
+            try:
+                from authorization_service import get_authorization_service
+                self._authorization = get_authorization_service(self.get_db_file(), self.get_admin_users())
+            except Exception as e:
+                self._authorization_retry_at = time.monotonic() + AUTHORIZATION_RETRY_INTERVAL
+                logger.error(f"创建权限检查服务失败，暂时只允许超级管理员: {e}")
+        return self._authorization
+    
     def is_admin(self, user_id: int) -> bool:
         """检查用户是否为管理员（包括动态管理员）"""
-        # 检查配置文件中的管理员
-        if user_id in self.get_admin_users():
-            return True
-        
-        # 检查动态管理员
-        try:
-            from database import DatabaseManager
-            db = DatabaseManager(self.get_db_file())
-            return db.is_dynamic_admin(user_id)
-        except Exception:
-            # 忽略数据库操作异常，返回False
-            return False
+        authorization = self.authorization
+        if authorization is None:
+            return self.is_super_admin(user_id)
+        return authorization.is_admin(user_id)
     
     def is_super_admin(self, user_id: int) -> bool:
-        """检查用户是否为超级管理员（配置文件中的管理员）"""
+        """检查用户是否为超级管理员（配置文件中的管理员，不访问数据库）"""
         return user_id in self.get_admin_users()
     
     def get_admin_level(self, user_id: int) -> str:
         """获取管理员级别"""
-        if self.is_super_admin(user_id):
-            return "super"
-        elif self.is_admin(user_id):
-            try:
-                from database import DatabaseManager
-                db = DatabaseManager(self.get_db_file())
-                return db.get_admin_permissions(user_id) or "basic"
-            except Exception:
-                # 忽略数据库操作异常，返回basic权限
-                return "basic"
-        return "none"
\ No newline at end of file
+        authorization = self.authorization
+        if authorization is None:
+            return "super" if self.is_super_admin(user_id) else "none"
+        return authorization.get_admin_level(user_id)
\ No newline at end of file
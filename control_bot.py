@@ -7,6 +7,7 @@ import os
 import signal
 import psutil
 import asyncio
+import html
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict
@@ -15,7 +16,11 @@ from telegram.ext import Application, CommandHandler, CallbackQueryHandler, Cont
 from telegram.constants import ParseMode
 from config_manager import ConfigManager
 from hot_update_service import HotUpdateService
-from database import DatabaseManager
+from database import DatabaseManager, AsyncDatabaseManager, get_shared_pool
+from performance_optimizer import initialize_optimizer, shutdown_optimizer
+from update_recorder import recorder_from_config
+from rate_limiter import rate_limiter_from_config
+from metrics import BotMetrics, fetch_handler_perf, get_handler_perf, instrument_builder
 from update_service import UpdateService
 from file_update_service import FileUpdateService
 from advertisement_manager import (
@@ -37,7 +42,15 @@ logger = logging.getLogger(__name__)
 class ControlBot:
     def __init__(self):
         self.config = ConfigManager()
-        self.db = DatabaseManager(self.config.get_db_file())
+        db_file = self.config.get_db_file()
+        
+        # 性能优化器与 DatabaseManager、广告管理器共用进程级连接池，缓存使用内存+磁盘两级缓存
+        self.optimizer = initialize_optimizer(
+            db_file, self.config.get_cache_db_file(), worker_id='control_bot', pool=get_shared_pool(db_file)
+        )
+        self.metrics = BotMetrics(self.config.get_metrics_host(), self.config.get_metrics_port('control'))
+        self.recorder = recorder_from_config(self.config, 'control')
+        self.db = AsyncDatabaseManager(DatabaseManager(db_file))
         self.hot_update = HotUpdateService()
         self.update_service = UpdateService()
         self.file_update = FileUpdateService()
@@ -92,6 +105,9 @@ class ControlBot:
             [
                 InlineKeyboardButton("🔄 重启全部", callback_data="restart_all"),
                 InlineKeyboardButton("🔥 热更新", callback_data="hot_reload_all")
+            ],
+            [
+                InlineKeyboardButton("⚡ 性能统计", callback_data="optimizer_stats")
             ]
         ]
         
@@ -446,6 +462,121 @@ class ControlBot:
         except Exception as e:
             await message.reply_text(f"❌ 获取系统信息失败: {e}")
     
+    async def optimizer_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """性能优化器统计"""
+        user_id = update.effective_user.id
+        
+        if not self.config.is_admin(user_id):
+            await update.message.reply_text("❌ 您没有权限执行此操作。")
+            return
+        
+        await self.show_optimizer_stats(update.message)
+    
+    async def show_optimizer_stats(self, message):
+        """显示性能优化器统计（本进程）"""
+        try:
+            # 统计中包含数据库查询，在线程池中执行
+            stats = await self.db.run(self.optimizer.get_all_stats)
+            pool = stats['connection_pool']
+            queue = stats['task_queue']
+            cache = stats['cache']
+            
+            if 'l1' in cache:
+                cache_text = (f"• 内存缓存: {cache['l1']['current_size']} 项，命中率 {cache['l1']['hit_rate']}\n"
+                              f"• 磁盘缓存: {cache['l2']['current_size']} 项，命中率 {cache['l2']['hit_rate']}")
+            else:
+                cache_text = f"• 内存缓存: {cache['current_size']} 项，命中率 {cache['hit_rate']}"
+            
+            concurrency_text = "\n".join(
+                f"• {name}: 并发 {c['in_flight']}/{c['limit']}，排队 {c['queued']}"
+                for name, c in queue['concurrency'].items()
+            ) or "• 暂无任务"
+            
+            by_status = queue.get('durable', {}).get('by_status', {})
+            
+            locks_text = "\n".join(
+                f"• {site}: 等待 {s['waits']} 次，最长 {s['max_wait'] * 1000:.0f}ms，重试 {s['retries']} 次"
+                for site, s in list(stats['db_locks'].items())[:3]
+            ) or "• 暂无锁等待"
+            
+            stats_text = f"""
+⚡ <b>性能统计（控制机器人进程）</b>
+
+🔌 <b>连接池：</b>
+• 使用中: {pool['active_connections']}，空闲: {pool['current_pool_size']}，等待: {pool['waiting']}
+• 获取连接 p99: {pool['wait_p99'] * 1000:.1f}ms，超时: {pool['stats']['timeouts']} 次
+
+🗃️ <b>缓存：</b>
+{cache_text}
+
+📬 <b>任务队列：</b>
+• 执行中: {queue['in_flight']}，排队: {queue['queue_size']}
+• 完成: {queue['stats']['completed']}，失败: {queue['stats']['failed']}
+{concurrency_text}
+• 持久化任务: 待执行 {by_status.get('pending', 0)}，执行中 {by_status.get('leased', 0)}，死信 {by_status.get('dead', 0)}
+
+🔒 <b>数据库锁等待：</b>
+{locks_text}
+
+⏰ 更新时间：{self.get_current_time()}
+            """
+            
+            keyboard = [[InlineKeyboardButton("🔄 刷新", callback_data="optimizer_stats"),
+                         InlineKeyboardButton("⏱️ 处理器耗时", callback_data="handler_perf")]]
+            await message.reply_text(stats_text, parse_mode=ParseMode.HTML,
+                                     reply_markup=InlineKeyboardMarkup(keyboard))
+            
+        except Exception as e:
+            await message.reply_text(f"❌ 获取性能统计失败: {e}")
+    
+    async def perf_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """处理器耗时统计"""
+        user_id = update.effective_user.id
+        
+        if not self.config.is_admin(user_id):
+            await update.message.reply_text("❌ 您没有权限执行此操作。")
+            return
+        
+        await self.show_handler_perf(update.message)
+    
+    async def show_handler_perf(self, message, limit: int = 8):
+        """显示三个机器人中最慢的处理器和按钮（按 p95 排序）"""
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.0f}ms"
+        
+        host = self.config.get_metrics_host()
+        sections = []
+        for bot_name, title in (('submission', '投稿机器人'), ('publish', '发布机器人'), ('control', '控制机器人')):
+            if bot_name == 'control':
+                rows = get_handler_perf()
+            else:
+                rows = await fetch_handler_perf(host, self.config.get_metrics_port(bot_name))
+            
+            if rows is None:
+                sections.append(f"🤖 <b>{title}：</b>\n• 无法读取（未运行或指标服务未启用）")
+                continue
+            
+            lines = []
+            for row in rows[:limit]:
+                name = row['handler'].rsplit('.', 1)[-1]
+                if row['action']:
+                    name += f"[{row['action']}]"
+                wall, db, api = row['wall'], row['db'], row['api']
+                errors = f"，错误 {row['errors']:.0f}" if row['errors'] else ""
+                lines.append(
+                    f"• <code>{html.escape(name)}</code> ×{row['calls']:.0f}{errors}\n"
+                    f"  p50 {ms(wall['p50'])} / p95 {ms(wall['p95'])} / p99 {ms(wall['p99'])}"
+                    f"，DB p95 {ms(db['p95'])}，API p95 {ms(api['p95'])}"
+                )
+            sections.append(f"🤖 <b>{title}：</b>\n" + ("\n".join(lines) or "• 暂无数据"))
+        
+        perf_text = "⏱️ <b>处理器耗时（自进程启动）</b>\n\n" + "\n\n".join(sections) + \
+            f"\n\n⏰ 更新时间：{self.get_current_time()}"
+        
+        keyboard = [[InlineKeyboardButton("🔄 刷新", callback_data="handler_perf")]]
+        await message.reply_text(perf_text, parse_mode=ParseMode.HTML,
+                                 reply_markup=InlineKeyboardMarkup(keyboard))
+    
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理回调按钮"""
         query = update.callback_query
@@ -473,6 +604,10 @@ class ControlBot:
             await self.show_logs(query.message)
         elif data == "system_info":
             await self.show_system_info(query.message)
+        elif data == "optimizer_stats":
+            await self.show_optimizer_stats(query.message)
+        elif data == "handler_perf":
+            await self.show_handler_perf(query.message)
         elif data == "hot_reload_all":
             await self.hot_reload_all_bots(query.message)
         elif data == "admin_list":
@@ -548,6 +683,8 @@ class ControlBot:
 /status - 查看机器人状态
 /logs - 查看日志文件
 /system - 系统状态监控
+/optimizer - 连接池、缓存和任务队列统计
+/perf - 各处理器和按钮的耗时分位数
 /help - 显示此帮助
 
 🔄 <b>更新功能：</b>
@@ -621,7 +758,7 @@ class ControlBot:
         super_admins = self.config.get_admin_users()
         
         # 获取动态管理员
-        dynamic_admins = self.db.get_dynamic_admins()
+        dynamic_admins = await self.db.get_dynamic_admins()
         
         admin_text = "👨‍💼 <b>管理员列表</b>\n\n"
         
@@ -876,7 +1013,7 @@ class ControlBot:
                 return
             
             # 添加动态管理员
-            success = self.db.add_dynamic_admin(target_user_id, username, permissions, user_id)
+            success = await self.db.add_dynamic_admin(target_user_id, username, permissions, user_id)
             
             if success:
                 await update.message.reply_text(
@@ -912,12 +1049,12 @@ class ControlBot:
             target_user_id = int(context.args[0])
             
             # 检查是否是动态管理员
-            if not self.db.is_dynamic_admin(target_user_id):
+            if not await self.db.is_dynamic_admin(target_user_id):
                 await update.message.reply_text("❌ 该用户不是动态管理员")
                 return
             
             # 移除动态管理员
-            success = self.db.remove_dynamic_admin(target_user_id, user_id)
+            success = await self.db.remove_dynamic_admin(target_user_id, user_id)
             
             if success:
                 await update.message.reply_text(f"✅ 成功移除管理员 (ID: {target_user_id})")
@@ -972,7 +1109,7 @@ class ControlBot:
     
     async def remove_admin_action(self, query, admin_id, removed_by):
         """移除管理员操作"""
-        success = self.db.remove_dynamic_admin(admin_id, removed_by)
+        success = await self.db.remove_dynamic_admin(admin_id, removed_by)
         
         if success:
             await query.edit_message_text(f"✅ 已移除管理员 (ID: {admin_id})")
@@ -1233,10 +1370,34 @@ class ControlBot:
         
         await message.reply_text(history_text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
     
+    async def post_init(self, application: Application):
+        """应用启动后启动性能优化器和指标服务（任务队列需要在事件循环中启动）"""
+        await self.optimizer.start()
+        await self.metrics.start()
+    
+    async def post_shutdown(self, application: Application):
+        """应用关闭后停止指标服务和性能优化器，未完成的持久化任务交还给队列"""
+        await self.metrics.stop()
+        await shutdown_optimizer()
+        if self.recorder is not None:
+            self.recorder.close()
+    
     def run(self):
         """启动机器人"""
         # 创建应用
-        self.app = Application.builder().token(self.config.get_admin_bot_token()).build()
+        self.app = (
+            instrument_builder(Application.builder())
+            .token(self.config.get_admin_bot_token())
+            .base_url(self.config.get_api_base_url())
+            .rate_limiter(rate_limiter_from_config(self.config, self.config.get_admin_bot_token()))
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
+        
+        # 录制收到的更新（需要在配置中开启）
+        if self.recorder is not None:
+            self.recorder.attach(self.app)
         
         # 添加处理器
         self.app.add_handler(CommandHandler("start", self.start_command))
@@ -1246,6 +1407,8 @@ class ControlBot:
         self.app.add_handler(CommandHandler("restart_bots", self.restart_bots_command))
         self.app.add_handler(CommandHandler("logs", self.logs_command))
         self.app.add_handler(CommandHandler("system", self.system_command))
+        self.app.add_handler(CommandHandler("optimizer", self.optimizer_command))
+        self.app.add_handler(CommandHandler("perf", self.perf_command))
         self.app.add_handler(CommandHandler("help", self.help_command))
         self.app.add_handler(CommandHandler("add_admin", self.add_admin_command))
         self.app.add_handler(CommandHandler("remove_admin", self.remove_admin_command))
@@ -1275,7 +1438,7 @@ class ControlBot:
             return
         
         # 获取广告统计
-        stats = self.ad_manager.get_ad_statistics()
+        stats = await self.db.run(self.ad_manager.get_ad_statistics)
         config = self.ad_manager.config
         
         text = f"""
@@ -1327,10 +1490,10 @@ class ControlBot:
             return
         
         # 获取总体统计
-        overall_stats = self.ad_manager.get_ad_statistics()
+        overall_stats = await self.db.run(self.ad_manager.get_ad_statistics)
         
         # 获取所有广告
-        all_ads = self.ad_manager.get_advertisements()
+        all_ads = await self.db.run(self.ad_manager.get_advertisements)
         
         text = f"""
 📊 <b>广告统计报告</b>
@@ -1412,7 +1575,7 @@ class ControlBot:
             await query.answer("❌ 权限不足", show_alert=True)
             return
         
-        ads = self.ad_manager.get_advertisements()
+        ads = await self.db.run(self.ad_manager.get_advertisements)
         
         if not ads:
             text = "📝 <b>广告列表</b>\n\n暂无广告，点击下方按钮创建第一个广告。"
@@ -1584,7 +1747,7 @@ class ControlBot:
         config = self.ad_manager.config
         config.enabled = not config.enabled
         
-        if self.ad_manager.update_config(config):
+        if await self.db.run(self.ad_manager.update_config, config):
             status = "启用" if config.enabled else "禁用"
             await query.answer(f"✅ 广告系统已{status}", show_alert=True)
             await self.show_ad_config(query)
@@ -1599,7 +1762,7 @@ class ControlBot:
             await query.answer("❌ 权限不足", show_alert=True)
             return
         
-        ad = self.ad_manager.get_advertisement(ad_id)
+        ad = await self.db.run(self.ad_manager.get_advertisement, ad_id)
         if not ad:
             await query.answer("❌ 广告不存在", show_alert=True)
             return
@@ -1679,7 +1842,7 @@ class ControlBot:
             await query.answer("❌ 权限不足", show_alert=True)
             return
         
-        ad = self.ad_manager.get_advertisement(ad_id)
+        ad = await self.db.run(self.ad_manager.get_advertisement, ad_id)
         if not ad:
             await query.answer("❌ 广告不存在", show_alert=True)
             return
@@ -1687,7 +1850,7 @@ class ControlBot:
         # 切换状态
         new_status = AdStatus.PAUSED if ad.status == AdStatus.ACTIVE else AdStatus.ACTIVE
         
-        if self.ad_manager.update_advertisement(ad_id, {'status': new_status.value}):
+        if await self.db.run(self.ad_manager.update_advertisement, ad_id, {'status': new_status.value}):
             status_name = "启用" if new_status == AdStatus.ACTIVE else "暂停"
             await query.answer(f"✅ 广告已{status_name}", show_alert=True)
             await self.show_edit_ad(query, ad_id)
@@ -1702,7 +1865,7 @@ class ControlBot:
             await query.answer("❌ 权限不足", show_alert=True)
             return
         
-        ad = self.ad_manager.get_advertisement(ad_id)
+        ad = await self.db.run(self.ad_manager.get_advertisement, ad_id)
         if not ad:
             await query.answer("❌ 广告不存在", show_alert=True)
             return
@@ -1740,7 +1903,7 @@ class ControlBot:
             await query.answer("❌ 权限不足", show_alert=True)
             return
         
-        if self.ad_manager.delete_advertisement(ad_id):
+        if await self.db.run(self.ad_manager.delete_advertisement, ad_id):
             await query.answer("✅ 广告已删除", show_alert=True)
             await self.show_ad_list(query)
         else:
@@ -1859,7 +2022,7 @@ class ControlBot:
                 return
             
             # 创建广告
-            ad_id = self.ad_manager.create_advertisement(ad)
+            ad_id = await self.db.run(self.ad_manager.create_advertisement, ad)
             
             await update.message.reply_text(f"""
 ✅ <b>广告创建成功！</b>
@@ -1935,6 +2098,9 @@ class ControlBot:
             [
                 InlineKeyboardButton("🔄 重启全部", callback_data="restart_all"),
                 InlineKeyboardButton("🔥 热更新", callback_data="hot_reload_all")
+            ],
+            [
+                InlineKeyboardButton("⚡ 性能统计", callback_data="optimizer_stats")
             ]
         ]
         
@@ -1,318 +1,505 @@
+import os
 import sqlite3
+import logging
+import asyncio
 import datetime
 import json
-from typing import List, Dict, Optional
+import threading
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, List, Dict, Optional
+from performance_optimizer import ConnectionPool, WriteBatcher, cached, get_pool_batcher
+from db_migrations import migrate
+from db_retry import begin_immediate
+from metrics import observe_db_call
+
+logger = logging.getLogger(__name__)
+
+# 投稿状态机：pending → claimed → approved → published / failed，pending/claimed → rejected
+# 每个状态转换是一条带状态条件的 UPDATE ... RETURNING 语句，条件不满足时不修改任何行
+_REVIEWABLE = (
+    "(status = 'pending' OR (status = 'claimed' AND "
+    "(claimed_by IS :reviewer OR claimed_at < datetime('now', :claim_expiry))))"
+)
+# 审核群中的审核卡片对所有审核员可见，在卡片上审核时接管其他审核员的认领
+_TAKEOVER = "status IN ('pending', 'claimed')"
+SUBMISSION_TRANSITIONS: Dict[str, tuple] = {
+    # 动作: (允许转换的状态条件, 目标状态)
+    'approve': (_REVIEWABLE, 'approved'),
+    'reject': (_REVIEWABLE, 'rejected'),
+    'approve_takeover': (_TAKEOVER, 'approved'),
+    'reject_takeover': (_TAKEOVER, 'rejected'),
+    'publish': ("status IN ('approved', 'failed')", 'published'),
+    'fail': ("status = 'approved'", 'failed'),
+}
+
+# 等待批量写入提交的最长时间（秒）
+WRITE_TIMEOUT = 30
+
+# 审核员认领投稿的有效期（秒），超时后其他审核员可以处理
+CLAIM_TIMEOUT = 600
+
+def claim_remaining_seconds(submission: Dict) -> Optional[int]:
+    """认领剩余的有效时间（秒），投稿未被认领时返回None"""
+    if submission.get('status') != 'claimed' or not submission.get('claimed_at'):
+        return None
+    # claimed_at 为 SQLite CURRENT_TIMESTAMP（UTC）
+    claimed_at = datetime.datetime.strptime(submission['claimed_at'], '%Y-%m-%d %H:%M:%S')
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    elapsed = (now - claimed_at).total_seconds()
+    return max(0, int(CLAIM_TIMEOUT - elapsed))
+
+# 同一进程内按数据库文件共享的连接池
+_shared_pools: Dict[str, ConnectionPool] = {}
+_shared_pools_lock = threading.Lock()
+
+def get_shared_pool(db_file: str, pool_size: int = 3, max_overflow: int = 7) -> ConnectionPool:
+    """获取（必要时创建）指定数据库文件的进程级共享连接池"""
+    key = os.path.abspath(db_file)
+    with _shared_pools_lock:
+        pool = _shared_pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_file, pool_size=pool_size, max_overflow=max_overflow)
+            _shared_pools[key] = pool
+        return pool
+
+def get_shared_batcher(db_file: str) -> WriteBatcher:
+    """获取指定数据库文件的进程级共享写入批处理器（即共享连接池的批处理器）"""
+    return get_pool_batcher(get_shared_pool(db_file))
+
+def close_shared_pool(db_file: str):
+    """
+    写完共享批处理器中排队的写入并关闭共享连接池的所有连接（进程退出、基准测试复制文件前使用）
+    
+    连接池和批处理器之后仍可使用：再次写入时批处理器自动重新启动，连接按需重新创建
+    """
+    with _shared_pools_lock:
+        pool = _shared_pools.get(os.path.abspath(db_file))
+    if pool is None:
+        return
+    get_pool_batcher(pool).stop()
+    pool.close_all()
+
+# 进程内数据变更监听器：表名 -> 回调列表，写入提交后调用，用于使内存缓存失效
+_change_listeners: Dict[str, List[Callable[[], None]]] = {}
+_change_listeners_lock = threading.Lock()
+
+def add_change_listener(table: str, callback: Callable[[], None]):
+    """注册数据变更回调"""
+    with _change_listeners_lock:
+        callbacks = _change_listeners.setdefault(table, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+def remove_change_listener(table: str, callback: Callable[[], None]):
+    """注销数据变更回调"""
+    with _change_listeners_lock:
+        callbacks = _change_listeners.get(table, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+def notify_change(table: str):
+    """通知指定表的数据已变更"""
+    with _change_listeners_lock:
+        callbacks = list(_change_listeners.get(table, []))
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"数据变更回调执行失败 ({table}): {e}")
 
 class DatabaseManager:
-    def __init__(self, db_file: str):
+    def __init__(self, db_file: str, pool: Optional[ConnectionPool] = None,
+                 batcher: Optional[WriteBatcher] = None):
         self.db_file = db_file
-        self.conn = None  # 添加conn属性
+        # 连接池和批处理器来自调用方或进程级共享，本实例只在自行创建时负责释放
+        self._owns_pool = False
+        self._owns_batcher = False
+        self.pool = pool or get_shared_pool(db_file)
+        # 高频写入（投稿、管理员日志）通过批处理器组提交
+        self.batcher = batcher or get_pool_batcher(self.pool)
         self.init_database()
+        
+        # 任何进程修改系统配置后清空 get_config 缓存
+        from cache_invalidation import get_invalidator
+        get_invalidator(db_file).subscribe('system_config', DatabaseManager.get_config.clear_cache)
+    
+    @contextmanager
+    def connection(self):
+        """从连接池借出一个连接，使用完毕后自动归还"""
+        with self.pool.connection() as conn:
+            conn.row_factory = sqlite3.Row
+            yield conn
+    
+    @contextmanager
+    def transaction(self, site: str = 'DatabaseManager.transaction'):
+        """
+        写事务上下文：以 BEGIN IMMEDIATE 获取写锁（锁竞争时退避重试），
+        正常退出时提交，出现异常时回滚并重新抛出
+        """
+        with self.connection() as conn:
+            begin_immediate(conn, site)
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
     
-    def get_connection(self):
-        """获取数据库连接"""
-        if self.conn is None or self.conn.execute("SELECT 1").fetchone() is None:
-            self.conn = sqlite3.connect(self.db_file)
-        return self.conn
+    def _write(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """
+        通过批处理器执行写操作并等待其所在事务提交，返回 func 的结果
+        
+        Raises:
+            TimeoutError: WRITE_TIMEOUT 秒内未提交（写入可能仍在之后提交）
+        """
+        return self.batcher.submit(func).result(timeout=WRITE_TIMEOUT)
+    
+    def close(self):
+        """
+        释放本实例创建的资源
+        
+        共享的连接池和批处理器仍在被其他实例使用，这里不会关闭；
+        需要关闭某个数据库文件的共享资源时使用 close_shared_pool
+        """
+        if self._owns_batcher:
+            self.batcher.stop()
+        if self._owns_pool:
+            self.pool.close_all()
     
     def init_database(self):
-        """初始化数据库表"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        # 创建投稿表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS submissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                username TEXT,
-                content_type TEXT NOT NULL,
-                content TEXT,
-                media_file_id TEXT,
-                caption TEXT,
-                status TEXT DEFAULT 'pending',
-                submit_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                review_time TIMESTAMP,
-                publish_time TIMESTAMP,
-                reviewer_id INTEGER,
-                reject_reason TEXT
-            )
-        ''')
-        
-        # 创建用户表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                is_banned BOOLEAN DEFAULT FALSE,
-                submission_count INTEGER DEFAULT 0,
-                last_submission TIMESTAMP
-            )
-        ''')
-        
-        # 创建管理员操作日志表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admin_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                admin_id INTEGER NOT NULL,
-                action TEXT NOT NULL,
-                target_id INTEGER,
-                details TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建系统配置表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_config (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                config_key TEXT UNIQUE NOT NULL,
-                config_value TEXT NOT NULL,
-                updated_by INTEGER,
-                updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建动态管理员表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS dynamic_admins (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                permissions TEXT DEFAULT 'basic',
-                added_by INTEGER,
-                added_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE
-            )
-        ''')
-        
-        # 创建机器人状态表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bot_status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                bot_name TEXT UNIQUE NOT NULL,
-                status TEXT DEFAULT 'stopped',
-                last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                config_hash TEXT,
-                restart_count INTEGER DEFAULT 0
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """初始化数据库表（结构已是最新版本时不执行任何DDL）"""
+        with self.connection() as conn:
+            migrate(conn)
     
     def add_submission(self, user_id: int, username: str, content_type: str, 
                       content: str = None, media_file_id: str = None, 
                       caption: str = None) -> int:
         """添加新投稿"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO submissions (user_id, username, content_type, content, media_file_id, caption)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, username, content_type, content, media_file_id, caption))
-        
-        submission_id = cursor.lastrowid
-        
-        # 更新用户统计
-        cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, submission_count, last_submission)
-            VALUES (?, ?, 
-                COALESCE((SELECT submission_count FROM users WHERE user_id = ?), 0) + 1,
-                CURRENT_TIMESTAMP)
-        ''', (user_id, username, user_id))
-        
-        conn.commit()
-        conn.close()
-        return submission_id
+        def write(conn):
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO submissions (user_id, username, content_type, content, media_file_id, caption)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, username, content_type, content, media_file_id, caption))
+            
+            submission_id = cursor.lastrowid
+            
+            # 更新用户信息（原地更新，保留封禁状态等其他字段）
+            cursor.execute('''
+                INSERT INTO users (user_id, username, submission_count, last_submission)
+                VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    username = excluded.username,
+                    submission_count = submission_count + 1,
+                    last_submission = excluded.last_submission
+            ''', (user_id, username))
+            return submission_id
+        
+        return self._write(write)
     
     def get_pending_submissions(self) -> List[Dict]:
         """获取待审核的投稿"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM submissions 
-            WHERE status = 'pending' 
-            ORDER BY submit_time ASC
-        ''')
-        
-        submissions = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return submissions
-    
-    def approve_submission(self, submission_id: int, reviewer_id: int) -> bool:
-        """批准投稿"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE submissions 
-            SET status = 'approved', reviewer_id = ?, review_time = CURRENT_TIMESTAMP
-            WHERE id = ? AND status = 'pending'
-        ''', (reviewer_id, submission_id))
-        
-        success = cursor.rowcount > 0
-        
-        if success:
-            # 记录管理员操作
-            cursor.execute('''
-                INSERT INTO admin_logs (admin_id, action, target_id)
-                VALUES (?, 'approve', ?)
-            ''', (reviewer_id, submission_id))
-        
-        conn.commit()
-        conn.close()
-        return success
-    
-    def reject_submission(self, submission_id: int, reviewer_id: int, reason: str = None) -> bool:
-        """拒绝投稿"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE submissions 
-            SET status = 'rejected', reviewer_id = ?, review_time = CURRENT_TIMESTAMP, reject_reason = ?
-            WHERE id = ? AND status = 'pending'
-        ''', (reviewer_id, reason, submission_id))
-        
-        success = cursor.rowcount > 0
-        
-        if success:
-            # 记录管理员操作
-            cursor.execute('''
-                INSERT INTO admin_logs (admin_id, action, target_id, details)
-                VALUES (?, 'reject', ?, ?)
-            ''', (reviewer_id, submission_id, reason))
-        
-        conn.commit()
-        conn.close()
-        return success
-    
-    def mark_published(self, submission_id: int) -> bool:
-        """标记为已发布"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                SELECT * FROM submissions 
+                WHERE status = 'pending' 
+                ORDER BY submit_time ASC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def next_pending(self, after_id: Optional[int] = None, limit: int = 1) -> List[Dict]:
+        """
+        按 (submit_time, id) 键集分页获取待审核投稿
+        
+        Args:
+            after_id: 游标，返回排在该投稿之后的待审核投稿；None表示从队首开始
+            limit: 最多返回的条数
+        """
+        with self.connection() as conn:
+            if after_id is None:
+                cursor = conn.execute('''
+                    SELECT * FROM submissions 
+                    WHERE status = 'pending' 
+                    ORDER BY submit_time, id 
+                    LIMIT ?
+                ''', (limit,))
+            else:
+                cursor = conn.execute('''
+                    SELECT * FROM submissions 
+                    WHERE status = 'pending' 
+                      AND (submit_time, id) > (SELECT submit_time, id FROM submissions WHERE id = ?)
+                    ORDER BY submit_time, id 
+                    LIMIT ?
+                ''', (after_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def count_pending(self) -> int:
+        """获取待审核投稿数量，含正在被审核员认领的投稿（只扫描状态索引）"""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM submissions WHERE status IN ('pending', 'claimed')"
+            ).fetchone()[0]
+    
+    def _transition(self, conn: sqlite3.Connection, submission_id: int, action: str,
+                    assignments: str = '', **params) -> Optional[Dict]:
+        """
+        执行一次投稿状态转换
+        
+        Args:
+            conn: 写事务中的数据库连接
+            submission_id: 投稿ID
+            action: SUBMISSION_TRANSITIONS 中的动作
+            assignments: 除 status 外需要同时更新的列（SET 子句片段，使用命名参数）
+            **params: assignments 中使用的命名参数
+            
+        Returns:
+            Optional[Dict]: 转换后的投稿；投稿不存在或当前状态不允许该转换时返回None
+        """
+        condition, to_state = SUBMISSION_TRANSITIONS[action]
+        params.setdefault('reviewer', None)
+        params.update(id=submission_id, to_state=to_state, claim_expiry=f'-{CLAIM_TIMEOUT} seconds')
+        
+        set_clause = 'status = :to_state' + (f', {assignments}' if assignments else '')
+        rows = conn.execute(f'''
+            UPDATE submissions SET {set_clause}
+            WHERE id = :id AND {condition}
+            RETURNING *
+        ''', params).fetchall()
+        return dict(rows[0]) if rows else None
+    
+    def claim_next_pending(self, reviewer_id: int, after_id: Optional[int] = None) -> Optional[Dict]:
+        """
+        认领下一个待审核投稿（到达队尾后从队首重新开始）
         
-        cursor.execute('''
-            UPDATE submissions 
-            SET status = 'published', publish_time = CURRENT_TIMESTAMP
-            WHERE id = ? AND status = 'approved'
-        ''', (submission_id,))
+        同时释放该审核员之前认领的投稿和所有已超时的认领，
+        每个审核员同一时间最多认领一个投稿，不同审核员不会拿到同一个投稿。
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        return success
+        Args:
+            reviewer_id: 审核员ID
+            after_id: 游标，认领排在该投稿之后的投稿；None表示从队首开始
+            
+        Returns:
+            Optional[Dict]: 认领到的投稿，没有待审核投稿时返回None
+        """
+        claim_expiry = f'-{CLAIM_TIMEOUT} seconds'
+        
+        def write(conn):
+            conn.execute('''
+                UPDATE submissions SET status = 'pending', claimed_by = NULL, claimed_at = NULL
+                WHERE status = 'claimed' AND (claimed_by = ? OR claimed_at < datetime('now', ?))
+            ''', (reviewer_id, claim_expiry))
+            
+            for cursor_id in ([after_id, None] if after_id is not None else [None]):
+                keyset = (
+                    'AND (submit_time, id) > (SELECT submit_time, id FROM submissions WHERE id = :after)'
+                    if cursor_id is not None else ''
+                )
+                rows = conn.execute(f'''
+                    UPDATE submissions 
+                    SET status = 'claimed', claimed_by = :reviewer, claimed_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT id FROM submissions 
+                        WHERE status = 'pending' {keyset}
+                        ORDER BY submit_time, id 
+                        LIMIT 1
+                    )
+                    RETURNING *
+                ''', {'reviewer': reviewer_id, 'after': cursor_id}).fetchall()
+                if rows:
+                    return dict(rows[0])
+            return None
+        
+        return self._write(write)
+    
+    def approve_submission(self, submission_id: int, reviewer_id: int, takeover: bool = False) -> Optional[Dict]:
+        """
+        批准投稿（待审核或由该审核员认领的投稿）
+        
+        Args:
+            takeover: 是否接管其他审核员的认领（在审核群的审核卡片上操作时）
+        
+        Returns:
+            Optional[Dict]: 批准后的投稿；已被其他审核员处理或认领时返回None
+        """
+        def write(conn):
+            submission = self._transition(
+                conn, submission_id, 'approve_takeover' if takeover else 'approve',
+                'reviewer_id = :reviewer, review_time = CURRENT_TIMESTAMP, claimed_by = NULL, claimed_at = NULL',
+                reviewer=reviewer_id
+            )
+            
+            if submission:
+                # 记录管理员操作
+                conn.execute('''
+                    INSERT INTO admin_logs (admin_id, action, target_id)
+                    VALUES (?, 'approve', ?)
+                ''', (reviewer_id, submission_id))
+            return submission
+        
+        return self._write(write)
+    
+    def reject_submission(self, submission_id: int, reviewer_id: int, reason: str = None,
+                          takeover: bool = False) -> Optional[Dict]:
+        """
+        拒绝投稿（待审核或由该审核员认领的投稿）
+        
+        Args:
+            takeover: 是否接管其他审核员的认领（在审核群的审核卡片上操作时）
+        
+        Returns:
+            Optional[Dict]: 拒绝后的投稿；已被其他审核员处理或认领时返回None
+        """
+        def write(conn):
+            submission = self._transition(
+                conn, submission_id, 'reject_takeover' if takeover else 'reject',
+                'reviewer_id = :reviewer, review_time = CURRENT_TIMESTAMP, reject_reason = :reason, '
+                'claimed_by = NULL, claimed_at = NULL',
+                reviewer=reviewer_id, reason=reason
+            )
+            
+            if submission:
+                # 记录管理员操作
+                conn.execute('''
+                    INSERT INTO admin_logs (admin_id, action, target_id, details)
+                    VALUES (?, 'reject', ?, ?)
+                ''', (reviewer_id, submission_id, reason))
+            return submission
+        
+        return self._write(write)
+    
+    def mark_published(self, submission_id: int) -> Optional[Dict]:
+        """标记为已发布（已批准或之前发布失败的投稿）"""
+        return self._write(lambda conn: self._transition(
+            conn, submission_id, 'publish',
+            'publish_time = CURRENT_TIMESTAMP, publish_error = NULL, publish_attempts = publish_attempts + 1'
+        ))
+    
+    def mark_publish_failed(self, submission_id: int, error: str) -> Optional[Dict]:
+        """标记为发布失败并记录错误信息"""
+        return self._write(lambda conn: self._transition(
+            conn, submission_id, 'fail', 'publish_error = :error', error=error
+        ))
+    
+    def record_publish_attempt(self, submission_id: int, error: str) -> Optional[Dict]:
+        """
+        记录一次失败的发布尝试（状态不变，是否重试由调用方决定）
+        
+        Returns:
+            Optional[Dict]: 更新后的投稿；投稿不是已批准或发布失败状态时返回None
+        """
+        def write(conn):
+            rows = conn.execute('''
+                UPDATE submissions SET publish_error = ?, publish_attempts = publish_attempts + 1
+                WHERE id = ? AND status IN ('approved', 'failed')
+                RETURNING *
+            ''', (error, submission_id)).fetchall()
+            return dict(rows[0]) if rows else None
+        
+        return self._write(write)
     
     def get_submission_by_id(self, submission_id: int) -> Optional[Dict]:
         """根据ID获取投稿"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM submissions WHERE id = ?', (submission_id,))
-        row = cursor.fetchone()
-        
-        conn.close()
-        return dict(row) if row else None
+        with self.connection() as conn:
+            row = conn.execute('SELECT * FROM submissions WHERE id = ?', (submission_id,)).fetchone()
+            return dict(row) if row else None
     
     def get_approved_submissions(self) -> List[Dict]:
         """获取已批准但未发布的投稿"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM submissions 
-            WHERE status = 'approved' 
-            ORDER BY review_time ASC
-        ''')
-        
-        submissions = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return submissions
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                SELECT * FROM submissions 
+                WHERE status = 'approved' 
+                ORDER BY review_time ASC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
     
     def get_user_stats(self, user_id: int) -> Dict:
-        """获取用户统计信息"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total,
-                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending,
-                COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved,
-                COUNT(CASE WHEN status = 'published' THEN 1 END) as published,
-                COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected
-            FROM submissions 
-            WHERE user_id = ?
-        ''', (user_id,))
-        
-        stats = dict(cursor.fetchone())
-        conn.close()
-        return stats
+        """获取用户统计信息（由触发器维护的 user_stats 表，主键查询）"""
+        with self.connection() as conn:
+            row = conn.execute('''
+                SELECT total, pending, approved, published, rejected 
+                FROM user_stats 
+                WHERE user_id = ?
+            ''', (user_id,)).fetchone()
+            if row:
+                return dict(row)
+            return {'total': 0, 'pending': 0, 'approved': 0, 'published': 0, 'rejected': 0}
+    
+    def get_global_stats(self) -> Dict:
+        """获取全局投稿统计（总数、各状态数、今日投稿数、投稿用户数）"""
+        with self.connection() as conn:
+            stats = dict(conn.execute('''
+                SELECT 
+                    COUNT(*) as total,
+                    COUNT(CASE WHEN status IN ('pending', 'claimed') THEN 1 END) as pending,
+                    COUNT(CASE WHEN status IN ('approved', 'failed') THEN 1 END) as approved,
+                    COUNT(CASE WHEN status = 'published' THEN 1 END) as published,
+                    COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected,
+                    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed
+                FROM submissions
+            ''').fetchone())
+            
+            stats['today'] = conn.execute('''
+                SELECT COUNT(*) FROM submissions 
+                WHERE DATE(submit_time) = DATE('now')
+            ''').fetchone()[0]
+            
+            stats['unique_users'] = conn.execute(
+                'SELECT COUNT(DISTINCT user_id) FROM submissions'
+            ).fetchone()[0]
+            return stats
     
     def ban_user(self, user_id: int, admin_id: int) -> bool:
         """封禁用户"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE users SET is_banned = TRUE WHERE user_id = ?
-        ''', (user_id,))
-        
-        # 记录管理员操作
-        cursor.execute('''
-            INSERT INTO admin_logs (admin_id, action, target_id)
-            VALUES (?, 'ban_user', ?)
-        ''', (admin_id, user_id))
+        def write(conn):
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE users SET is_banned = TRUE WHERE user_id = ?
+            ''', (user_id,))
+            
+            # 记录管理员操作
+            cursor.execute('''
+                INSERT INTO admin_logs (admin_id, action, target_id)
+                VALUES (?, 'ban_user', ?)
+            ''', (admin_id, user_id))
         
-        conn.commit()
-        conn.close()
+        self._write(write)
         return True
     
     def unban_user(self, user_id: int, admin_id: int) -> bool:
         """解封用户"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE users SET is_banned = FALSE WHERE user_id = ?
-        ''', (user_id,))
-        
-        # 记录管理员操作
-        cursor.execute('''
-            INSERT INTO admin_logs (admin_id, action, target_id)
-            VALUES (?, 'unban_user', ?)
-        ''', (admin_id, user_id))
+        def write(conn):
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE users SET is_banned = FALSE WHERE user_id = ?
+            ''', (user_id,))
+            
+            # 记录管理员操作
+            cursor.execute('''
+                INSERT INTO admin_logs (admin_id, action, target_id)
+                VALUES (?, 'unban_user', ?)
+            ''', (admin_id, user_id))
         
-        conn.commit()
-        conn.close()
+        self._write(write)
         return True
     
     def is_user_banned(self, user_id: int) -> bool:
         """检查用户是否被封禁"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT is_banned FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        return result and result[0] if result else False
+        with self.connection() as conn:
+            result = conn.execute('SELECT is_banned FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            return bool(result[0]) if result else False
     
     def add_dynamic_admin(self, user_id: int, username: str, permissions: str, added_by: int) -> bool:
         """添加动态管理员"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        try:
+        def write(conn):
+            cursor = conn.cursor()
+                
             cursor.execute('''
                 INSERT OR REPLACE INTO dynamic_admins (user_id, username, permissions, added_by)
                 VALUES (?, ?, ?, ?)
@@ -323,21 +510,19 @@ class DatabaseManager:
                 INSERT INTO admin_logs (admin_id, action, target_id, details)
                 VALUES (?, 'add_admin', ?, ?)
             ''', (added_by, user_id, f"添加管理员，权限: {permissions}"))
-            
-            conn.commit()
-            return True
+        
+        try:
+            self._write(write)
         except Exception as e:
-            conn.rollback()
             return False
-        finally:
-            conn.close()
+        notify_change('dynamic_admins')
+        return True
     
     def remove_dynamic_admin(self, user_id: int, removed_by: int) -> bool:
         """移除动态管理员"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        try:
+        def write(conn):
+            cursor = conn.cursor()
+            
             cursor.execute('''
                 UPDATE dynamic_admins SET is_active = FALSE WHERE user_id = ?
             ''', (user_id,))
@@ -347,65 +532,43 @@ class DatabaseManager:
                 INSERT INTO admin_logs (admin_id, action, target_id, details)
                 VALUES (?, 'remove_admin', ?, ?)
             ''', (removed_by, user_id, "移除管理员权限"))
-            
-            conn.commit()
             return cursor.rowcount > 0
+        
+        try:
+            removed = self._write(write)
         except Exception as e:
-            conn.rollback()
             return False
-        finally:
-            conn.close()
+        notify_change('dynamic_admins')
+        return removed
     
     def get_dynamic_admins(self) -> List[Dict]:
         """获取所有动态管理员"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM dynamic_admins 
-            WHERE is_active = TRUE 
-            ORDER BY added_time DESC
-        ''')
-        
-        admins = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return admins
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                SELECT * FROM dynamic_admins 
+                WHERE is_active = TRUE 
+                ORDER BY added_time DESC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
     
     def is_dynamic_admin(self, user_id: int) -> bool:
         """检查用户是否为动态管理员"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT permissions FROM dynamic_admins 
-            WHERE user_id = ? AND is_active = TRUE
-        ''', (user_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
+        return self.get_admin_permissions(user_id) is not None
     
     def get_admin_permissions(self, user_id: int) -> str:
         """获取管理员权限级别"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT permissions FROM dynamic_admins 
-            WHERE user_id = ? AND is_active = TRUE
-        ''', (user_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else None
+        with self.connection() as conn:
+            result = conn.execute('''
+                SELECT permissions FROM dynamic_admins 
+                WHERE user_id = ? AND is_active = TRUE
+            ''', (user_id,)).fetchone()
+            return result[0] if result else None
     
     def set_config(self, key: str, value: str, updated_by: int) -> bool:
         """设置系统配置"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        try:
+        def write(conn):
+            cursor = conn.cursor()
+            
             cursor.execute('''
                 INSERT OR REPLACE INTO system_config (config_key, config_value, updated_by)
                 VALUES (?, ?, ?)
@@ -416,79 +579,113 @@ class DatabaseManager:
                 INSERT INTO admin_logs (admin_id, action, details)
                 VALUES (?, 'update_config', ?)
             ''', (updated_by, f"更新配置: {key} = {value}"))
-            
-            conn.commit()
-            return True
+        
+        try:
+            self._write(write)
         except Exception as e:
-            conn.rollback()
             return False
-        finally:
-            conn.close()
+        notify_change('system_config')
+        return True
     
+    @cached(ttl=300, negative_ttl=60, namespace='db_config',
+            key_func=lambda self, key: f"{os.path.abspath(self.db_file)}|{key}")
     def get_config(self, key: str) -> Optional[str]:
-        """获取系统配置"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT config_value FROM system_config WHERE config_key = ?', (key,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        return result[0] if result else None
+        """获取系统配置（缓存，system_config 表变更时失效）"""
+        with self.connection() as conn:
+            result = conn.execute('SELECT config_value FROM system_config WHERE config_key = ?', (key,)).fetchone()
+            return result[0] if result else None
     
     def update_bot_status(self, bot_name: str, status: str, config_hash: str = None) -> bool:
         """更新机器人状态"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
         try:
-            if config_hash:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO bot_status (bot_name, status, config_hash, last_update)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (bot_name, status, config_hash))
-            else:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO bot_status (bot_name, status, last_update)
-                    VALUES (?, ?, CURRENT_TIMESTAMP)
-                ''', (bot_name, status))
+            with self.transaction('DatabaseManager.update_bot_status') as conn:
+                if config_hash:
+                    conn.execute('''
+                        INSERT OR REPLACE INTO bot_status (bot_name, status, config_hash, last_update)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ''', (bot_name, status, config_hash))
+                else:
+                    conn.execute('''
+                        INSERT OR REPLACE INTO bot_status (bot_name, status, last_update)
+                        VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ''', (bot_name, status))
             
-            conn.commit()
             return True
         except Exception as e:
-            conn.rollback()
             return False
-        finally:
-            conn.close()
     
     def get_bot_status(self, bot_name: str) -> Optional[Dict]:
         """获取机器人状态"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM bot_status WHERE bot_name = ?', (bot_name,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        return dict(result) if result else None
+        with self.connection() as conn:
+            result = conn.execute('SELECT * FROM bot_status WHERE bot_name = ?', (bot_name,)).fetchone()
+            return dict(result) if result else None
     
     def increment_restart_count(self, bot_name: str) -> bool:
         """增加重启计数"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                UPDATE bot_status 
-                SET restart_count = restart_count + 1, last_update = CURRENT_TIMESTAMP
-                WHERE bot_name = ?
-            ''', (bot_name,))
+            with self.transaction('DatabaseManager.increment_restart_count') as conn:
+                conn.execute('''
+                    UPDATE bot_status 
+                    SET restart_count = restart_count + 1, last_update = CURRENT_TIMESTAMP
+                    WHERE bot_name = ?
+                ''', (bot_name,))
             
-            conn.commit()
             return True
         except Exception as e:
-            conn.rollback()
             return False
+
+
+class AsyncDatabaseManager:
+    """
+    DatabaseManager 的异步外观
+    
+    在专用的有界线程池中执行数据库调用，避免SQLite磁盘I/O和锁等待阻塞事件循环。
+    DatabaseManager 的每个方法都可以直接 await 调用，例如
+    ``await adb.get_submission_by_id(1)``；每次调用可以通过 ``timeout`` 关键字覆盖默认超时。
+    """
+    
+    def __init__(self, db: DatabaseManager, max_workers: int = 4, timeout: float = 10.0):
+        """
+        Args:
+            db: 被包装的同步数据库管理器
+            max_workers: 数据库线程池大小（同时执行的查询上限）
+            timeout: 默认单次调用超时（秒），包含排队等待时间
+        """
+        self.db = db
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+        self._wrappers: Dict[str, Callable] = {}
+    
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        在数据库线程池中执行任意同步函数（例如广告管理器的查询）
+        
+        超时后抛出 asyncio.TimeoutError；尚未开始执行的调用会被取消。
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, call),
+                timeout if timeout is not None else self.timeout
+            )
         finally:
-            conn.close()
\ No newline at end of file
+            observe_db_call(getattr(func, '__name__', 'other'), time.perf_counter() - start)
+    
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+        
+        wrapper = self._wrappers.get(name)
+        if wrapper is None:
+            @functools.wraps(attr)
+            async def wrapper(*args, timeout: Optional[float] = None, **kwargs):
+                return await self.run(attr, *args, timeout=timeout, **kwargs)
+            self._wrappers[name] = wrapper
+        return wrapper
+    
+    def shutdown(self, wait: bool = True):
+        """关闭数据库线程池"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数据库迁移模块
+Database Migrations Module
+
+基于 PRAGMA user_version 的版本化数据库结构管理：
+- 迁移步骤按版本号顺序执行，每一步只执行一次
+- 结构已是最新版本时只读取一次 user_version，不执行任何DDL
+- 多个机器人进程同时启动时通过 BEGIN IMMEDIATE 串行化迁移
+"""
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# 需要的最低 SQLite 版本（UPDATE ... RETURNING）
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+@dataclass(frozen=True)
+class Migration:
+    """单个迁移步骤"""
+    version: int                         # 执行后的结构版本号
+    description: str                     # 迁移说明
+    statements: List[str]                # 按顺序执行的SQL语句
+
+def _cache_version_triggers(table: str, key: str, update_when: str = None) -> List[str]:
+    """生成在表变更时递增 cache_versions 中对应键的触发器"""
+    bump = f"UPDATE cache_versions SET version = version + 1 WHERE key = '{key}';"
+    when = f' WHEN {update_when}' if update_when else ''
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_cache_{table}_insert AFTER INSERT ON {table} BEGIN {bump} END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_cache_{table}_update AFTER UPDATE ON {table}{when} BEGIN {bump} END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_cache_{table}_delete AFTER DELETE ON {table} BEGIN {bump} END',
+    ]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "基础表结构", [
+        '''
+        CREATE TABLE IF NOT EXISTS submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            content_type TEXT NOT NULL,
+            content TEXT,
+            media_file_id TEXT,
+            caption TEXT,
+            status TEXT DEFAULT 'pending',
+            submit_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            review_time TIMESTAMP,
+            publish_time TIMESTAMP,
+            reviewer_id INTEGER,
+            reject_reason TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            is_banned BOOLEAN DEFAULT FALSE,
+            submission_count INTEGER DEFAULT 0,
+            last_submission TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS admin_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            target_id INTEGER,
+            details TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS system_config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            config_key TEXT UNIQUE NOT NULL,
+            config_value TEXT NOT NULL,
+            updated_by INTEGER,
+            updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS dynamic_admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            permissions TEXT DEFAULT 'basic',
+            added_by INTEGER,
+            added_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS bot_status (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bot_name TEXT UNIQUE NOT NULL,
+            status TEXT DEFAULT 'stopped',
+            last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            config_hash TEXT,
+            restart_count INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS advertisements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            position TEXT NOT NULL,
+            content TEXT NOT NULL,
+            url TEXT,
+            button_text TEXT,
+            media_path TEXT,
+            priority INTEGER DEFAULT 1,
+            weight INTEGER DEFAULT 1,
+            status TEXT DEFAULT 'draft',
+            start_date TIMESTAMP,
+            end_date TIMESTAMP,
+            max_displays INTEGER,
+            display_count INTEGER DEFAULT 0,
+            click_count INTEGER DEFAULT 0,
+            created_by INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            tags TEXT,
+            target_content_types TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS ad_display_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ad_id INTEGER,
+            submission_id INTEGER,
+            channel_message_id INTEGER,
+            position TEXT,
+            displayed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_clicked BOOLEAN DEFAULT FALSE,
+            clicked_at TIMESTAMP,
+            FOREIGN KEY (ad_id) REFERENCES advertisements (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS ad_config (
+            id INTEGER PRIMARY KEY,
+            config_data TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    Migration(2, "热点查询索引", [
+        # 待审核队列：WHERE status = ? ORDER BY submit_time
+        'CREATE INDEX IF NOT EXISTS idx_submissions_status_time ON submissions (status, submit_time)',
+        # 用户统计：WHERE user_id = ? [AND status = ?]
+        'CREATE INDEX IF NOT EXISTS idx_submissions_user_status ON submissions (user_id, status)',
+        # 广告统计：JOIN ad_display_logs ON ad_id
+        'CREATE INDEX IF NOT EXISTS idx_ad_display_logs_ad_time ON ad_display_logs (ad_id, displayed_at)',
+        # 广告选择：WHERE position = ? AND status = 'active'
+        'CREATE INDEX IF NOT EXISTS idx_advertisements_position_status ON advertisements (position, status)',
+    ]),
+    Migration(3, "按用户增量维护的投稿统计", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            pending INTEGER NOT NULL DEFAULT 0,
+            approved INTEGER NOT NULL DEFAULT 0,
+            published INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        # 回填已有投稿
+        '''
+        INSERT OR REPLACE INTO user_stats (user_id, total, pending, approved, published, rejected)
+        SELECT user_id,
+               COUNT(*),
+               COUNT(CASE WHEN status IN ('pending', 'claimed') THEN 1 END),
+               COUNT(CASE WHEN status IN ('approved', 'failed') THEN 1 END),
+               COUNT(CASE WHEN status = 'published' THEN 1 END),
+               COUNT(CASE WHEN status = 'rejected' THEN 1 END)
+        FROM submissions
+        GROUP BY user_id
+        ''',
+        # 触发器与投稿写入处于同一事务中，任何进程的写入都会同步更新计数；
+        # 统计口径：claimed（已认领）计入待审核，failed（已批准但发布失败）计入已通过
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_insert AFTER INSERT ON submissions
+        BEGIN
+            INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+            UPDATE user_stats SET
+                total = total + 1,
+                pending = pending + (NEW.status IS 'pending' OR NEW.status IS 'claimed'),
+                approved = approved + (NEW.status IS 'approved' OR NEW.status IS 'failed'),
+                published = published + (NEW.status IS 'published'),
+                rejected = rejected + (NEW.status IS 'rejected')
+            WHERE user_id = NEW.user_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_update AFTER UPDATE OF status, user_id ON submissions
+        WHEN OLD.status IS NOT NEW.status OR OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            UPDATE user_stats SET
+                total = total - 1,
+                pending = pending - (OLD.status IS 'pending' OR OLD.status IS 'claimed'),
+                approved = approved - (OLD.status IS 'approved' OR OLD.status IS 'failed'),
+                published = published - (OLD.status IS 'published'),
+                rejected = rejected - (OLD.status IS 'rejected')
+            WHERE user_id = OLD.user_id;
+            INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+            UPDATE user_stats SET
+                total = total + 1,
+                pending = pending + (NEW.status IS 'pending' OR NEW.status IS 'claimed'),
+                approved = approved + (NEW.status IS 'approved' OR NEW.status IS 'failed'),
+                published = published + (NEW.status IS 'published'),
+                rejected = rejected + (NEW.status IS 'rejected')
+            WHERE user_id = NEW.user_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_delete AFTER DELETE ON submissions
+        BEGIN
+            UPDATE user_stats SET
+                total = total - 1,
+                pending = pending - (OLD.status IS 'pending' OR OLD.status IS 'claimed'),
+                approved = approved - (OLD.status IS 'approved' OR OLD.status IS 'failed'),
+                published = published - (OLD.status IS 'published'),
+                rejected = rejected - (OLD.status IS 'rejected')
+            WHERE user_id = OLD.user_id;
+        END
+        ''',
+    ]),
+    Migration(4, "投稿状态机（认领、发布失败）", [
+        'ALTER TABLE submissions ADD COLUMN claimed_by INTEGER',
+        'ALTER TABLE submissions ADD COLUMN claimed_at TIMESTAMP',
+        'ALTER TABLE submissions ADD COLUMN publish_error TEXT',
+    ]),
+    Migration(5, "跨进程缓存失效版本号", [
+        '''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            key TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO cache_versions (key) VALUES
+            ('dynamic_admins'), ('users'), ('system_config'), ('advertisements'), ('ad_config')
+        ''',
+        *_cache_version_triggers('dynamic_admins', 'dynamic_admins'),
+        # 每次投稿都会更新 users 的投稿计数，只有封禁状态变化才使缓存失效
+        *_cache_version_triggers('users', 'users', 'OLD.is_banned IS NOT NEW.is_banned'),
+        *_cache_version_triggers('system_config', 'system_config'),
+        # 展示/点击计数单独更新，不使缓存失效；达到最大展示次数时广告不再可选，需要失效
+        *_cache_version_triggers(
+            'advertisements', 'advertisements',
+            '(OLD.display_count IS NEW.display_count AND OLD.click_count IS NEW.click_count) '
+            'OR (NEW.max_displays IS NOT NULL AND OLD.display_count < NEW.max_displays '
+            'AND NEW.display_count >= NEW.max_displays)'
+        ),
+        *_cache_version_triggers('ad_config', 'ad_config'),
+    ]),
+    Migration(6, "持久化任务队列", [
+        # 时间均为Unix时间戳（秒）；status: pending / leased / dead，执行成功的任务直接删除
+        '''
+        CREATE TABLE IF NOT EXISTS task_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            priority INTEGER NOT NULL DEFAULT 5,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            available_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_task_queue_ready ON task_queue (status, priority, available_at)',
+        'CREATE INDEX IF NOT EXISTS idx_task_queue_lease ON task_queue (lease_owner) WHERE lease_owner IS NOT NULL',
+    ]),
+    Migration(7, "发布重试次数", [
+        # 发布到频道的尝试次数；重试期间 status 保持 approved，publish_error 为最近一次的错误
+        'ALTER TABLE submissions ADD COLUMN publish_attempts INTEGER NOT NULL DEFAULT 0',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """读取数据库当前的结构版本"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    将数据库迁移到最新结构版本
+
+    Args:
+        conn: 数据库连接（不能处于未提交的事务中）
+
+    Returns:
+        int: 迁移后的结构版本
+
+    Raises:
+        RuntimeError: SQLite 版本低于 MIN_SQLITE_VERSION
+    """
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(
+            f"SQLite 版本 {sqlite3.sqlite_version} 过低，需要 "
+            f"{'.'.join(map(str, MIN_SQLITE_VERSION))} 或更高版本（投稿状态转换使用 UPDATE ... RETURNING）"
+        )
+
+    current = get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        if current > LATEST_VERSION:
+            logger.warning(f"数据库结构版本 {current} 高于程序支持的版本 {LATEST_VERSION}")
+        return current
+
+    # 加写锁后重新读取版本，其他进程可能已经完成了迁移
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = get_schema_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+
+            for statement in migration.statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {migration.version:d}')
+            logger.info(f"数据库迁移到版本 {migration.version}: {migration.description}")
+            current = migration.version
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return current
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数据库锁竞争处理模块
+Database Lock Contention Module
+
+投稿、发布、控制三个机器人进程共享同一个SQLite数据库文件：
+- 每个连接设置 busy_timeout，由SQLite在库内等待写锁
+- 写事务使用 BEGIN IMMEDIATE 在事务开始时获取写锁，避免读锁升级时的死锁
+- busy_timeout 耗尽后按指数退避加随机抖动重试
+- 按调用位置统计锁等待次数、等待时间、重试和失败次数
+"""
+
+import logging
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Union
+
+logger = logging.getLogger(__name__)
+
+# 单次加锁时SQLite内部等待的最长时间（毫秒）
+BUSY_TIMEOUT_MS = 5000
+
+# 加锁耗时超过该值（秒）时记为一次锁等待
+LOCK_WAIT_THRESHOLD = 0.005
+
+@dataclass
+class LockSiteStats:
+    """单个调用位置的锁竞争统计"""
+    acquisitions: int = 0          # 成功获取写锁的次数
+    waits: int = 0                 # 加锁耗时超过阈值的次数
+    wait_time: float = 0.0         # 累计加锁耗时（秒）
+    max_wait: float = 0.0          # 最长一次加锁耗时（秒）
+    retries: int = 0               # busy_timeout 耗尽后的重试次数
+    failures: int = 0              # 重试用尽后仍失败的次数
+
+class LockStats:
+    """
+    锁竞争统计
+    Lock Contention Statistics
+    """
+
+    def __init__(self):
+        self._sites: Dict[str, LockSiteStats] = {}
+        self._lock = threading.Lock()
+
+    def _site(self, site: str) -> LockSiteStats:
+        stats = self._sites.get(site)
+        if stats is None:
+            stats = self._sites[site] = LockSiteStats()
+        return stats
+
+    def record_acquire(self, site: str, elapsed: float):
+        """记录一次成功加锁及其耗时"""
+        with self._lock:
+            stats = self._site(site)
+            stats.acquisitions += 1
+            stats.wait_time += elapsed
+            stats.max_wait = max(stats.max_wait, elapsed)
+            if elapsed >= LOCK_WAIT_THRESHOLD:
+                stats.waits += 1
+
+    def record_retry(self, site: str):
+        """记录一次重试"""
+        with self._lock:
+            self._site(site).retries += 1
+
+    def record_failure(self, site: str):
+        """记录一次最终失败"""
+        with self._lock:
+            self._site(site).failures += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """按调用位置返回统计信息，锁等待最多的位置排在前面"""
+        with self._lock:
+            items = sorted(self._sites.items(), key=lambda kv: kv[1].wait_time, reverse=True)
+            return {
+                site: {
+                    'acquisitions': s.acquisitions,
+                    'waits': s.waits,
+                    'wait_time': round(s.wait_time, 4),
+                    'avg_wait': round(s.wait_time / s.acquisitions, 6) if s.acquisitions else 0.0,
+                    'max_wait': round(s.max_wait, 4),
+                    'retries': s.retries,
+                    'failures': s.failures,
+                }
+                for site, s in items
+            }
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._sites.clear()
+
+# 进程内共享的统计实例
+_lock_stats = LockStats()
+
+def get_lock_stats() -> LockStats:
+    """获取进程内共享的锁竞争统计"""
+    return _lock_stats
+
+def is_lock_error(error: BaseException) -> bool:
+    """判断异常是否为SQLITE_BUSY/SQLITE_LOCKED"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def configure_connection(conn: sqlite3.Connection, busy_timeout_ms: int = BUSY_TIMEOUT_MS):
+    """为连接设置 busy_timeout"""
+    conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms):d}')
+
+def backoff_delay(attempt: int, base_delay: float = 0.05, max_delay: float = 2.0) -> float:
+    """第 attempt 次重试前的等待时间（全抖动指数退避）"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+def run_with_retry(func: Callable[[], Any], site: str, attempts: int = 5,
+                   base_delay: float = 0.05, max_delay: float = 2.0) -> Any:
+    """
+    执行操作，遇到数据库锁错误时退避重试
+
+    Args:
+        func: 无参数的操作，重试时会被重新调用，必须可以安全地重复执行
+        site: 调用位置，用于统计
+        attempts: 最多执行次数
+        base_delay: 退避基础时间（秒）
+        max_delay: 单次退避最长时间（秒）
+
+    Returns:
+        Any: func 的返回值
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            if attempt == attempts - 1:
+                _lock_stats.record_failure(site)
+                logger.error(f"数据库锁竞争重试 {attempts} 次后仍失败 ({site}): {e}")
+                raise
+            _lock_stats.record_retry(site)
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"数据库被锁定 ({site})，{delay:.3f}s 后第 {attempt + 1} 次重试")
+            time.sleep(delay)
+
+def begin_immediate(conn: sqlite3.Connection, site: Union[str, Iterable[str]], attempts: int = 5):
+    """
+    以 BEGIN IMMEDIATE 开启写事务并统计加锁耗时
+
+    Args:
+        conn: 数据库连接（不能处于未提交的事务中）
+        site: 调用位置；批量写入时可以传入多个调用位置，加锁耗时计入每一个位置
+        attempts: 最多尝试次数
+    """
+    sites = [site] if isinstance(site, str) else list(site)
+
+    def acquire():
+        start = time.monotonic()
+        conn.execute('BEGIN IMMEDIATE')
+        elapsed = time.monotonic() - start
+        for name in sites:
+            _lock_stats.record_acquire(name, elapsed)
+
+    run_with_retry(acquire, sites[0] if len(sites) == 1 else ','.join(sites), attempts=attempts)
@@ -341,16 +341,14 @@ class FileUpdateService:
         """获取文件更新历史"""
         try:
             # 从数据库获取更新记录
-            cursor = self.db.conn.cursor()
-            cursor.execute("""
-                SELECT config_key, config_value, updated_by, updated_time 
-                FROM system_config 
-                WHERE config_key LIKE 'file_update_%' 
-                ORDER BY updated_time DESC 
-                LIMIT ?
-            """, (limit,))
-            
-            records = cursor.fetchall()
+            with self.db.connection() as conn:
+                records = conn.execute("""
+                    SELECT config_key, config_value, updated_by, updated_time 
+                    FROM system_config 
+                    WHERE config_key LIKE 'file_update_%' 
+                    ORDER BY updated_time DESC 
+                    LIMIT ?
+                """, (limit,)).fetchall()
             history = []
             
             for record in records:
@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地指标模块
+Local Metrics Module
+
+每个机器人进程在本机端口上以 Prometheus 文本格式暴露指标（GET /metrics）：
+- 更新处理耗时（按更新类型）、数据库调用耗时（按方法）
+- Telegram API 调用次数、耗时和错误（按API方法和状态码）
+- 事件循环延迟
+- 采集时读取 PerformanceOptimizer.get_all_stats() 的连接池、缓存、任务队列和锁等待统计
+
+HTTP服务运行在守护线程中，采集不经过事件循环，事件循环阻塞时也能读取指标。
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import re
+import urllib.request
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ApplicationHandlerStop, BaseHandler
+from telegram.request import HTTPXRequest
+
+from performance_optimizer import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class MetricFamily:
+    """一个指标及其全部样本"""
+    name: str
+    type: str                                  # counter / gauge / histogram
+    help: str
+    samples: List[Tuple[str, Dict[str, str], float]] = field(default_factory=list)   # (名称后缀, 标签, 值)
+    
+    def add(self, value: float, suffix: str = '', **labels):
+        self.samples.append((suffix, labels, value))
+    
+    def add_histogram(self, histogram: LatencyHistogram, **labels):
+        """按 Prometheus 直方图格式添加 _bucket/_count/_sum 样本"""
+        buckets, count, total = histogram.export()
+        for bound, cumulative in buckets:
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            self.samples.append(('_bucket', dict(labels, le=le), cumulative))
+        self.samples.append(('_count', labels, count))
+        self.samples.append(('_sum', labels, total))
+
+class Counter:
+    """按标签计数的计数器"""
+    
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+    
+    def get(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+    
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, 'counter', self.help)
+        with self._lock:
+            for labelvalues, value in self._values.items():
+                family.add(value, '_total', **dict(zip(self.labelnames, labelvalues)))
+        return family
+
+class Histogram:
+    """按标签分别统计的耗时直方图"""
+    
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 bounds: Optional[tuple] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.bounds = bounds
+        self._histograms: Dict[tuple, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+    
+    def labels(self, *labelvalues: str) -> LatencyHistogram:
+        """获取（必要时创建）指定标签的直方图"""
+        histogram = self._histograms.get(labelvalues)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(labelvalues, LatencyHistogram(self.bounds))
+        return histogram
+    
+    def observe(self, value: float, *labelvalues: str):
+        self.labels(*labelvalues).observe(value)
+    
+    def items(self) -> List[Tuple[tuple, LatencyHistogram]]:
+        """全部 (标签值, 直方图)"""
+        with self._lock:
+            return list(self._histograms.items())
+    
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, 'histogram', self.help)
+        for labelvalues, histogram in self.items():
+            family.add_histogram(histogram, **dict(zip(self.labelnames, labelvalues)))
+        return family
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return f'{value:g}' if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """
+    指标注册表
+    Metrics Registry
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], List[MetricFamily]]] = []
+        self._lock = threading.Lock()
+    
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """获取（必要时创建）计数器，name 不含 _total 后缀"""
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help, labelnames))
+    
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  bounds: Optional[tuple] = None) -> Histogram:
+        """获取（必要时创建）直方图"""
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help, labelnames, bounds))
+    
+    def register_collector(self, collector: Callable[[], List[MetricFamily]]):
+        """注册采集时调用的函数（用于读取其他组件的统计）"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+    
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        
+        families = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning(f"指标采集失败 ({getattr(collector, '__name__', collector)}): {e}")
+        return families
+    
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出全部指标"""
+        lines = []
+        for family in self.collect():
+            # 0.0.4 文本格式中计数器的 HELP/TYPE 使用带 _total 的样本名
+            header = family.name + '_total' if family.type == 'counter' else family.name
+            lines.append(f'# HELP {header} {family.help}')
+            lines.append(f'# TYPE {header} {family.type}')
+            for suffix, labels, value in family.samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                name = family.name + suffix
+                lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if label_text
+                             else f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+# 进程内共享的注册表
+_registry = MetricsRegistry()
+
+def get_registry() -> MetricsRegistry:
+    """获取进程内共享的指标注册表"""
+    return _registry
+
+UPDATE_DURATION = _registry.histogram(
+    'bot_update_duration_seconds', '处理一个更新的耗时', ('update_type',))
+DB_CALL_DURATION = _registry.histogram(
+    'bot_db_call_duration_seconds', '异步数据库调用耗时（含线程池排队）', ('operation',))
+API_REQUESTS = _registry.counter(
+    'telegram_api_requests', 'Telegram Bot API 请求次数', ('method', 'status'))
+API_ERRORS = _registry.counter(
+    'telegram_api_errors', 'Telegram Bot API 网络错误次数（未收到响应）', ('method', 'error'))
+API_DURATION = _registry.histogram(
+    'telegram_api_request_duration_seconds', 'Telegram Bot API 请求耗时', ('method',))
+EVENT_LOOP_LAG = _registry.histogram(
+    'bot_event_loop_lag_seconds', '事件循环调度延迟',
+    bounds=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+RATE_LIMIT_WAIT = _registry.histogram(
+    'telegram_rate_limit_wait_seconds', '请求在限流器中等待令牌的时间', ('priority',),
+    bounds=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+FLOOD_WAITS = _registry.counter(
+    'telegram_flood_waits', '收到 RetryAfter（429）的次数', ('method',))
+
+# 处理器耗时：wall 为总耗时，db / api 为其中等待数据库和 Bot API 的时间
+HANDLER_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+HANDLER_DURATION = _registry.histogram(
+    'bot_handler_duration_seconds', '处理器耗时（wall 总耗时，db/api 为其中的数据库和 Bot API 时间）',
+    ('handler', 'action', 'component'), bounds=HANDLER_BOUNDS)
+HANDLER_CALLS = _registry.counter(
+    'bot_handler_calls', '处理器调用次数', ('handler', 'action', 'status'))
+
+class HandlerTiming:
+    """当前处理器调用中累计的数据库和 Bot API 时间"""
+    
+    __slots__ = ('db', 'api')
+    
+    def __init__(self):
+        self.db = 0.0
+        self.api = 0.0
+
+# 处理器中创建的任务会复制上下文，共享同一个 HandlerTiming
+_handler_timing: ContextVar[Optional[HandlerTiming]] = ContextVar('handler_timing', default=None)
+
+def observe_db_call(operation: str, elapsed: float):
+    """记录一次异步数据库调用（同时计入当前处理器的数据库时间）"""
+    DB_CALL_DURATION.observe(elapsed, operation)
+    timing = _handler_timing.get()
+    if timing is not None:
+        timing.db += elapsed
+
+def observe_api_call(api_method: str, elapsed: float):
+    """记录一次 Bot API 调用（同时计入当前处理器的 Bot API 时间）"""
+    API_DURATION.observe(elapsed, api_method)
+    timing = _handler_timing.get()
+    if timing is not None:
+        timing.api += elapsed
+
+_ID_SEGMENT = re.compile(r'\d')
+
+def callback_action(update: object) -> str:
+    """
+    回调按钮的动作名：去掉 callback_data 末尾含数字的部分（ID），
+    例如 approve_123 -> approve、edit_ad_5 -> edit_ad；非回调更新返回空字符串
+    """
+    if not isinstance(update, Update) or update.callback_query is None:
+        return ''
+    data = update.callback_query.data
+    if not isinstance(data, str) or not data:
+        return ''
+    parts = data.split('_')
+    while len(parts) > 1 and _ID_SEGMENT.search(parts[-1]):
+        parts.pop()
+    return '_'.join(parts)[:48]
+
+def instrument_handler(callback: Callable, name: Optional[str] = None) -> Callable:
+    """
+    包装处理器回调，记录调用次数以及总耗时、数据库时间和 Bot API 时间
+    
+    Args:
+        callback: 处理器回调 (update, context)
+        name: 处理器名称，默认为回调的限定名（例如 PublishBot.handle_callback）
+    """
+    if getattr(callback, '_instrumented', False):
+        return callback
+    name = name or getattr(callback, '__qualname__', repr(callback))
+    
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        timing = HandlerTiming()
+        token = _handler_timing.set(timing)
+        action = callback_action(update)
+        status = 'ok'
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            _handler_timing.reset(token)
+            HANDLER_DURATION.observe(time.perf_counter() - start, name, action, 'wall')
+            HANDLER_DURATION.observe(timing.db, name, action, 'db')
+            HANDLER_DURATION.observe(timing.api, name, action, 'api')
+            HANDLER_CALLS.inc(name, action, status)
+    
+    wrapper._instrumented = True
+    return wrapper
+
+def get_handler_perf() -> List[Dict]:
+    """
+    获取本进程各处理器（及回调动作）的耗时分位数
+    
+    Returns:
+        List[Dict]: 每项包含 handler、action、calls、errors，
+        以及 wall/db/api 三部分的 p50、p95、p99（秒），按 wall p95 从大到小排序
+    """
+    rows: Dict[tuple, Dict] = {}
+    for (handler, action, component), histogram in HANDLER_DURATION.items():
+        row = rows.setdefault((handler, action), {
+            'handler': handler,
+            'action': action,
+            'calls': HANDLER_CALLS.get(handler, action, 'ok') + HANDLER_CALLS.get(handler, action, 'error'),
+            'errors': HANDLER_CALLS.get(handler, action, 'error'),
+        })
+        row[component] = {
+            'p50': histogram.quantile(0.5),
+            'p95': histogram.quantile(0.95),
+            'p99': histogram.quantile(0.99),
+        }
+    return sorted(rows.values(), key=lambda row: row.get('wall', {}).get('p95', 0), reverse=True)
+
+def update_type(update: object) -> str:
+    """更新类型，例如 message、callback_query"""
+    if isinstance(update, Update):
+        for name in Update.ALL_TYPES:
+            if getattr(update, name, None) is not None:
+                return name
+    return type(update).__name__
+
+class InstrumentedApplication(Application):
+    """
+    记录每个更新处理耗时的 Application（通过 ApplicationBuilder.application_class 使用）
+    
+    添加的处理器回调会自动用 instrument_handler 包装。
+    """
+    
+    def add_handler(self, handler: BaseHandler, group: int = 0) -> None:
+        if asyncio.iscoroutinefunction(getattr(handler, 'callback', None)):
+            handler.callback = instrument_handler(handler.callback)
+        super().add_handler(handler, group)
+    
+    async def process_update(self, update: object) -> None:
+        start = time.perf_counter()
+        try:
+            await super().process_update(update)
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - start, update_type(update))
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """记录 Bot API 请求次数、耗时和错误的 HTTPXRequest"""
+    
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception as e:
+            API_ERRORS.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            observe_api_call(api_method, time.perf_counter() - start)
+        API_REQUESTS.inc(api_method, str(code))
+        return code, payload
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """
+    测量事件循环延迟：每隔 interval 秒休眠一次，记录实际唤醒时间比预期晚多少
+    
+    Args:
+        interval: 测量间隔（秒）
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+def collect_optimizer_stats() -> List[MetricFamily]:
+    """读取全局性能优化器的统计（未初始化时不输出）"""
+    from performance_optimizer import TieredCache, _optimizer
+    if _optimizer is None:
+        return []
+    
+    families = []
+    stats = _optimizer.get_all_stats()
+    
+    # 连接池
+    pool = stats['connection_pool']
+    connections = MetricFamily('bot_db_pool_connections', 'gauge', '连接池连接数')
+    connections.add(pool['active_connections'], state='active')
+    connections.add(pool['current_pool_size'], state='idle')
+    connections.add(pool['waiting'], state='waiting')
+    pool_events = MetricFamily('bot_db_pool_events', 'counter', '连接池事件次数')
+    for event, count in pool['stats'].items():
+        if event != 'peak_usage':
+            pool_events.add(count, '_total', event=event)
+    pool_wait = MetricFamily('bot_db_pool_wait_seconds', 'histogram', '获取连接的等待时间')
+    pool_wait.add_histogram(_optimizer.connection_pool.wait_histogram)
+    families.extend([connections, pool_events, pool_wait])
+    
+    # 缓存
+    tiers = {'l1': stats['cache']['l1'], 'l2': stats['cache']['l2']} \
+        if isinstance(_optimizer.cache, TieredCache) else {'l1': stats['cache']}
+    cache_requests = MetricFamily('bot_cache_requests', 'counter', '缓存查询次数')
+    cache_entries = MetricFamily('bot_cache_entries', 'gauge', '缓存条目数')
+    cache_evictions = MetricFamily('bot_cache_evictions', 'counter', '缓存淘汰和过期次数')
+    for tier, tier_stats in tiers.items():
+        counts = tier_stats['stats']
+        cache_requests.add(counts['hits'], '_total', tier=tier, result='hit')
+        cache_requests.add(counts['misses'], '_total', tier=tier, result='miss')
+        if tier_stats.get('current_size') is not None:
+            cache_entries.add(tier_stats['current_size'], tier=tier)
+        cache_evictions.add(counts.get('evictions', 0), '_total', tier=tier, reason='evicted')
+        cache_evictions.add(counts.get('expirations', 0), '_total', tier=tier, reason='expired')
+    families.extend([cache_requests, cache_entries, cache_evictions])
+    
+    # 任务队列
+    queue = stats['task_queue']
+    tasks = MetricFamily('bot_tasks', 'counter', '已执行的内存任务数')
+    tasks.add(queue['stats']['completed'], '_total', result='completed')
+    tasks.add(queue['stats']['failed'], '_total', result='failed')
+    depth = MetricFamily('bot_task_queue_depth', 'gauge', '等待执行的内存任务数')
+    depth.add(queue['queue_size'])
+    concurrency = MetricFamily('bot_task_concurrency', 'gauge', '按任务类别的并发上限、执行中和排队任务数')
+    for task_class, c in queue['concurrency'].items():
+        concurrency.add(c['limit'], task_class=task_class, value='limit')
+        concurrency.add(c['in_flight'], task_class=task_class, value='in_flight')
+        concurrency.add(c['queued'], task_class=task_class, value='queued')
+    families.extend([tasks, depth, concurrency])
+    
+    durable = queue.get('durable')
+    if durable is not None:
+        durable_tasks = MetricFamily('bot_durable_tasks', 'gauge', '持久化任务数（所有进程）')
+        for status, count in durable.get('by_status', {}).items():
+            durable_tasks.add(count, status=status)
+        durable_events = MetricFamily('bot_durable_task_events', 'counter', '本进程的持久化任务事件次数')
+        for event in ('enqueued', 'completed', 'retried', 'dead_lettered', 'resumed'):
+            durable_events.add(durable[event], '_total', event=event)
+        families.extend([durable_tasks, durable_events])
+    
+    # 数据库锁等待
+    lock_wait = MetricFamily('bot_db_lock_wait_seconds', 'counter', '获取写锁的累计耗时')
+    lock_events = MetricFamily('bot_db_lock_events', 'counter', '写锁获取、等待、重试和失败次数')
+    for site, s in stats['db_locks'].items():
+        lock_wait.add(s['wait_time'], '_total', site=site)
+        for event in ('acquisitions', 'waits', 'retries', 'failures'):
+            lock_events.add(s[event], '_total', site=site, event=event)
+    families.extend([lock_wait, lock_events])
+    
+    return families
+
+_registry.register_collector(collect_optimizer_stats)
+
+async def fetch_handler_perf(host: str, port: Optional[int], timeout: float = 2.0) -> Optional[List[Dict]]:
+    """
+    从其他机器人进程的指标服务读取处理器耗时（见 get_handler_perf）
+    
+    Returns:
+        Optional[List[Dict]]: 指标服务未启用或无法访问时返回None
+    """
+    if port is None:
+        return None
+    
+    def fetch():
+        with urllib.request.urlopen(f'http://{host}:{port}/perf', timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    
+    try:
+        return await asyncio.to_thread(fetch)
+    except (OSError, ValueError) as e:
+        logger.debug(f"读取处理器耗时失败 ({host}:{port}): {e}")
+        return None
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = _registry
+    
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/perf':
+            # 供控制机器人的 /perf 命令读取
+            body = json.dumps(get_handler_perf()).encode('utf-8')
+            content_type = 'application/json'
+        elif path in ('/metrics', '/'):
+            body = self.registry.render().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logger.debug(f"指标请求: {format % args}")
+
+class MetricsServer:
+    """
+    指标HTTP服务
+    Metrics HTTP Server
+    """
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 9101, registry: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            host: 监听地址，默认只监听本机
+            port: 监听端口
+            registry: 指标注册表，默认为进程共享的注册表
+        """
+        self.host = host
+        self.port = port
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry or _registry})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """在守护线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        logger.info(f"指标服务已启动: http://{self.host}:{self.port}/metrics")
+    
+    def stop(self):
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+def start_metrics_server(host: str, port: Optional[int]) -> Optional[MetricsServer]:
+    """
+    启动指标服务；端口为None（未启用）或端口被占用时返回None，不影响机器人运行
+    """
+    if port is None:
+        return None
+    try:
+        server = MetricsServer(host, port)
+    except OSError as e:
+        logger.error(f"指标服务启动失败 ({host}:{port}): {e}")
+        return None
+    server.start()
+    return server
+
+def instrument_builder(builder):
+    """
+    为 ApplicationBuilder 配置带指标记录的 Application 和 HTTP 请求对象
+    
+    连接池大小与 python-telegram-bot 的默认值一致（普通请求256，getUpdates 1）。
+    """
+    return (
+        builder
+        .application_class(InstrumentedApplication)
+        .request(InstrumentedHTTPXRequest(connection_pool_size=256))
+        .get_updates_request(InstrumentedHTTPXRequest(connection_pool_size=1))
+    )
+
+class BotMetrics:
+    """
+    机器人进程的指标服务和事件循环延迟监控
+    Bot Metrics
+    """
+    
+    def __init__(self, host: str, port: Optional[int]):
+        """
+        Args:
+            host: 指标服务监听地址
+            port: 指标服务端口，None 表示不启用
+        """
+        self.host = host
+        self.port = port
+        self.server: Optional[MetricsServer] = None
+        self._lag_task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """启动指标服务和事件循环延迟监控（在事件循环中调用）"""
+        if self.port is None:
+            return
+        self.server = start_metrics_server(self.host, self.port)
+        self._lag_task = asyncio.create_task(monitor_event_loop_lag())
+    
+    async def stop(self):
+        """停止监控和指标服务"""
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
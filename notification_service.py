@@ -3,29 +3,35 @@
 
 import asyncio
 import logging
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
+from telegram.ext import ExtBot
 from config_manager import ConfigManager
-from database import DatabaseManager
+from database import DatabaseManager, AsyncDatabaseManager
+from metrics import InstrumentedHTTPXRequest
+from rate_limiter import rate_limiter_from_config
 
 logger = logging.getLogger(__name__)
 
 class NotificationService:
-    def __init__(self):
+    def __init__(self, db: AsyncDatabaseManager = None):
         self.config = ConfigManager()
-        self.db = DatabaseManager(self.config.get_db_file())
+        self.db = db or AsyncDatabaseManager(DatabaseManager(self.config.get_db_file()))
         self.publish_bot = None
     
     async def get_publish_bot(self):
         """获取发布机器人实例"""
         if not self.publish_bot:
-            self.publish_bot = Bot(token=self.config.get_publish_bot_token())
+            token = self.config.get_publish_bot_token()
+            self.publish_bot = ExtBot(token=token, base_url=self.config.get_api_base_url(),
+                                      request=InstrumentedHTTPXRequest(),
+                                      rate_limiter=rate_limiter_from_config(self.config, token))
         return self.publish_bot
     
     async def send_submission_to_review_group(self, submission_id: int):
         """发送投稿到审核群 - 整合为单条消息"""
         try:
-            submission = self.db.get_submission_by_id(submission_id)
+            submission = await self.db.get_submission_by_id(submission_id)
             if not submission:
                 logger.error(f"投稿 #{submission_id} 不存在")
                 return False
@@ -34,8 +40,8 @@ class NotificationService:
             review_group_id = self.config.get_review_group_id()
             
             # 获取用户统计信息
-            user_stats = self.db.get_user_stats(submission['user_id'])
-            is_banned = self.db.is_user_banned(submission['user_id'])
+            user_stats = await self.db.get_user_stats(submission['user_id'])
+            is_banned = await self.db.is_user_banned(submission['user_id'])
             
             # 构建完整的审核信息
             header_text = f"""
@@ -229,7 +235,7 @@ class NotificationService:
     async def notify_approval_result(self, submission_id: int, approved: bool, reviewer_name: str):
         """通知审核结果给投稿用户"""
         try:
-            submission = self.db.get_submission_by_id(submission_id)
+            submission = await self.db.get_submission_by_id(submission_id)
             if not submission:
                 return False
             
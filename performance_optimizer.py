@@ -7,8 +7,9 @@ Performance Optimizer Module
 
 提供系统性能优化功能，包括：
 - 数据库连接池管理
-- 异步任务队列
-- 内存缓存系统
+- 数据库写入批处理（组提交）
+- 异步任务队列（可选的持久化任务）
+- 内存缓存系统（可选的跨进程磁盘二级缓存）
 - 消息处理优化
 - 文件存储优化
 
@@ -17,41 +18,177 @@ Performance Optimizer Module
 """
 
 import asyncio
+import bisect
+import heapq
+import itertools
 import logging
 import sqlite3
+import sys
 import threading
 import time
 import json
 import hashlib
+import os
+import weakref
 from typing import Dict, List, Any, Optional, Callable
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from queue import Queue, Empty
-from concurrent.futures import ThreadPoolExecutor
-from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from functools import partial, wraps, lru_cache
 from dataclasses import dataclass
 from pathlib import Path
 
+from db_migrations import migrate
+from db_retry import BUSY_TIMEOUT_MS, configure_connection, begin_immediate, get_lock_stats
+
+try:
+    from telegram.error import RetryAfter, TimedOut
+    TELEGRAM_AVAILABLE = True
+except ImportError:
+    TELEGRAM_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 @dataclass
 class CacheItem:
-    """缓存项数据类"""
+    """缓存项数据类（时间均为 time.monotonic()）"""
     value: Any
-    created_at: datetime
-    expires_at: Optional[datetime] = None
+    created_at: float
+    expires_at: Optional[float] = None
     access_count: int = 0
-    last_access: datetime = None
+    last_access: float = None
+    size: int = 0                  # sizer 估算的字节数
+    namespace: str = 'default'
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    估算对象占用的字节数（容器递归统计元素，最多3层）
+    
+    Args:
+        value: 要估算的对象
+        
+    Returns:
+        int: 估算的字节数
+    """
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _depth + 1) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += estimate_size(vars(value), _depth + 1)
+    return size
+
+class LatencyHistogram:
+    """
+    耗时直方图
+    Latency Histogram
+    
+    按固定的桶边界累计耗时分布，记录开销为一次二分查找，可以长期运行
+    """
+    
+    # 默认桶上界（秒）
+    DEFAULT_BOUNDS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+    
+    def __init__(self, bounds: Optional[tuple] = None):
+        """
+        Args:
+            bounds: 递增的桶上界（秒），最后还有一个 +Inf 桶
+        """
+        self.bounds = tuple(bounds or self.DEFAULT_BOUNDS)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        """记录一次耗时（秒）"""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+    
+    def quantile(self, q: float) -> float:
+        """估算分位数（秒）：在目标所在桶内线性插值，结果不超过观测到的最大值"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for index, n in enumerate(self.counts):
+                if n and seen + n >= target:
+                    lower = self.bounds[index - 1] if index > 0 else 0.0
+                    upper = self.bounds[index] if index < len(self.bounds) else self.max
+                    return min(lower + (upper - lower) * (target - seen) / n, self.max)
+                seen += n
+            return self.max
+    
+    def export(self) -> tuple:
+        """
+        导出累计分布（Prometheus 直方图格式）
+        
+        Returns:
+            tuple: ([(桶上界, 小于等于该上界的累计次数), ...], 总次数, 耗时总和)，最后一个上界为 inf
+        """
+        with self._lock:
+            cumulative = list(itertools.accumulate(self.counts))
+            return list(zip(self.bounds + (float('inf'),), cumulative)), self.count, self.total
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取直方图数据
+        
+        Returns:
+            Dict: 各桶计数（键为以毫秒表示的上界）、总数、平均值和最大值
+        """
+        with self._lock:
+            buckets = {f"<={bound * 1000:g}ms": n for bound, n in zip(self.bounds, self.counts)}
+            buckets['+Inf'] = self.counts[-1]
+            return {
+                'count': self.count,
+                'avg': round(self.total / self.count, 6) if self.count else 0.0,
+                'max': round(self.max, 6),
+                'buckets': buckets
+            }
+
+@dataclass
+class _PooledConnection:
+    """连接池中的连接及其生命周期信息（时间均为 time.monotonic()）"""
+    conn: sqlite3.Connection
+    created_at: float
+    last_used: float
+
+class _PoolWaiter:
+    """等待连接的线程：归还的连接或释放的名额直接交给最早的等待者"""
+    __slots__ = ('condition', 'entry', 'slot')
+    
+    def __init__(self, lock: threading.Lock):
+        self.condition = threading.Condition(lock)
+        self.entry: Optional[_PooledConnection] = None
+        self.slot = False              # 获得了新建连接的名额
 
 class ConnectionPool:
     """
     数据库连接池
     Database Connection Pool
     
-    管理SQLite数据库连接，避免频繁创建/关闭连接
-    支持连接复用和自动清理
+    管理SQLite数据库连接，避免频繁创建/关闭连接：
+    - 连接池耗尽时按先来先到排队，归还的连接直接交给最早的等待者
+    - 连接超过最长寿命或空闲超时后关闭，空闲较久的连接借出前做健康检查
+    - 记录获取连接的等待时间分布
     """
     
-    def __init__(self, db_path: str, pool_size: int = 10, max_overflow: int = 5):
+    def __init__(self, db_path: str, pool_size: int = 10, max_overflow: int = 5,
+                 max_lifetime: float = 3600, idle_timeout: float = 600,
+                 health_check_after: float = 30):
         """
         初始化连接池
         
@@ -59,25 +196,39 @@ class ConnectionPool:
             db_path: 数据库文件路径
             pool_size: 基础连接池大小
             max_overflow: 最大溢出连接数
+            max_lifetime: 连接最长寿命（秒），超过后归还时关闭
+            idle_timeout: 空闲超时（秒），空闲更久的连接不再复用
+            health_check_after: 连接空闲超过该时间（秒）后，借出前先执行健康检查
         """
         self.db_path = db_path
         self.pool_size = pool_size
         self.max_overflow = max_overflow
         self.max_connections = pool_size + max_overflow
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
         
-        # 连接池队列
-        self._pool = Queue(maxsize=self.max_connections)
-        self._overflow_count = 0
-        self._pool_lock = threading.RLock()
+        # 空闲连接：右端为最近归还的连接，优先复用；左端空闲最久
+        self._idle: deque = deque()
+        self._waiters: deque = deque()
+        self._total = 0
+        self._pool_lock = threading.Lock()
         
         # 连接状态跟踪
-        self._active_connections = set()
+        self._active_connections: Dict[sqlite3.Connection, _PooledConnection] = {}
         self._connection_stats = {
             'created': 0,
             'reused': 0,
             'closed': 0,
-            'peak_usage': 0
+            'peak_usage': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'expired': 0,
+            'idle_closed': 0,
+            'health_checks': 0,
+            'health_check_failures': 0
         }
+        self.wait_histogram = LatencyHistogram()
         
         # 初始化基础连接
         self._initialize_pool()
@@ -90,7 +241,10 @@ class ConnectionPool:
             for _ in range(self.pool_size):
                 conn = self._create_connection()
                 if conn:
-                    self._pool.put(conn, block=False)
+                    now = time.monotonic()
+                    with self._pool_lock:
+                        self._total += 1
+                        self._idle.append(_PooledConnection(conn, now, now))
         except Exception as e:
             logger.error(f"初始化连接池失败: {e}")
     
@@ -105,17 +259,19 @@ class ConnectionPool:
             conn = sqlite3.connect(
                 self.db_path,
                 check_same_thread=False,
-                timeout=30.0
+                timeout=BUSY_TIMEOUT_MS / 1000
             )
             
             # 优化设置
+            configure_connection(conn)  # 多进程写入时在库内等待写锁
             conn.execute('PRAGMA journal_mode=WAL')  # WAL模式提高并发性能
             conn.execute('PRAGMA synchronous=NORMAL')  # 平衡安全性和性能
             conn.execute('PRAGMA cache_size=10000')  # 增加缓存大小
             conn.execute('PRAGMA temp_store=MEMORY')  # 临时表存储在内存
             conn.execute('PRAGMA mmap_size=268435456')  # 256MB内存映射
             
-            self._connection_stats['created'] += 1
+            with self._pool_lock:
+                self._connection_stats['created'] += 1
             logger.debug(f"创建新数据库连接: {id(conn)}")
             
             return conn
@@ -124,6 +280,49 @@ class ConnectionPool:
             logger.error(f"创建数据库连接失败: {e}")
             return None
     
+    def _discard(self, entry: _PooledConnection, reason: Optional[str] = None):
+        """关闭连接并释放名额（调用方持有锁）"""
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        self._total -= 1
+        self._connection_stats['closed'] += 1
+        if reason:
+            self._connection_stats[reason] += 1
+    
+    def _checkout(self, entry: _PooledConnection, now: float) -> sqlite3.Connection:
+        """登记借出的连接（调用方持有锁）"""
+        entry.last_used = now
+        self._active_connections[entry.conn] = entry
+        current_usage = len(self._active_connections)
+        if current_usage > self._connection_stats['peak_usage']:
+            self._connection_stats['peak_usage'] = current_usage
+        return entry.conn
+    
+    def _take_idle(self, now: float) -> Optional[_PooledConnection]:
+        """取出一个可用的空闲连接，顺便关闭过期的空闲连接（调用方持有锁）"""
+        # 左端是空闲最久的连接
+        while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+            self._discard(self._idle.popleft(), 'idle_closed')
+        
+        while self._idle:
+            entry = self._idle.pop()
+            if now - entry.created_at > self.max_lifetime:
+                self._discard(entry, 'expired')
+                continue
+            return entry
+        return None
+    
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        """检查连接是否可用（不持有锁）"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"连接健康检查失败，关闭连接: {e}")
+            return False
+    
     def get_connection(self, timeout: float = 10.0) -> Optional[sqlite3.Connection]:
         """
         获取数据库连接
@@ -132,52 +331,73 @@ class ConnectionPool:
             timeout: 获取连接的超时时间(秒)
             
         Returns:
-            sqlite3.Connection: 数据库连接对象
+            sqlite3.Connection: 数据库连接对象，超时返回None
         """
-        start_time = time.time()
+        start_time = time.monotonic()
+        deadline = start_time + timeout
         
-        with self._pool_lock:
-            try:
-                # 尝试从池中获取连接
-                conn = self._pool.get(block=False)
-                self._active_connections.add(conn)
-                self._connection_stats['reused'] += 1
-                
-                # 更新峰值使用统计
-                current_usage = len(self._active_connections)
-                if current_usage > self._connection_stats['peak_usage']:
-                    self._connection_stats['peak_usage'] = current_usage
-                
-                logger.debug(f"从连接池获取连接: {id(conn)}, 活跃连接数: {current_usage}")
-                return conn
-                
-            except Empty:
-                # 连接池为空，检查是否可以创建溢出连接
-                if self._overflow_count < self.max_overflow:
-                    conn = self._create_connection()
-                    if conn:
-                        self._overflow_count += 1
-                        self._active_connections.add(conn)
-                        logger.debug(f"创建溢出连接: {id(conn)}, 溢出数: {self._overflow_count}")
-                        return conn
-                
-                # 等待可用连接
-                logger.warning(f"连接池已满，等待可用连接...")
+        while True:
+            with self._pool_lock:
+                now = time.monotonic()
+                entry = self._take_idle(now)
+                create = False
                 
-        # 超时等待
-        while time.time() - start_time < timeout:
-            time.sleep(0.1)
-            try:
+                if entry is None:
+                    if self._total < self.max_connections:
+                        # 先占用名额，在锁外创建连接
+                        self._total += 1
+                        create = True
+                    else:
+                        # 排队等待归还的连接
+                        waiter = _PoolWaiter(self._pool_lock)
+                        self._waiters.append(waiter)
+                        self._connection_stats['waits'] += 1
+                        while waiter.entry is None and not waiter.slot:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                break
+                            waiter.condition.wait(remaining)
+                        entry = waiter.entry
+                        create = waiter.slot
+                        if entry is None and not create:
+                            self._waiters.remove(waiter)
+                            self._connection_stats['timeouts'] += 1
+                            self.wait_histogram.observe(time.monotonic() - start_time)
+                            logger.error(f"获取数据库连接超时: {timeout}秒")
+                            return None
+            
+            if create:
+                conn = self._create_connection()
                 with self._pool_lock:
-                    conn = self._pool.get(block=False)
-                    self._active_connections.add(conn)
+                    if conn is None:
+                        self._total -= 1
+                        self._wake_waiter_for_slot()
+                        return None
+                    now = time.monotonic()
+                    self.wait_histogram.observe(now - start_time)
+                    return self._checkout(_PooledConnection(conn, now, now), now)
+            
+            # 只有空闲较久的连接才做健康检查
+            now = time.monotonic()
+            check = now - entry.last_used > self.health_check_after
+            healthy = not check or self._is_healthy(entry.conn)
+            with self._pool_lock:
+                if check:
+                    self._connection_stats['health_checks'] += 1
+                if healthy:
                     self._connection_stats['reused'] += 1
-                    return conn
-            except Empty:
-                continue
-        
-        logger.error(f"获取数据库连接超时: {timeout}秒")
-        return None
+                    self.wait_histogram.observe(now - start_time)
+                    return self._checkout(entry, now)
+                self._discard(entry, 'health_check_failures')
+                self._wake_waiter_for_slot()
+    
+    def _wake_waiter_for_slot(self):
+        """释放名额后，把名额交给最早的等待者，由它新建连接（调用方持有锁）"""
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            self._total += 1
+            waiter.slot = True
+            waiter.condition.notify()
     
     def return_connection(self, conn: sqlite3.Connection):
         """
@@ -189,38 +409,65 @@ class ConnectionPool:
         if not conn:
             return
         
-        with self._pool_lock:
-            try:
-                self._active_connections.discard(conn)
-                
-                # 检查连接是否有效
-                conn.execute('SELECT 1')
-                
-                # 清理连接状态
+        # 只有仍处于事务中的连接需要回滚
+        broken = False
+        try:
+            if conn.in_transaction:
                 conn.rollback()
-                
-                # 判断是否为溢出连接
-                if self._overflow_count > 0 and self._pool.qsize() >= self.pool_size:
-                    # 关闭溢出连接
-                    conn.close()
-                    self._overflow_count -= 1
-                    self._connection_stats['closed'] += 1
-                    logger.debug(f"关闭溢出连接: {id(conn)}")
-                else:
-                    # 归还到连接池
-                    self._pool.put(conn, block=False)
-                    logger.debug(f"归还连接到池: {id(conn)}")
-                    
-            except Exception as e:
-                # 连接已损坏，关闭它
-                logger.warning(f"归还损坏的连接: {e}")
+        except sqlite3.Error as e:
+            logger.warning(f"归还损坏的连接: {e}")
+            broken = True
+        
+        with self._pool_lock:
+            entry = self._active_connections.pop(conn, None)
+            if entry is None:
+                # 不是本连接池借出的连接（或连接池已关闭）
                 try:
                     conn.close()
-                    self._connection_stats['closed'] += 1
-                    if self._overflow_count > 0:
-                        self._overflow_count -= 1
-                except:
+                except Exception:
                     pass
+                return
+            
+            now = time.monotonic()
+            entry.last_used = now
+            if broken:
+                self._discard(entry)
+                self._wake_waiter_for_slot()
+            elif now - entry.created_at > self.max_lifetime:
+                self._discard(entry, 'expired')
+                self._wake_waiter_for_slot()
+            elif self._waiters:
+                # 直接交给最早的等待者
+                waiter = self._waiters.popleft()
+                waiter.entry = entry
+                waiter.condition.notify()
+            elif len(self._idle) >= self.pool_size:
+                # 关闭溢出连接
+                self._discard(entry)
+                logger.debug(f"关闭溢出连接: {id(conn)}")
+            else:
+                # 归还到连接池
+                self._idle.append(entry)
+                logger.debug(f"归还连接到池: {id(conn)}")
+    
+    @contextmanager
+    def connection(self, timeout: float = 10.0):
+        """
+        借出一个连接，使用完毕后自动归还
+        
+        Args:
+            timeout: 获取连接的超时时间(秒)
+            
+        Raises:
+            sqlite3.OperationalError: 获取连接超时
+        """
+        conn = self.get_connection(timeout)
+        if conn is None:
+            raise sqlite3.OperationalError("获取数据库连接超时")
+        try:
+            yield conn
+        finally:
+            self.return_connection(conn)
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -233,57 +480,495 @@ class ConnectionPool:
             return {
                 'pool_size': self.pool_size,
                 'max_overflow': self.max_overflow,
-                'current_pool_size': self._pool.qsize(),
+                'current_pool_size': len(self._idle),
                 'active_connections': len(self._active_connections),
-                'overflow_count': self._overflow_count,
-                'stats': self._connection_stats.copy()
+                'overflow_count': max(0, self._total - self.pool_size),
+                'waiting': len(self._waiters),
+                'stats': self._connection_stats.copy(),
+                'wait_time': self.wait_histogram.snapshot(),
+                'wait_p99': self.wait_histogram.quantile(0.99)
             }
     
     def close_all(self):
         """关闭所有连接"""
         with self._pool_lock:
-            # 关闭活跃连接
+            # 关闭活跃连接（之后归还时直接关闭）
             for conn in list(self._active_connections):
                 try:
                     conn.close()
                 except:
                     pass
+            self._total -= len(self._active_connections)
             self._active_connections.clear()
             
             # 关闭池中的连接
-            while not self._pool.empty():
-                try:
-                    conn = self._pool.get(block=False)
-                    conn.close()
-                except:
-                    pass
+            while self._idle:
+                self._discard(self._idle.popleft())
+            
+            # 释放的名额交给等待者，连接池之后仍可使用
+            while self._waiters and self._total < self.max_connections:
+                self._wake_waiter_for_slot()
             
             logger.info("所有数据库连接已关闭")
 
+@dataclass
+class _PendingWrite:
+    """等待批量提交的写操作"""
+    func: Callable[[sqlite3.Connection], Any]
+    future: Future
+    site: str
+
+class WriteBatcher:
+    """
+    数据库写入批处理器（组提交）
+    Group-Commit Write Batcher
+    
+    后台写线程把排队中的写操作合并到同一个事务中提交，一批写入只需要一次 fsync。
+    队列中只有一个写操作时立即提交；有并发写入时再等待 max_delay 合并后续写入。
+    每个写操作在独立的 SAVEPOINT 中执行，单个写操作失败不会影响同批的其他写入；
+    调用方通过各自的 Future 获取结果（例如 lastrowid）。
+    
+    同一连接池只应有一个批处理器（get_pool_batcher），保证只有一个写线程。
+    """
+    
+    def __init__(self, pool: ConnectionPool, max_delay: float = 0.002, max_batch: int = 100):
+        """
+        初始化写入批处理器
+        
+        Args:
+            pool: 用于获取写连接的连接池
+            max_delay: 有并发写入时等待合并后续写入的最长时间(秒)
+            max_batch: 单个事务中最多包含的写操作数
+        """
+        self.pool = pool
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        
+        self._queue: Queue = Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._active_conn: Optional[sqlite3.Connection] = None   # 写线程正在使用的连接
+        
+        # 批处理统计
+        self._stats = {
+            'writes': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_batch_size': 0
+        }
+    
+    def start(self):
+        """启动后台写线程"""
+        with self._lock:
+            self._start_locked()
+    
+    def _start_locked(self):
+        """启动后台写线程（调用方持有 self._lock）"""
+        if self._running:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            # 上一个写线程还在提交停止前的写入，同时运行两个写线程会破坏单写线程的保证
+            raise RuntimeError("写入批处理器正在停止，无法重新启动")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+        logger.info(f"写入批处理器已启动: max_delay={self.max_delay}s, max_batch={self.max_batch}")
+    
+    def stop(self, timeout: float = 5.0):
+        """停止后台写线程，已提交的写操作会全部执行完毕"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"写入批处理器 {timeout}s 内未停止，写线程仍在提交剩余的写入")
+        else:
+            logger.info("写入批处理器已停止")
+    
+    def submit(self, func: Callable[[sqlite3.Connection], Any], site: str = None) -> Future:
+        """
+        提交写操作
+        
+        Args:
+            func: 接收数据库连接并执行写入的函数，其返回值作为 Future 的结果；
+                  函数内不能自行 commit/rollback
+            site: 调用位置，用于锁竞争统计，默认取 func 所在的函数名
+            
+        Returns:
+            Future: 写操作所在事务提交后完成；在批量写入函数内提交时立即完成（随外层事务提交）；
+                    批处理器正在停止、无法执行写入时以 RuntimeError 完成
+        """
+        if threading.current_thread() is self._thread and self._active_conn is not None:
+            # 批量写入函数内再次提交：写线程无法等待自己，直接在当前事务中执行
+            return self._apply_nested(func)
+        
+        if site is None:
+            site = func.__qualname__.split('.<locals>')[0]
+        
+        future = Future()
+        # 检查运行状态和入队在同一把锁内：停止信号之后入队的写操作不会被写线程遗漏
+        with self._lock:
+            try:
+                self._start_locked()
+            except RuntimeError as e:
+                future.set_exception(e)
+                return future
+            self._queue.put(_PendingWrite(func, future, site))
+        return future
+    
+    def execute(self, sql: str, params: tuple = ()) -> Future:
+        """提交单条写入语句，Future 的结果为 lastrowid"""
+        return self.submit(lambda conn: conn.execute(sql, params).lastrowid, site='WriteBatcher.execute')
+    
+    def _apply_nested(self, func: Callable[[sqlite3.Connection], Any]) -> Future:
+        """在写线程当前的事务中执行嵌套提交的写操作"""
+        conn = self._active_conn
+        future = Future()
+        conn.execute('SAVEPOINT nested_write')
+        try:
+            result = func(conn)
+            conn.execute('RELEASE nested_write')
+        except Exception as e:
+            conn.execute('ROLLBACK TO nested_write')
+            conn.execute('RELEASE nested_write')
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        return future
+    
+    def _run(self):
+        """后台写线程主循环"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            
+            # 先取走队列中已有的写操作；队列中只有这一个写入时立即提交，
+            # 有并发写入时再在时间窗口内等待后续写入
+            batch = [item]
+            stop = False
+            deadline = None
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(block=False)
+                except Empty:
+                    if len(batch) == 1:
+                        break
+                    if deadline is None:
+                        deadline = time.monotonic() + self.max_delay
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except Empty:
+                        break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            self._commit_batch(batch)
+            if stop:
+                break
+        
+        # 处理停止信号之后仍在队列中的写操作
+        remaining_items = []
+        while True:
+            try:
+                item = self._queue.get(block=False)
+            except Empty:
+                break
+            if item is not None:
+                remaining_items.append(item)
+        if remaining_items:
+            self._commit_batch(remaining_items)
+    
+    def _commit_batch(self, batch: List[_PendingWrite]):
+        """在一个事务中执行并提交一批写操作"""
+        conn = self.pool.get_connection()
+        if conn is None:
+            error = sqlite3.OperationalError("获取数据库连接超时")
+            for item in batch:
+                item.future.set_exception(error)
+            return
+        
+        conn.row_factory = sqlite3.Row
+        results = []
+        self._active_conn = conn
+        try:
+            begin_immediate(conn, sorted({item.site for item in batch}))
+            for item in batch:
+                conn.execute('SAVEPOINT batch_write')
+                try:
+                    result = item.func(conn)
+                    conn.execute('RELEASE batch_write')
+                    results.append((item, result, None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO batch_write')
+                    conn.execute('RELEASE batch_write')
+                    results.append((item, None, e))
+            conn.commit()
+        except Exception as e:
+            # 事务本身失败（例如提交失败），整批写入均未生效
+            logger.error(f"批量写入提交失败: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            results = [(item, None, e) for item in batch]
+        finally:
+            self._active_conn = None
+            self.pool.return_connection(conn)
+        
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['writes'] += len(batch)
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+        
+        for item, result, error in results:
+            if error is not None:
+                with self._lock:
+                    self._stats['failed'] += 1
+                item.future.set_exception(error)
+            else:
+                item.future.set_result(result)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取批处理统计信息
+        
+        Returns:
+            Dict: 批处理统计数据
+        """
+        with self._lock:
+            stats = self._stats.copy()
+        avg = stats['writes'] / stats['batches'] if stats['batches'] else 0
+        return {
+            'running': self._running,
+            'queue_size': self._queue.qsize(),
+            'avg_batch_size': round(avg, 2),
+            'stats': stats
+        }
+
+# 每个连接池一个写入批处理器（一个写线程）
+_pool_batchers: Dict[ConnectionPool, WriteBatcher] = {}
+_pool_batchers_lock = threading.Lock()
+
+def get_pool_batcher(pool: ConnectionPool) -> WriteBatcher:
+    """获取（必要时创建）连接池对应的写入批处理器"""
+    with _pool_batchers_lock:
+        batcher = _pool_batchers.get(pool)
+        if batcher is None:
+            batcher = _pool_batchers[pool] = WriteBatcher(pool)
+        return batcher
+
+def is_overload_error(error: Optional[BaseException]) -> bool:
+    """判断异常是否表示下游过载：限流（带 retry_after，例如Telegram 429）或超时"""
+    if error is None:
+        return False
+    if getattr(error, 'retry_after', None) is not None:
+        return True
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    return TELEGRAM_AVAILABLE and isinstance(error, (RetryAfter, TimedOut))
+
+class AdaptiveLimiter:
+    """
+    自适应并发限制
+    Adaptive Concurrency Limiter
+    
+    按 AIMD 调整一类任务的并发上限（只在事件循环线程中使用）：
+    - 并发接近上限且执行成功时，每完成约 limit 个任务上限加1
+    - 出现限流/超时，或耗时超过无负载耗时的 latency_tolerance 倍时，上限乘以 backoff_ratio
+    - 只有在上一次降低之后才启动的任务能再次触发降低，同一批并发任务的失败只降低一次
+    - 限流异常带 retry_after 时，该类别在这段时间内暂停启动新任务
+    """
+    
+    def __init__(self, name: str, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 10,
+                 backoff_ratio: float = 0.5, latency_tolerance: float = 2.0):
+        """
+        Args:
+            name: 任务类别
+            initial_limit: 初始并发上限
+            min_limit: 最小并发上限
+            max_limit: 最大并发上限
+            backoff_ratio: 降低上限时的乘数
+            latency_tolerance: 耗时超过无负载耗时的该倍数时视为过载
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        
+        self.in_flight = 0
+        self._baseline: Optional[float] = None   # 缓慢上升的最小耗时，近似无负载耗时
+        self._avg_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self.paused_until = 0.0                  # time.monotonic()，限流暂停结束时间
+        self._changes: deque = deque(maxlen=20)
+        self._stats = {
+            'completed': 0,
+            'errors': 0,
+            'overloads': 0,
+            'increases': 0,
+            'decreases': 0
+        }
+    
+    @property
+    def available(self) -> int:
+        """当前可以新启动的任务数"""
+        if time.monotonic() < self.paused_until:
+            return 0
+        return max(0, int(self.limit) - self.in_flight)
+    
+    def try_acquire(self) -> bool:
+        """占用一个并发名额，已达上限或限流暂停中时返回False"""
+        if self.in_flight >= int(self.limit) or time.monotonic() < self.paused_until:
+            return False
+        self.in_flight += 1
+        return True
+    
+    def cancel(self):
+        """归还未使用的名额（不计入统计）"""
+        self.in_flight -= 1
+    
+    def release(self, latency: float, error: Optional[BaseException] = None):
+        """
+        任务结束，归还名额并按结果调整上限
+        
+        Args:
+            latency: 任务耗时（秒）
+            error: 任务抛出的异常，成功时为None
+        """
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        self._stats['completed'] += 1
+        
+        if error is not None:
+            self._stats['errors'] += 1
+        overloaded = is_overload_error(error)
+        if overloaded:
+            self._stats['overloads'] += 1
+        
+        if error is None:
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                self._baseline += (latency - self._baseline) * 0.01
+            self._avg_latency = latency if self._avg_latency is None else self._avg_latency * 0.9 + latency * 0.1
+            if latency > self._baseline * self.latency_tolerance and self._baseline > 0:
+                overloaded = True
+        
+        if overloaded:
+            now = time.monotonic()
+            retry_after = getattr(error, 'retry_after', None)
+            if retry_after is not None:
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                self.paused_until = max(self.paused_until, now + float(retry_after))
+            
+            # 在上一次降低之前启动的任务反映的是旧的并发上限
+            if now - latency >= self._last_decrease:
+                self._last_decrease = now
+                self._set_limit(max(self.min_limit, self.limit * self.backoff_ratio),
+                                'rate_limited' if retry_after is not None
+                                else 'timeout' if error is not None else 'latency')
+                self._stats['decreases'] += 1
+        elif error is None and saturated and self.limit < self.max_limit:
+            self._set_limit(min(self.max_limit, self.limit + 1 / self.limit), 'increase')
+    
+    def _set_limit(self, limit: float, reason: str):
+        old = int(self.limit)
+        self.limit = limit
+        if int(limit) != old:
+            if int(limit) > old:
+                self._stats['increases'] += 1
+            self._changes.append((round(time.time(), 3), old, int(limit), reason))
+            logger.debug(f"任务类别 {self.name} 并发上限 {old} -> {int(limit)} ({reason})")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取并发限制统计信息
+        
+        Returns:
+            Dict: 当前上限、执行中的任务数、耗时和最近的上限变化 (时间, 原上限, 新上限, 原因)
+        """
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'paused_for': round(max(0.0, self.paused_until - time.monotonic()), 3),
+            'baseline_latency': round(self._baseline, 4) if self._baseline is not None else None,
+            'avg_latency': round(self._avg_latency, 4) if self._avg_latency is not None else None,
+            'recent_changes': list(self._changes),
+            'stats': self._stats.copy()
+        }
+
+class PermanentTaskError(Exception):
+    """持久化任务的处理函数抛出此异常时不再重试，直接转入死信"""
+
 class AsyncTaskQueue:
     """
     异步任务队列
     Asynchronous Task Queue
     
-    管理异步任务的执行，支持优先级和并发控制
+    管理异步任务的执行，支持优先级和并发控制：
+    - 任务按类别（task_class，持久化任务为任务名称）分别用 AdaptiveLimiter 控制并发，
+      某一类达到上限时只暂存该类任务，不阻塞其他类别
+    
+    传入连接池时同时启用持久化任务（task_queue 表），进程重启后继续执行：
+    - 任务按名称分派给 register_handler 注册的处理函数，参数为可JSON序列化的 payload
+    - 领取任务时加租约，租约在 visibility_timeout 后过期，其他进程可以重新领取
+    - 失败的任务按指数退避重试，超过最大尝试次数后转入死信（status='dead'）
+    - 处理函数可能被重复执行（至少执行一次），必须可以安全地重复执行
     """
     
-    def __init__(self, max_workers: int = 10, max_queue_size: int = 1000):
+    def __init__(self, max_workers: int = 10, max_queue_size: int = 1000,
+                 max_concurrency: Optional[int] = None, initial_concurrency: int = 4,
+                 pool: Optional[ConnectionPool] = None, worker_id: Optional[str] = None,
+                 visibility_timeout: float = 300, max_attempts: int = 5,
+                 retry_delay: float = 5.0, max_retry_delay: float = 3600,
+                 poll_interval: float = 1.0, shutdown_grace: float = 5.0):
         """
         初始化任务队列
         
         Args:
-            max_workers: 最大工作线程数
+            max_workers: 最大工作线程数（执行同步任务）
             max_queue_size: 最大队列大小
+            max_concurrency: 每类任务的最大并发数，None表示与 max_workers 相同
+            initial_concurrency: 每类任务的初始并发数
+            pool: 数据库连接池，None表示只使用内存队列
+            worker_id: 持久化任务的租约持有者标识；同一标识在同一时间只能有一个进程使用，
+                启动时会立即收回该标识之前未完成的租约
+            visibility_timeout: 租约有效期（秒），超过后任务可被重新领取
+            max_attempts: 持久化任务的默认最大尝试次数
+            retry_delay: 第一次重试前的等待时间（秒），之后每次翻倍
+            max_retry_delay: 重试等待时间上限（秒）
+            poll_interval: 没有可执行任务时查询 task_queue 表的间隔（秒）
+            shutdown_grace: 停止时等待正在执行的持久化任务完成的时间（秒）
         """
         self.max_workers = max_workers
         self.max_queue_size = max_queue_size
         
         # 任务队列（优先级队列）
         self._task_queue = asyncio.PriorityQueue(maxsize=max_queue_size)
-        self._workers = []
+        self._sequence = itertools.count()   # 优先级和提交时间相同时按提交顺序，避免比较任务函数
+        self._dispatcher: Optional[asyncio.Task] = None
         self._running = False
         
+        # 按任务类别的并发控制：达到上限的任务按优先级暂存
+        self.max_concurrency = max_concurrency or max_workers
+        self.initial_concurrency = initial_concurrency
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._parked: Dict[str, list] = {}
+        self._running_tasks: set = set()
+        self._resume_handles: Dict[str, asyncio.TimerHandle] = {}
+        
         # 任务统计
         self._task_stats = {
             'submitted': 0,
@@ -295,7 +980,37 @@ class AsyncTaskQueue:
         # 线程池执行器
         self._executor = ThreadPoolExecutor(max_workers=max_workers)
         
-        logger.info(f"异步任务队列初始化: max_workers={max_workers}, max_queue_size={max_queue_size}")
+        # 持久化任务
+        self.pool = pool
+        self.worker_id = worker_id or f"pid-{os.getpid()}"
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.poll_interval = poll_interval
+        self.shutdown_grace = shutdown_grace
+        
+        self._handlers: Dict[str, Callable] = {}
+        self._dead_handlers: Dict[str, Callable] = {}
+        self._durable_loop: Optional[asyncio.Task] = None
+        self._durable_tasks: set = set()
+        self._lease_future: Optional[Future] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._db_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='task-queue-db') if pool else None
+        self._durable_stats = {
+            'enqueued': 0,
+            'completed': 0,
+            'retried': 0,
+            'dead_lettered': 0,
+            'resumed': 0
+        }
+        
+        if pool is not None:
+            with pool.connection() as conn:
+                migrate(conn)
+        
+        logger.info(f"异步任务队列初始化: max_workers={max_workers}, max_queue_size={max_queue_size}, "
+                    f"durable={pool is not None}")
     
     async def start(self):
         """启动任务队列处理"""
@@ -304,97 +1019,146 @@ class AsyncTaskQueue:
         
         self._running = True
         
-        # 启动工作协程
-        for i in range(self.max_workers):
-            worker = asyncio.create_task(self._worker(f"worker-{i}"))
-            self._workers.append(worker)
+        # 启动分派协程
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        
+        if self.pool is not None:
+            # 上一次运行（同一 worker_id）未完成的任务立即恢复，不必等待租约过期
+            resumed = await self._run_db(self._release_leases, False)
+            self._durable_stats['resumed'] += resumed
+            if resumed:
+                logger.info(f"恢复 {resumed} 个未完成的持久化任务")
+            self._wakeup = asyncio.Event()
+            self._durable_loop = asyncio.create_task(self._durable_dispatcher())
         
-        logger.info(f"异步任务队列已启动: {len(self._workers)} 个工作协程")
+        logger.info("异步任务队列已启动")
     
     async def stop(self):
         """停止任务队列处理"""
         if not self._running:
             return
         
-        self._running = False
+        # 先停止领取持久化任务，未完成的任务交还给队列，由下次启动或其他进程继续执行
+        if self._durable_loop is not None:
+            self._durable_loop.cancel()
+            await asyncio.gather(self._durable_loop, return_exceptions=True)
+            self._durable_loop = None
+            # 已在数据库线程中执行的领取无法取消，等它提交后再交还租约，否则领取的任务要等租约过期
+            if self._lease_future is not None:
+                await asyncio.gather(asyncio.wrap_future(self._lease_future), return_exceptions=True)
+                self._lease_future = None
+            
+            if self._durable_tasks:
+                _, unfinished = await asyncio.wait(self._durable_tasks, timeout=self.shutdown_grace)
+                for task in unfinished:
+                    task.cancel()
+                await asyncio.gather(*unfinished, return_exceptions=True)
+            released = await self._run_db(self._release_leases, True)
+            if released:
+                logger.info(f"交还 {released} 个未完成的持久化任务")
         
-        # 等待所有任务完成
+        # 等待所有任务完成（包括暂存的任务）
         await self._task_queue.join()
+        self._running = False
         
-        # 取消工作协程
-        for worker in self._workers:
-            worker.cancel()
-        
-        await asyncio.gather(*self._workers, return_exceptions=True)
-        self._workers.clear()
+        # 取消分派协程
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
         
         # 关闭线程池
         self._executor.shutdown(wait=True)
+        if self._db_executor is not None:
+            self._db_executor.shutdown(wait=True)
         
         logger.info("异步任务队列已停止")
     
-    async def _worker(self, name: str):
-        """
-        工作协程
+    def _get_limiter(self, task_class: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(task_class)
+        if limiter is None:
+            limiter = AdaptiveLimiter(task_class, initial_limit=self.initial_concurrency,
+                                      max_limit=self.max_concurrency)
+            self._limiters[task_class] = limiter
+        return limiter
+    
+    async def _dispatch(self):
+        """分派协程：取出任务，所属类别有空闲名额时立即执行，否则暂存"""
+        while True:
+            item = await self._task_queue.get()
+            task_class = item[3]
+            if self._get_limiter(task_class).try_acquire():
+                self._start_task(item)
+            else:
+                heapq.heappush(self._parked.setdefault(task_class, []), item)
+    
+    def _start_task(self, item: tuple):
+        task = asyncio.create_task(self._run_task(item))
+        self._running_tasks.add(task)
+        task.add_done_callback(self._running_tasks.discard)
+    
+    def _start_parked(self, task_class: str):
+        """类别有空闲名额时按优先级启动暂存的任务；限流暂停中时在暂停结束后再启动"""
+        parked = self._parked.get(task_class)
+        limiter = self._limiters[task_class]
+        while parked and limiter.try_acquire():
+            self._start_task(heapq.heappop(parked))
         
-        Args:
-            name: 工作协程名称
-        """
-        logger.debug(f"工作协程启动: {name}")
+        pause = limiter.paused_until - time.monotonic()
+        if parked and pause > 0 and task_class not in self._resume_handles:
+            loop = asyncio.get_running_loop()
+            self._resume_handles[task_class] = loop.call_later(pause, self._resume_parked, task_class)
+    
+    def _resume_parked(self, task_class: str):
+        self._resume_handles.pop(task_class, None)
+        self._start_parked(task_class)
+    
+    async def _run_task(self, item: tuple):
+        """执行一个已占用并发名额的任务"""
+        priority, submit_time, _, task_class, task_func, args, kwargs, future = item
+        limiter = self._limiters[task_class]
+        error = None
+        start = time.monotonic()
         
-        while self._running:
-            try:
-                # 获取任务（优先级，提交时间，任务函数，参数）
-                priority, submit_time, task_func, args, kwargs, future = await asyncio.wait_for(
-                    self._task_queue.get(), timeout=1.0
+        try:
+            # 执行任务
+            if asyncio.iscoroutinefunction(task_func):
+                # 异步函数
+                result = await task_func(*args, **kwargs)
+            else:
+                # 同步函数，在线程池中执行
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self._executor, partial(task_func, *args, **kwargs)
                 )
-                
-                try:
-                    # 执行任务
-                    if asyncio.iscoroutinefunction(task_func):
-                        # 异步函数
-                        result = await task_func(*args, **kwargs)
-                    else:
-                        # 同步函数，在线程池中执行
-                        loop = asyncio.get_event_loop()
-                        result = await loop.run_in_executor(
-                            self._executor, task_func, *args, **kwargs
-                        )
-                    
-                    # 设置结果
-                    if not future.done():
-                        future.set_result(result)
-                    
-                    self._task_stats['completed'] += 1
-                    logger.debug(f"{name}: 任务完成 - {task_func.__name__}")
-                    
-                except Exception as e:
-                    # 任务执行失败
-                    if not future.done():
-                        future.set_exception(e)
-                    
-                    self._task_stats['failed'] += 1
-                    logger.error(f"{name}: 任务失败 - {task_func.__name__}: {e}")
-                
-                finally:
-                    # 标记任务完成
-                    self._task_queue.task_done()
-                    self._task_stats['pending'] -= 1
-                    
-            except asyncio.TimeoutError:
-                # 超时，继续等待
-                continue
-            except asyncio.CancelledError:
-                # 被取消
-                logger.debug(f"工作协程被取消: {name}")
-                break
-            except Exception as e:
-                logger.error(f"工作协程异常: {name}: {e}")
+            
+            # 设置结果
+            if not future.done():
+                future.set_result(result)
+            
+            self._task_stats['completed'] += 1
+            logger.debug(f"任务完成 - {task_func.__name__}")
+            
+        except Exception as e:
+            # 任务执行失败
+            error = e
+            if not future.done():
+                future.set_exception(e)
+            
+            self._task_stats['failed'] += 1
+            logger.error(f"任务失败 - {task_func.__name__}: {e}")
+        
+        finally:
+            # 标记任务完成
+            limiter.release(time.monotonic() - start, error)
+            self._task_queue.task_done()
+            self._task_stats['pending'] -= 1
+            self._start_parked(task_class)
     
     async def submit_task(self, 
                          task_func: Callable, 
                          *args, 
                          priority: int = 5, 
+                         task_class: str = 'default',
                          **kwargs) -> asyncio.Future:
         """
         提交任务到队列
@@ -403,6 +1167,7 @@ class AsyncTaskQueue:
             task_func: 任务函数
             *args: 位置参数
             priority: 优先级（数字越小优先级越高）
+            task_class: 任务类别，同一类别共享自适应并发上限（例如访问同一个下游接口的任务）
             **kwargs: 关键字参数
             
         Returns:
@@ -416,7 +1181,9 @@ class AsyncTaskQueue:
         
         # 提交任务
         submit_time = time.time()
-        await self._task_queue.put((priority, submit_time, task_func, args, kwargs, future))
+        await self._task_queue.put(
+            (priority, submit_time, next(self._sequence), task_class, task_func, args, kwargs, future)
+        )
         
         self._task_stats['submitted'] += 1
         self._task_stats['pending'] += 1
@@ -425,43 +1192,492 @@ class AsyncTaskQueue:
         
         return future
     
-    def get_stats(self) -> Dict[str, Any]:
+    def register_handler(self, name: str, handler: Callable[[Dict[str, Any]], Any],
+                         on_dead: Optional[Callable[[Dict[str, Any], Exception], Any]] = None):
         """
-        获取任务队列统计信息
+        注册持久化任务的处理函数
         
-        Returns:
-            Dict: 任务队列统计数据
+        Args:
+            name: 任务名称
+            handler: 处理函数（同步或异步），参数为任务的 payload；
+                抛出异常时重试，异常带 retry_after 属性（秒）时按该时间重试，
+                抛出 PermanentTaskError 时直接转入死信
+            on_dead: 任务转入死信后调用的函数（同步或异步），参数为 payload 和最后一次的异常，
+                用于记录最终结果
         """
-        return {
+        self._handlers[name] = handler
+        if on_dead is not None:
+            self._dead_handlers[name] = on_dead
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def submit_durable(self, name: str, payload: Optional[Dict[str, Any]] = None,
+                             priority: int = 5, delay: float = 0,
+                             max_attempts: Optional[int] = None) -> int:
+        """
+        提交持久化任务（队列未启动时也可以提交，启动后执行）
+        
+        Args:
+            name: 任务名称（对应 register_handler 注册的处理函数，可以由其他进程处理）
+            payload: 任务参数，必须可以JSON序列化
+            priority: 优先级（数字越小优先级越高）
+            delay: 延迟执行的时间（秒）
+            max_attempts: 最大尝试次数，None表示使用队列默认值
+            
+        Returns:
+            int: 任务ID
+        """
+        if self.pool is None:
+            raise RuntimeError("任务队列未启用持久化")
+        
+        task_id = await self._run_db(
+            self._insert_task, name, json.dumps(payload or {}, ensure_ascii=False),
+            priority, delay, max_attempts or self.max_attempts
+        )
+        self._durable_stats['enqueued'] += 1
+        if self._wakeup is not None and delay <= 0:
+            self._wakeup.set()
+        
+        logger.debug(f"持久化任务已提交: {name}#{task_id}, 优先级: {priority}")
+        return task_id
+    
+    async def _run_db(self, func: Callable, *args) -> Any:
+        """在数据库线程池中执行 task_queue 表操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, func, *args)
+    
+    def _insert_task(self, name: str, payload: str, priority: int, delay: float, max_attempts: int) -> int:
+        now = time.time()
+        with self.pool.connection() as conn:
+            begin_immediate(conn, 'AsyncTaskQueue.submit')
+            try:
+                cursor = conn.execute('''
+                    INSERT INTO task_queue (name, payload, priority, max_attempts, available_at, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (name, payload, priority, max_attempts, now + delay, now, now))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return cursor.lastrowid
+    
+    def _lease_tasks(self, quotas: Dict[str, int]) -> List[tuple]:
+        """按任务名称领取可执行的任务（待执行或租约已过期），每个名称最多领取 quotas 中的数量"""
+        if not quotas:
+            return []
+        
+        now = time.time()
+        rows = []
+        with self.pool.connection() as conn:
+            # 先只读检查是否有可领取的任务，队列空闲时轮询不占用写锁
+            placeholders = ','.join('?' * len(quotas))
+            ready = conn.execute(f'''
+                SELECT 1 FROM task_queue
+                WHERE ((status = 'pending' AND available_at <= ?)
+                       OR (status = 'leased' AND lease_expires_at <= ?))
+                  AND name IN ({placeholders})
+                LIMIT 1
+            ''', (now, now, *quotas)).fetchone()
+            if ready is None:
+                return []
+            
+            begin_immediate(conn, 'AsyncTaskQueue.lease')
+            try:
+                for name, limit in quotas.items():
+                    rows.extend(conn.execute('''
+                        UPDATE task_queue SET
+                            status = 'leased', lease_owner = ?, lease_expires_at = ?,
+                            attempts = attempts + 1, updated_at = ?
+                        WHERE id IN (
+                            SELECT id FROM task_queue
+                            WHERE name = ?
+                              AND ((status = 'pending' AND available_at <= ?)
+                                   OR (status = 'leased' AND lease_expires_at <= ?))
+                            ORDER BY priority, available_at, id
+                            LIMIT ?
+                        )
+                        RETURNING id, name, payload, attempts, max_attempts
+                    ''', (self.worker_id, now + self.visibility_timeout, now, name, now, now, limit)).fetchall())
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return rows
+    
+    def _finish_task(self, task_id: int, status: Optional[str], error: Optional[str] = None,
+                     retry_at: Optional[float] = None) -> bool:
+        """
+        结束本进程持有租约的任务
+        
+        Args:
+            status: None表示执行成功（删除任务），'pending' 表示稍后重试，'dead' 表示转入死信
+        
+        Returns:
+            bool: 租约是否仍属于本进程（租约过期后被其他进程领取时为False）
+        """
+        now = time.time()
+        with self.pool.connection() as conn:
+            begin_immediate(conn, 'AsyncTaskQueue.finish')
+            try:
+                if status is None:
+                    cursor = conn.execute(
+                        "DELETE FROM task_queue WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                        (task_id, self.worker_id)
+                    )
+                else:
+                    cursor = conn.execute('''
+                        UPDATE task_queue SET
+                            status = ?, last_error = ?, available_at = COALESCE(?, available_at),
+                            lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                        WHERE id = ? AND status = 'leased' AND lease_owner = ?
+                    ''', (status, error, retry_at, now, task_id, self.worker_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return cursor.rowcount > 0
+    
+    def _release_leases(self, refund_attempt: bool) -> int:
+        """交还本 worker_id 持有的全部租约，返回交还的任务数"""
+        with self.pool.connection() as conn:
+            begin_immediate(conn, 'AsyncTaskQueue.release')
+            try:
+                cursor = conn.execute('''
+                    UPDATE task_queue SET
+                        status = 'pending', lease_owner = NULL, lease_expires_at = NULL,
+                        attempts = MAX(attempts - ?, 0), updated_at = ?
+                    WHERE status = 'leased' AND lease_owner = ?
+                ''', (1 if refund_attempt else 0, time.time(), self.worker_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return cursor.rowcount
+    
+    async def _durable_dispatcher(self):
+        """按各任务名称空闲的并发名额领取持久化任务，没有任务时等待提交通知或轮询间隔"""
+        while self._running:
+            self._wakeup.clear()
+            # 领取前先占用名额，领取期间内存任务不会占满这些名额
+            quotas = {}
+            for name in list(self._handlers):
+                limiter = self._get_limiter(name)
+                reserved = 0
+                while limiter.try_acquire():
+                    reserved += 1
+                if reserved:
+                    quotas[name] = reserved
+            
+            try:
+                self._lease_future = self._db_executor.submit(self._lease_tasks, quotas)
+                rows = await asyncio.wrap_future(self._lease_future)
+            except asyncio.CancelledError:
+                for name, reserved in quotas.items():
+                    for _ in range(reserved):
+                        self._limiters[name].cancel()
+                raise
+            except Exception as e:
+                logger.error(f"领取持久化任务失败: {e}")
+                rows = []
+            
+            for row in rows:
+                quotas[row[1]] -= 1
+                task = asyncio.create_task(self._run_durable(*row))
+                self._durable_tasks.add(task)
+                task.add_done_callback(self._durable_task_done)
+            for name, unused in quotas.items():
+                for _ in range(unused):
+                    self._limiters[name].cancel()
+            
+            # 所有类别都已达并发上限，或已领取完当前可执行的任务
+            if not quotas or any(quotas.values()):
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+    
+    def _durable_task_done(self, task: asyncio.Task):
+        self._durable_tasks.discard(task)
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _run_durable(self, task_id: int, name: str, payload: str, attempts: int, max_attempts: int):
+        """执行一个已领取（并已占用并发名额）的持久化任务并记录结果"""
+        limiter = self._limiters[name]
+        if attempts > max_attempts:
+            # 最后一次尝试时进程退出，租约过期后不再执行
+            limiter.cancel()
+            await self._fail_durable(task_id, name, attempts, max_attempts,
+                                     PermanentTaskError("最后一次尝试未完成（租约已过期）"), payload)
+            return
+        
+        start = time.monotonic()
+        try:
+            handler = self._handlers[name]
+            data = json.loads(payload)
+            if asyncio.iscoroutinefunction(handler):
+                await handler(data)
+            else:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self._executor, handler, data)
+        except asyncio.CancelledError:
+            limiter.cancel()
+            raise
+        except Exception as e:
+            limiter.release(time.monotonic() - start, e)
+            self._start_parked(name)
+            await self._fail_durable(task_id, name, attempts, max_attempts, e, payload)
+            return
+        
+        limiter.release(time.monotonic() - start)
+        self._start_parked(name)
+        if await self._run_db(self._finish_task, task_id, None):
+            self._durable_stats['completed'] += 1
+            logger.debug(f"持久化任务完成: {name}#{task_id}")
+        else:
+            logger.warning(f"持久化任务完成时租约已过期: {name}#{task_id}")
+    
+    async def _fail_durable(self, task_id: int, name: str, attempts: int, max_attempts: int, e: Exception,
+                            payload: str):
+        """记录持久化任务失败：稍后重试或转入死信"""
+        error = f"{type(e).__name__}: {e}"
+        if isinstance(e, PermanentTaskError) or attempts >= max_attempts:
+            await self._run_db(self._finish_task, task_id, 'dead', error)
+            self._durable_stats['dead_lettered'] += 1
+            logger.error(f"持久化任务转入死信: {name}#{task_id}（第 {attempts} 次尝试）: {error}")
+            await self._notify_dead(name, payload, e)
+            return
+        
+        retry_after = getattr(e, 'retry_after', None)
+        if retry_after is None:
+            delay = min(self.max_retry_delay, self.retry_delay * (2 ** (attempts - 1)))
+        else:
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            delay = float(retry_after)
+        await self._run_db(self._finish_task, task_id, 'pending', error, time.time() + delay)
+        self._durable_stats['retried'] += 1
+        logger.warning(f"持久化任务失败，{delay:.1f}s 后重试: {name}#{task_id}（第 {attempts} 次尝试）: {error}")
+    
+    async def _notify_dead(self, name: str, payload: str, e: Exception):
+        """调用任务的 on_dead 函数（失败只记录日志）"""
+        on_dead = self._dead_handlers.get(name)
+        if on_dead is None:
+            return
+        try:
+            data = json.loads(payload)
+            if asyncio.iscoroutinefunction(on_dead):
+                await on_dead(data, e)
+            else:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self._executor, on_dead, data, e)
+        except Exception as callback_error:
+            logger.error(f"持久化任务 {name} 的死信回调失败: {callback_error}")
+    
+    def get_dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        获取死信任务
+        
+        Returns:
+            List[Dict]: 最近转入死信的任务
+        """
+        with self.pool.connection() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute('''
+                SELECT id, name, payload, attempts, last_error, created_at, updated_at
+                FROM task_queue WHERE status = 'dead'
+                ORDER BY updated_at DESC LIMIT ?
+            ''', (limit,)).fetchall()
+            return [dict(row) for row in rows]
+    
+    def requeue_dead_letter(self, task_id: int) -> bool:
+        """
+        重新执行死信任务（尝试次数清零）
+        
+        Returns:
+            bool: 任务是否存在且处于死信状态
+        """
+        with self.pool.connection() as conn:
+            begin_immediate(conn, 'AsyncTaskQueue.requeue')
+            try:
+                cursor = conn.execute('''
+                    UPDATE task_queue SET status = 'pending', attempts = 0, available_at = ?, updated_at = ?
+                    WHERE id = ? AND status = 'dead'
+                ''', (time.time(), time.time(), task_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if cursor.rowcount and self._wakeup is not None:
+            self._wakeup.set()
+        return cursor.rowcount > 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取任务队列统计信息
+        
+        Returns:
+            Dict: 任务队列统计数据
+        """
+        parked = {task_class: len(items) for task_class, items in self._parked.items()}
+        concurrency = {}
+        for task_class, limiter in self._limiters.items():
+            concurrency[task_class] = limiter.get_stats()
+            concurrency[task_class]['queued'] = parked.get(task_class, 0)
+        
+        stats = {
             'max_workers': self.max_workers,
             'running': self._running,
-            'queue_size': self._task_queue.qsize(),
+            'queue_size': self._task_queue.qsize() + sum(parked.values()),
+            'in_flight': sum(limiter.in_flight for limiter in self._limiters.values()),
+            'concurrency': concurrency,
             'stats': self._task_stats.copy()
         }
+        
+        if self.pool is not None:
+            durable = dict(self._durable_stats, in_flight=len(self._durable_tasks), handlers=sorted(self._handlers))
+            try:
+                with self.pool.connection() as conn:
+                    durable['by_status'] = dict(conn.execute(
+                        'SELECT status, COUNT(*) FROM task_queue GROUP BY status'
+                    ).fetchall())
+            except sqlite3.Error as e:
+                logger.warning(f"读取持久化任务统计失败: {e}")
+            stats['durable'] = durable
+        
+        return stats
+
+class ExpiryScheduler:
+    """
+    缓存过期调度器
+    Cache Expiry Scheduler
+    
+    进程内所有 MemoryCache 共用一个后台线程清理过期缓存项：
+    - 按各缓存最早的过期时间排成小顶堆，到期才唤醒，不做周期性全量扫描
+    - 唤醒时间按 resolution 推迟，相近时间过期的项在同一次唤醒中清理
+    - 每次最多清理 batch_size 个过期项，剩余的让出给其他缓存后再处理
+    - 只持有缓存的弱引用，缓存被回收后自动移除
+    """
+    
+    def __init__(self, batch_size: int = 256, resolution: float = 0.1):
+        """
+        初始化调度器
+        
+        Args:
+            batch_size: 单个缓存每次最多清理的过期项数
+            resolution: 唤醒时间精度（秒）
+        """
+        self.batch_size = batch_size
+        self.resolution = resolution
+        
+        self._heap: List[tuple] = []            # (到期时间, 序号, 缓存弱引用)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        
+        self._stats = {
+            'runs': 0,
+            'expired': 0
+        }
+    
+    def schedule(self, cache: 'MemoryCache', deadline: float):
+        """
+        安排在 deadline（time.monotonic()）时清理缓存
+        
+        Args:
+            cache: 缓存实例
+            deadline: 到期时间
+        """
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), weakref.ref(cache)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cache-expiry', daemon=True)
+                self._thread.start()
+            elif self._heap[0][0] == deadline:
+                # 新的到期时间最早，唤醒线程重新计算等待时间
+                self._condition.notify()
+    
+    def _run(self):
+        """后台线程主循环"""
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] + self.resolution > time.monotonic():
+                    timeout = self._heap[0][0] + self.resolution - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout)
+                _, _, cache_ref = heapq.heappop(self._heap)
+            
+            cache = cache_ref()
+            if cache is None:
+                continue
+            
+            try:
+                expired, next_deadline = cache._expire_due(self.batch_size)
+            except Exception as e:
+                logger.error(f"清理过期缓存失败: {e}")
+                continue
+            
+            with self._condition:
+                self._stats['runs'] += 1
+                self._stats['expired'] += expired
+            
+            if next_deadline is not None:
+                self.schedule(cache, next_deadline)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度统计"""
+        with self._condition:
+            return dict(self._stats, scheduled=len(self._heap))
+
+# 进程内共享的过期调度器
+_expiry_scheduler = ExpiryScheduler()
+
+def get_expiry_scheduler() -> ExpiryScheduler:
+    """获取进程内共享的缓存过期调度器"""
+    return _expiry_scheduler
 
 class MemoryCache:
     """
     内存缓存系统
     Memory Cache System
     
-    提供高性能的内存缓存功能，支持TTL和LRU策略
+    提供高性能的内存缓存功能，支持TTL和LRU策略：
+    - 基于 OrderedDict 的LRU，get/set/delete 均为 O(1)
+    - 可选的总字节数上限（字节数由可替换的 sizer 估算）
+    - 按命名空间（键中第一个分隔符之前的部分，如 "config:xxx"）限制条目数
+    - 按命名空间统计命中、未命中和驱逐次数
     """
     
-    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
+    DEFAULT_NAMESPACE = 'default'
+    
+    def __init__(self, max_size: int = 1000, default_ttl: int = 3600,
+                 max_bytes: Optional[int] = None,
+                 sizer: Optional[Callable[[Any], int]] = None,
+                 namespace_quotas: Optional[Dict[str, int]] = None,
+                 namespace_separator: str = ':'):
         """
         初始化缓存系统
         
         Args:
             max_size: 最大缓存条目数
             default_ttl: 默认TTL（秒）
+            max_bytes: 最大总字节数，None表示不限制
+            sizer: 估算缓存值字节数的函数，默认为 estimate_size（仅在设置 max_bytes 时使用）
+            namespace_quotas: 各命名空间的最大条目数
+            namespace_separator: 命名空间与键其余部分之间的分隔符
         """
         self.max_size = max_size
         self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.sizer = sizer or estimate_size
+        self.namespace_quotas = dict(namespace_quotas or {})
+        self.namespace_separator = namespace_separator
         
-        # 缓存存储
-        self._cache: Dict[str, CacheItem] = {}
-        self._access_order: List[str] = []  # LRU访问顺序
-        self._lock = threading.RLock()
+        # 缓存存储：全局LRU顺序（最近使用的在末尾）
+        self._cache: OrderedDict = OrderedDict()
+        # 各命名空间的LRU顺序，用于按配额驱逐
+        self._namespaces: Dict[str, OrderedDict] = {}
+        self._current_bytes = 0
+        self._lock = threading.Lock()
         
         # 缓存统计
         self._stats = {
@@ -469,61 +1685,86 @@ class MemoryCache:
             'misses': 0,
             'sets': 0,
             'deletes': 0,
-            'evictions': 0
+            'evictions': 0,
+            'expirations': 0
         }
+        self._namespace_stats: Dict[str, Dict[str, int]] = {}
         
-        # 清理定时器
-        self._cleanup_timer = None
-        self._start_cleanup_timer()
+        # 过期时间堆：(过期时间, 键)，键被覆盖或删除后留下的旧记录在弹出时跳过
+        self._expiry_heap: List[tuple] = []
+        self._scheduled_at: Optional[float] = None   # 已在调度器中登记的最早清理时间
+        self._scheduler = get_expiry_scheduler()
         
-        logger.info(f"内存缓存初始化: max_size={max_size}, default_ttl={default_ttl}")
+        logger.info(f"内存缓存初始化: max_size={max_size}, max_bytes={max_bytes}, default_ttl={default_ttl}")
     
-    def _start_cleanup_timer(self):
-        """启动清理定时器"""
-        def cleanup():
-            self._cleanup_expired()
-            # 重新设置定时器
-            self._cleanup_timer = threading.Timer(60.0, cleanup)  # 每分钟清理一次
-            self._cleanup_timer.daemon = True
-            self._cleanup_timer.start()
+    def _expire_due(self, limit: int) -> tuple:
+        """
+        清理已过期的缓存项（由过期调度器调用）
         
-        self._cleanup_timer = threading.Timer(60.0, cleanup)
-        self._cleanup_timer.daemon = True
-        self._cleanup_timer.start()
-    
-    def _cleanup_expired(self):
-        """清理过期的缓存项"""
+        Args:
+            limit: 最多清理的过期项数
+            
+        Returns:
+            tuple: (清理的项数, 下一次需要清理的时间；None表示没有待过期的项)
+        """
         with self._lock:
-            now = datetime.now()
-            expired_keys = []
-            
-            for key, item in self._cache.items():
-                if item.expires_at and now > item.expires_at:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self._cache[key]
-                if key in self._access_order:
-                    self._access_order.remove(key)
-                self._stats['evictions'] += 1
-            
-            if expired_keys:
-                logger.debug(f"清理过期缓存项: {len(expired_keys)} 个")
-    
-    def _update_access_order(self, key: str):
-        """更新LRU访问顺序"""
-        if key in self._access_order:
-            self._access_order.remove(key)
-        self._access_order.append(key)
-    
-    def _evict_lru(self):
-        """驱逐最近最少使用的缓存项"""
-        if self._access_order:
-            lru_key = self._access_order.pop(0)
-            if lru_key in self._cache:
-                del self._cache[lru_key]
-                self._stats['evictions'] += 1
-                logger.debug(f"LRU驱逐缓存项: {lru_key}")
+            now = time.monotonic()
+            expired = 0
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now and expired < limit:
+                expires_at, key = heapq.heappop(heap)
+                item = self._cache.get(key)
+                if item is not None and item.expires_at == expires_at:
+                    self._remove(key)
+                    self._count(item.namespace, 'expirations')
+                    expired += 1
+            
+            # 旧记录过多时按现存的缓存项重建堆
+            if len(heap) > 2 * len(self._cache) + 64:
+                heap[:] = [(item.expires_at, key) for key, item in self._cache.items()
+                           if item.expires_at is not None]
+                heapq.heapify(heap)
+            
+            self._scheduled_at = heap[0][0] if heap else None
+            next_deadline = self._scheduled_at
+        
+        if expired:
+            logger.debug(f"清理过期缓存项: {expired} 个")
+        return expired, next_deadline
+    
+    def _cache_namespace(self, key: str) -> str:
+        """键所属的命名空间"""
+        namespace, separator, _ = key.partition(self.namespace_separator)
+        return namespace if separator else self.DEFAULT_NAMESPACE
+    
+    def _count(self, namespace: str, stat: str, amount: int = 1):
+        """同时累加全局和命名空间统计（调用方持有锁）"""
+        self._stats[stat] += amount
+        stats = self._namespace_stats.get(namespace)
+        if stats is None:
+            stats = self._namespace_stats[namespace] = {
+                'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0, 'evictions': 0, 'expirations': 0
+            }
+        stats[stat] += amount
+    
+    def _remove(self, key: str) -> Optional[CacheItem]:
+        """移除缓存项并更新字节数和命名空间顺序（调用方持有锁）"""
+        item = self._cache.pop(key, None)
+        if item is not None:
+            self._current_bytes -= item.size
+            order = self._namespaces.get(item.namespace)
+            if order is not None:
+                order.pop(key, None)
+                if not order:
+                    del self._namespaces[item.namespace]
+        return item
+    
+    def _evict(self, key: str):
+        """因容量或配额驱逐缓存项（调用方持有锁）"""
+        item = self._remove(key)
+        if item is not None:
+            self._count(item.namespace, 'evictions')
+            logger.debug(f"LRU驱逐缓存项: {key}")
     
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -537,28 +1778,27 @@ class MemoryCache:
             Any: 缓存的值
         """
         with self._lock:
-            if key not in self._cache:
-                self._stats['misses'] += 1
+            item = self._cache.get(key)
+            if item is None:
+                self._count(self._cache_namespace(key), 'misses')
                 return default
             
-            item = self._cache[key]
-            now = datetime.now()
+            now = time.monotonic()
             
             # 检查是否过期
-            if item.expires_at and now > item.expires_at:
-                del self._cache[key]
-                if key in self._access_order:
-                    self._access_order.remove(key)
-                self._stats['misses'] += 1
-                self._stats['evictions'] += 1
+            if item.expires_at is not None and now > item.expires_at:
+                self._remove(key)
+                self._count(item.namespace, 'misses')
+                self._count(item.namespace, 'expirations')
                 return default
             
             # 更新访问信息
             item.access_count += 1
             item.last_access = now
-            self._update_access_order(key)
+            self._cache.move_to_end(key)
+            self._namespaces[item.namespace].move_to_end(key)
             
-            self._stats['hits'] += 1
+            self._count(item.namespace, 'hits')
             return item.value
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None):
@@ -570,28 +1810,305 @@ class MemoryCache:
             value: 缓存值
             ttl: 生存时间（秒），None表示使用默认TTL
         """
+        ttl = ttl if ttl is not None else self.default_ttl
+        namespace = self._cache_namespace(key)
+        # 在锁外估算大小，避免大对象阻塞其他线程
+        size = self.sizer(value) if self.max_bytes is not None else 0
+        
         with self._lock:
-            ttl = ttl if ttl is not None else self.default_ttl
-            now = datetime.now()
-            expires_at = now + timedelta(seconds=ttl) if ttl > 0 else None
+            self._remove(key)
+            
+            if self.max_bytes is not None and size > self.max_bytes:
+                logger.debug(f"缓存值过大，不缓存: {key} ({size} 字节)")
+                return
             
-            # 检查是否需要驱逐
-            if len(self._cache) >= self.max_size and key not in self._cache:
-                self._evict_lru()
+            # 命名空间配额
+            quota = self.namespace_quotas.get(namespace)
+            order = self._namespaces.get(namespace)
+            if quota is not None and order is not None:
+                while len(order) >= quota:
+                    self._evict(next(iter(order)))
             
-            # 创建缓存项
-            item = CacheItem(
+            # 全局条目数和字节数上限
+            while self._cache and (
+                len(self._cache) >= self.max_size or
+                (self.max_bytes is not None and self._current_bytes + size > self.max_bytes)
+            ):
+                self._evict(next(iter(self._cache)))
+            
+            now = time.monotonic()
+            expires_at = now + ttl if ttl > 0 else None
+            self._cache[key] = CacheItem(
                 value=value,
                 created_at=now,
                 expires_at=expires_at,
-                last_access=now
+                last_access=now,
+                size=size,
+                namespace=namespace
             )
+            self._namespaces.setdefault(namespace, OrderedDict())[key] = None
+            self._current_bytes += size
+            self._count(namespace, 'sets')
             
-            self._cache[key] = item
-            self._update_access_order(key)
-            self._stats['sets'] += 1
+            # 比已登记的清理时间更早时才需要通知调度器
+            schedule = False
+            if expires_at is not None:
+                heapq.heappush(self._expiry_heap, (expires_at, key))
+                if self._scheduled_at is None or expires_at < self._scheduled_at:
+                    self._scheduled_at = expires_at
+                    schedule = True
+        
+        if schedule:
+            self._scheduler.schedule(self, expires_at)
+        logger.debug(f"设置缓存: {key}, TTL: {ttl}")
+    
+    def delete(self, key: str) -> bool:
+        """
+        删除缓存项
+        
+        Args:
+            key: 缓存键
             
-            logger.debug(f"设置缓存: {key}, TTL: {ttl}")
+        Returns:
+            bool: 是否成功删除
+        """
+        with self._lock:
+            item = self._remove(key)
+            if item is None:
+                return False
+            self._count(item.namespace, 'deletes')
+        logger.debug(f"删除缓存: {key}")
+        return True
+    
+    def clear(self, namespace: Optional[str] = None):
+        """
+        清空缓存
+        
+        Args:
+            namespace: 只清空指定命名空间，None表示清空所有缓存
+        """
+        with self._lock:
+            if namespace is None:
+                cleared_count = len(self._cache)
+                self._cache.clear()
+                self._namespaces.clear()
+                self._expiry_heap.clear()
+                self._current_bytes = 0
+            else:
+                keys = list(self._namespaces.get(namespace, ()))
+                for key in keys:
+                    self._remove(key)
+                cleared_count = len(keys)
+        logger.info(f"清空缓存{f' ({namespace})' if namespace else ''}: {cleared_count} 个项目")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            Dict: 缓存统计数据
+        """
+        with self._lock:
+            total_requests = self._stats['hits'] + self._stats['misses']
+            hit_rate = (self._stats['hits'] / total_requests * 100) if total_requests > 0 else 0
+            
+            namespaces = {}
+            for namespace, stats in self._namespace_stats.items():
+                order = self._namespaces.get(namespace, ())
+                requests = stats['hits'] + stats['misses']
+                namespaces[namespace] = dict(
+                    stats,
+                    entries=len(order),
+                    bytes=sum(self._cache[key].size for key in order),
+                    quota=self.namespace_quotas.get(namespace),
+                    hit_rate=f"{(stats['hits'] / requests * 100) if requests else 0:.2f}%"
+                )
+            
+            return {
+                'max_size': self.max_size,
+                'current_size': len(self._cache),
+                'max_bytes': self.max_bytes,
+                'current_bytes': self._current_bytes,
+                'hit_rate': f"{hit_rate:.2f}%",
+                'stats': self._stats.copy(),
+                'namespaces': namespaces
+            }
+
+
+# 缓存未命中标记（与缓存的 None 区分）
+_MISSING = object()
+
+def _encode_cache_value(value: Any) -> str:
+    """
+    把缓存值编码为JSON
+    
+    Raises:
+        TypeError: 值中含有JSON不支持的类型
+        ValueError: 编码后不能原样还原（例如元组、非字符串键的字典）
+    """
+    def default(obj):
+        if isinstance(obj, _CachedValue):
+            return {'__cached_value__': [obj.value, obj.fresh_until]}
+        raise TypeError(f"不支持缓存 {type(obj).__name__} 类型的值")
+    
+    data = json.dumps(value, default=default, ensure_ascii=False, allow_nan=False)
+    if _decode_cache_value(data) != value:
+        raise ValueError("缓存值不能原样还原")
+    return data
+
+def _decode_cache_value(data: Any) -> Any:
+    """解码 _encode_cache_value 的结果；不是合法JSON时抛出 ValueError"""
+    def object_hook(obj):
+        if len(obj) == 1 and '__cached_value__' in obj:
+            value, fresh_until = obj['__cached_value__']
+            return _CachedValue(value, fresh_until)
+        return obj
+    
+    return json.loads(data, object_hook=object_hook)
+
+class DiskCache:
+    """
+    磁盘缓存
+    Disk Cache
+    
+    基于独立SQLite文件的二级缓存，与 MemoryCache 接口相同：
+    - 同一台机器上的所有机器人进程共享，进程重启或热更新后缓存仍然有效
+    - 值使用 JSON 序列化（缓存文件由多个进程共享，不能反序列化任意对象）：
+      只缓存字典、列表、字符串、数字和 None 组成的值，不能原样还原的值（例如元组、
+      非字符串键的字典、自定义对象）不写入磁盘缓存；cached 存入的 _CachedValue 单独编码
+    - 过期时间使用墙上时间，读取时惰性删除，写入时按批清理
+    - 缓存文件可以随时删除，不影响业务数据
+    """
+    
+    def __init__(self, path: str, default_ttl: int = 3600, cleanup_every: int = 500,
+                 cleanup_batch: int = 1000):
+        """
+        初始化磁盘缓存
+        
+        Args:
+            path: 缓存数据库文件路径（不能与业务数据库相同）
+            default_ttl: 默认TTL（秒）
+            cleanup_every: 每写入多少次清理一批过期项
+            cleanup_batch: 每次最多清理的过期项数
+        """
+        self.path = path
+        self.default_ttl = default_ttl
+        self.cleanup_every = cleanup_every
+        self.cleanup_batch = cleanup_batch
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        configure_connection(self._conn)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=OFF')  # 缓存丢失可以重建，不需要落盘保证
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries (expires_at)')
+        self._conn.commit()
+        
+        self._sets_since_cleanup = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'deletes': 0,
+            'expirations': 0,
+            'errors': 0
+        }
+        
+        logger.info(f"磁盘缓存初始化: {path}, default_ttl={default_ttl}")
+    
+    def get_with_expiry(self, key: str) -> tuple:
+        """
+        获取缓存值及其过期时间
+        
+        Returns:
+            tuple: (值或_MISSING, 过期时间 time.time()；None表示不过期)
+        """
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    'SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    self._stats['misses'] += 1
+                    return _MISSING, None
+                
+                value, expires_at = row
+                if expires_at is not None and time.time() > expires_at:
+                    self._conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                    self._conn.commit()
+                    self._stats['misses'] += 1
+                    self._stats['expirations'] += 1
+                    return _MISSING, None
+                
+                try:
+                    decoded = _decode_cache_value(value)
+                except ValueError:
+                    # 无法解析的值（例如旧版本写入的数据）按未命中处理并删除
+                    self._conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                    self._conn.commit()
+                    self._stats['misses'] += 1
+                    return _MISSING, None
+                
+                self._stats['hits'] += 1
+                return decoded, expires_at
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.warning(f"读取磁盘缓存失败: {key}: {e}")
+                return _MISSING, None
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        获取缓存值
+        
+        Args:
+            key: 缓存键
+            default: 默认值
+            
+        Returns:
+            Any: 缓存的值
+        """
+        value, _ = self.get_with_expiry(key)
+        return default if value is _MISSING else value
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """
+        设置缓存值
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 生存时间（秒），None表示使用默认TTL
+        """
+        ttl = ttl if ttl is not None else self.default_ttl
+        try:
+            data = _encode_cache_value(value)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"缓存值无法序列化，不写入磁盘缓存: {key}: {e}")
+            return
+        
+        with self._lock:
+            try:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, data, time.time() + ttl if ttl > 0 else None)
+                )
+                self._conn.commit()
+                self._stats['sets'] += 1
+                
+                self._sets_since_cleanup += 1
+                if self._sets_since_cleanup >= self.cleanup_every:
+                    self._sets_since_cleanup = 0
+                    self._cleanup_expired()
+            except sqlite3.Error as e:
+                self._stats['errors'] += 1
+                logger.warning(f"写入磁盘缓存失败: {key}: {e}")
     
     def delete(self, key: str) -> bool:
         """
@@ -604,22 +2121,51 @@ class MemoryCache:
             bool: 是否成功删除
         """
         with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-                if key in self._access_order:
-                    self._access_order.remove(key)
+            try:
+                cursor = self._conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._stats['errors'] += 1
+                logger.warning(f"删除磁盘缓存失败: {key}: {e}")
+                return False
+            if cursor.rowcount > 0:
                 self._stats['deletes'] += 1
-                logger.debug(f"删除缓存: {key}")
                 return True
             return False
     
-    def clear(self):
-        """清空所有缓存"""
+    def clear(self, namespace: Optional[str] = None, namespace_separator: str = ':'):
+        """
+        清空缓存
+        
+        Args:
+            namespace: 只清空指定命名空间，None表示清空所有缓存
+        """
+        with self._lock:
+            if namespace is None:
+                self._conn.execute('DELETE FROM cache_entries')
+            else:
+                prefix = namespace + namespace_separator
+                self._conn.execute(
+                    'DELETE FROM cache_entries WHERE key >= ? AND key < ?',
+                    (prefix, prefix + '\U0010ffff')
+                )
+            self._conn.commit()
+        logger.info(f"清空磁盘缓存{f' ({namespace})' if namespace else ''}")
+    
+    def _cleanup_expired(self):
+        """清理一批过期项（调用方持有锁）"""
+        cursor = self._conn.execute('''
+            DELETE FROM cache_entries WHERE rowid IN (
+                SELECT rowid FROM cache_entries WHERE expires_at < ? LIMIT ?
+            )
+        ''', (time.time(), self.cleanup_batch))
+        self._conn.commit()
+        self._stats['expirations'] += cursor.rowcount
+    
+    def close(self):
+        """关闭缓存数据库连接"""
         with self._lock:
-            cleared_count = len(self._cache)
-            self._cache.clear()
-            self._access_order.clear()
-            logger.info(f"清空缓存: {cleared_count} 个项目")
+            self._conn.close()
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -631,58 +2177,303 @@ class MemoryCache:
         with self._lock:
             total_requests = self._stats['hits'] + self._stats['misses']
             hit_rate = (self._stats['hits'] / total_requests * 100) if total_requests > 0 else 0
+            try:
+                entries = self._conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+            except sqlite3.Error:
+                entries = None
             
             return {
-                'max_size': self.max_size,
-                'current_size': len(self._cache),
+                'path': self.path,
+                'current_size': entries,
                 'hit_rate': f"{hit_rate:.2f}%",
                 'stats': self._stats.copy()
             }
 
-def cache_result(ttl: int = 3600, key_func: Optional[Callable] = None):
+class TieredCache:
+    """
+    两级缓存
+    Tiered Cache
+    
+    L1 为进程内 MemoryCache，L2 为跨进程共享的 DiskCache，接口与 MemoryCache 相同：
+    - 读取先查L1，未命中再查L2，L2命中后按剩余有效期回填L1
+    - 写入和删除同时作用于两级
     """
-    缓存装饰器
+    
+    def __init__(self, l1: MemoryCache, l2: DiskCache):
+        """
+        Args:
+            l1: 内存缓存
+            l2: 磁盘缓存
+        """
+        self.l1 = l1
+        self.l2 = l2
+        self.default_ttl = l1.default_ttl
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """获取缓存值"""
+        value = self.l1.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        
+        value, expires_at = self.l2.get_with_expiry(key)
+        if value is _MISSING:
+            return default
+        
+        # 按L2的剩余有效期回填L1（不足1秒时不回填）
+        if expires_at is None:
+            self.l1.set(key, value, 0)
+        else:
+            remaining = int(expires_at - time.time())
+            if remaining > 0:
+                self.l1.set(key, value, remaining)
+        return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """设置缓存值"""
+        ttl = ttl if ttl is not None else self.default_ttl
+        self.l1.set(key, value, ttl)
+        self.l2.set(key, value, ttl)
+    
+    def delete(self, key: str) -> bool:
+        """删除缓存项"""
+        deleted_l1 = self.l1.delete(key)
+        deleted_l2 = self.l2.delete(key)
+        return deleted_l1 or deleted_l2
+    
+    def clear(self, namespace: Optional[str] = None):
+        """清空缓存"""
+        self.l1.clear(namespace)
+        self.l2.clear(namespace, self.l1.namespace_separator)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取两级缓存的统计信息"""
+        return {
+            'l1': self.l1.get_stats(),
+            'l2': self.l2.get_stats()
+        }
+
+@dataclass
+class _CachedValue:
+    """cached 装饰器存入缓存的值（可能写入磁盘缓存，由其他进程读取）"""
+    value: Any
+    fresh_until: float             # time.time()，之后为过期但可用的旧值
+
+# 后台刷新同步函数旧值的线程池
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_executor_lock = threading.Lock()
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+    with _refresh_executor_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+        return _refresh_executor
+
+def cached(ttl: int = 300, negative_ttl: int = 30, stale_ttl: int = 0,
+           key_func: Optional[Callable] = None, cache: Optional['MemoryCache'] = None,
+           max_size: int = 500, namespace: Optional[str] = None):
+    """
+    缓存装饰器，支持同步函数和协程
     Cache Decorator
     
+    - 同一个键同时未命中时只计算一次，其他调用等待同一个结果
+    - 结果为 None 时按 negative_ttl 缓存（0 表示不缓存 None）
+    - stale_ttl > 0 时，过期后的 stale_ttl 秒内先返回旧值并在后台刷新
+    - 计算期间缓存被清空或删除（数据已变更）时，计算结果只返回给调用方，不写入缓存
+    
     Args:
         ttl: 缓存生存时间（秒）
+        negative_ttl: None 结果的缓存时间（秒）
+        stale_ttl: 过期后仍可返回旧值的时间（秒）
         key_func: 自定义键生成函数
+        cache: 使用的缓存实例，默认为每个函数单独创建
+        max_size: 单独创建缓存时的最大条目数
+        namespace: 缓存命名空间；指定且未传入 cache 时，初始化全局性能优化器后使用
+            其共享缓存（键加上命名空间前缀），之前使用单独创建的缓存
+        
+    被装饰的函数增加以下属性：cache、clear_cache()、cache_stats()、invalidate(*args, **kwargs)
     """
     def decorator(func):
-        cache = MemoryCache(max_size=500, default_ttl=ttl)
+        own_store = cache if cache is not None else MemoryCache(max_size=max_size, default_ttl=ttl)
+        
+        def get_store():
+            if cache is None and namespace is not None and _optimizer is not None:
+                return _optimizer.cache
+            return own_store
         
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # 生成缓存键
+        is_coroutine = asyncio.iscoroutinefunction(func)
+        
+        inflight: Dict[Any, Any] = {}          # 键 -> 正在计算的 Future
+        inflight_lock = threading.Lock()
+        refresh_tasks = set()                   # 持有后台刷新任务的引用
+        stats = {'computations': 0, 'coalesced': 0, 'stale_hits': 0, 'refreshes': 0,
+                 'discarded_writes': 0}
+        # 失效次数：计算前记录，写入时不一致说明结果可能读取的是失效前的数据
+        generation = [0]
+        generation_lock = threading.Lock()
+        
+        def make_key(args, kwargs) -> str:
             if key_func:
-                cache_key = key_func(*args, **kwargs)
+                key = key_func(*args, **kwargs)
             else:
                 # 默认键生成策略
                 key_parts = [func.__name__]
                 key_parts.extend(str(arg) for arg in args)
                 key_parts.extend(f"{k}={v}" for k, v in sorted(kwargs.items()))
-                cache_key = hashlib.md5("|".join(key_parts).encode()).hexdigest()
-            
-            # 尝试从缓存获取
-            result = cache.get(cache_key)
-            if result is not None:
-                return result
+                key = hashlib.md5("|".join(key_parts).encode()).hexdigest()
+            return f"{namespace}:{key}" if namespace else key
+        
+        def lookup(key: str) -> tuple:
+            """返回 (值或_MISSING, 是否为旧值)"""
+            entry = get_store().get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING, False
+            return entry.value, time.time() > entry.fresh_until
+        
+        def store_result(key: str, value: Any, read_generation: int):
+            lifetime = negative_ttl if value is None else ttl
+            if lifetime <= 0:
+                return
+            # 持锁写入：失效要么发生在写入之前（放弃写入），要么在之后（清除写入的值）
+            with generation_lock:
+                if generation[0] != read_generation:
+                    stats['discarded_writes'] += 1
+                    return
+                get_store().set(key, _CachedValue(value, time.time() + lifetime), lifetime + stale_ttl)
+        
+        def bump_generation():
+            with generation_lock:
+                generation[0] += 1
+        
+        def compute(key: str, args, kwargs) -> Any:
+            with inflight_lock:
+                future = inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = inflight[key] = Future()
+                    stats['computations'] += 1
+                else:
+                    stats['coalesced'] += 1
+            if not owner:
+                return future.result()
             
-            # 执行函数并缓存结果
-            result = func(*args, **kwargs)
-            cache.set(cache_key, result, ttl)
+            try:
+                read_generation = generation[0]
+                value = func(*args, **kwargs)
+                store_result(key, value, read_generation)
+                future.set_result(value)
+                return value
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with inflight_lock:
+                    inflight.pop(key, None)
+        
+        async def compute_async(key: str, args, kwargs) -> Any:
+            flight_key = (asyncio.get_running_loop(), key)
+            future = inflight.get(flight_key)
+            if future is not None:
+                stats['coalesced'] += 1
+                return await asyncio.shield(future)
             
-            return result
+            future = inflight[flight_key] = asyncio.get_running_loop().create_future()
+            # 没有其他调用等待时也标记异常已读取，避免 "exception was never retrieved"
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            stats['computations'] += 1
+            try:
+                read_generation = generation[0]
+                value = await func(*args, **kwargs)
+                store_result(key, value, read_generation)
+                future.set_result(value)
+                return value
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                inflight.pop(flight_key, None)
+        
+        def log_refresh_error(task):
+            refresh_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"后台刷新缓存失败 ({func.__name__}): {task.exception()}")
+        
+        if is_coroutine:
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                value, stale = lookup(key)
+                if value is _MISSING:
+                    return await compute_async(key, args, kwargs)
+                
+                if stale:
+                    stats['stale_hits'] += 1
+                    if (asyncio.get_running_loop(), key) not in inflight:
+                        stats['refreshes'] += 1
+                        task = asyncio.create_task(compute_async(key, args, kwargs))
+                        refresh_tasks.add(task)
+                        task.add_done_callback(log_refresh_error)
+                return value
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                value, stale = lookup(key)
+                if value is _MISSING:
+                    return compute(key, args, kwargs)
+                
+                if stale:
+                    stats['stale_hits'] += 1
+                    if key not in inflight:
+                        stats['refreshes'] += 1
+                        task = _get_refresh_executor().submit(compute, key, args, kwargs)
+                        refresh_tasks.add(task)
+                        task.add_done_callback(log_refresh_error)
+                return value
+        
+        def invalidate(*args, **kwargs) -> bool:
+            """删除指定参数对应的缓存"""
+            bump_generation()
+            return get_store().delete(make_key(args, kwargs))
+        
+        def clear_cache():
+            """清空该函数的缓存（共享缓存时只清空其命名空间）"""
+            bump_generation()
+            if namespace is not None:
+                own_store.clear(namespace)
+                if get_store() is not own_store:
+                    get_store().clear(namespace)
+            else:
+                own_store.clear()
+        
+        def cache_stats() -> Dict[str, Any]:
+            return dict(get_store().get_stats(), single_flight=stats.copy())
         
         # 添加缓存管理方法
-        wrapper.cache = cache
-        wrapper.clear_cache = cache.clear
-        wrapper.cache_stats = cache.get_stats
+        wrapper.cache = own_store
+        wrapper.get_cache = get_store
+        wrapper.clear_cache = clear_cache
+        wrapper.cache_stats = cache_stats
+        wrapper.invalidate = invalidate
         
         return wrapper
     
     return decorator
 
+def cache_result(ttl: int = 3600, key_func: Optional[Callable] = None):
+    """
+    缓存装饰器（旧接口，结果为 None 时不缓存）
+    Cache Decorator
+    
+    Args:
+        ttl: 缓存生存时间（秒）
+        key_func: 自定义键生成函数
+    """
+    return cached(ttl=ttl, negative_ttl=0, key_func=key_func)
+
 class PerformanceOptimizer:
     """
     性能优化器主类
@@ -691,19 +2482,25 @@ class PerformanceOptimizer:
     整合所有性能优化功能
     """
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, cache_db_path: Optional[str] = None, worker_id: Optional[str] = None,
+                 pool: Optional[ConnectionPool] = None):
         """
         初始化性能优化器
         
         Args:
             db_path: 数据库文件路径
+            cache_db_path: 磁盘二级缓存文件路径，None表示只使用内存缓存
+            worker_id: 持久化任务的租约持有者标识（每个机器人进程一个）
+            pool: 使用已有的连接池（例如 DatabaseManager 的进程级共享连接池），None表示单独创建；
+                停止时只关闭单独创建的连接池
         """
         self.db_path = db_path
         
-        # 初始化各个组件
-        self.connection_pool = ConnectionPool(db_path)
-        self.task_queue = AsyncTaskQueue()
-        self.cache = MemoryCache()
+        # 初始化各个组件（传入的共享连接池仍被 DatabaseManager 等使用，停止时不关闭）
+        self._owns_pool = pool is None
+        self.connection_pool = pool or ConnectionPool(db_path)
+        self.task_queue = AsyncTaskQueue(pool=self.connection_pool, worker_id=worker_id)
+        self.cache = TieredCache(MemoryCache(), DiskCache(cache_db_path)) if cache_db_path else MemoryCache()
         
         logger.info("性能优化器初始化完成")
     
@@ -715,7 +2512,15 @@ class PerformanceOptimizer:
     async def stop(self):
         """停止性能优化器"""
         await self.task_queue.stop()
-        self.connection_pool.close_all()
+        # 先写完批处理器中排队的写入（之后再有写入时会自动重新启动）
+        with _pool_batchers_lock:
+            batcher = _pool_batchers.get(self.connection_pool)
+        if batcher is not None:
+            await asyncio.get_running_loop().run_in_executor(None, batcher.stop)
+        if self._owns_pool:
+            self.connection_pool.close_all()
+        if isinstance(self.cache, TieredCache):
+            self.cache.l2.close()
         logger.info("性能优化器已停止")
     
     def get_all_stats(self) -> Dict[str, Any]:
@@ -729,6 +2534,7 @@ class PerformanceOptimizer:
             'connection_pool': self.connection_pool.get_stats(),
             'task_queue': self.task_queue.get_stats(),
             'cache': self.cache.get_stats(),
+            'db_locks': get_lock_stats().get_stats(),
             'timestamp': datetime.now().isoformat()
         }
 
@@ -747,18 +2553,23 @@ def get_optimizer() -> PerformanceOptimizer:
         raise RuntimeError("性能优化器未初始化，请先调用 initialize_optimizer()")
     return _optimizer
 
-def initialize_optimizer(db_path: str) -> PerformanceOptimizer:
+def initialize_optimizer(db_path: str, cache_db_path: Optional[str] = None,
+                         worker_id: Optional[str] = None,
+                         pool: Optional[ConnectionPool] = None) -> PerformanceOptimizer:
     """
     初始化全局性能优化器
     
     Args:
         db_path: 数据库文件路径
+        cache_db_path: 磁盘二级缓存文件路径，None表示只使用内存缓存
+        worker_id: 持久化任务的租约持有者标识（每个机器人进程一个）
+        pool: 使用已有的连接池，None表示单独创建
         
     Returns:
         PerformanceOptimizer: 性能优化器实例
     """
     global _optimizer
-    _optimizer = PerformanceOptimizer(db_path)
+    _optimizer = PerformanceOptimizer(db_path, cache_db_path, worker_id, pool)
     return _optimizer
 
 async def shutdown_optimizer():
@@ -3,12 +3,17 @@
 
 import logging
 import asyncio
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from telegram.constants import ParseMode
-from database import DatabaseManager
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, ExtBot
+from telegram.constants import ChatType, ParseMode
+from database import DatabaseManager, AsyncDatabaseManager, claim_remaining_seconds, get_shared_pool
+from performance_optimizer import initialize_optimizer, shutdown_optimizer
+from update_recorder import recorder_from_config
+from rate_limiter import Priority, prioritized, rate_limiter_from_config
+from metrics import BotMetrics, InstrumentedHTTPXRequest, instrument_builder
 from config_manager import ConfigManager
 from advertisement_manager import get_ad_manager, initialize_ad_manager, AdPosition
+from send_retry import describe_send_error, is_retryable_send_error, raise_for_retry
 
 # 配置日志
 logging.basicConfig(
@@ -21,10 +26,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 发布到频道的持久化任务：批准后排队发布，限流或网络错误时稍后重试，不阻塞回调处理
+PUBLISH_TASK = 'publish_submission'
+PUBLISH_MAX_ATTEMPTS = 8
+
 class PublishBot:
     def __init__(self):
         self.config = ConfigManager()
-        self.db = DatabaseManager(self.config.get_db_file())
+        db_file = self.config.get_db_file()
+        
+        # 性能优化器与 DatabaseManager、广告管理器共用进程级连接池，缓存使用内存+磁盘两级缓存
+        self.optimizer = initialize_optimizer(
+            db_file, self.config.get_cache_db_file(), worker_id='publish_bot', pool=get_shared_pool(db_file)
+        )
+        self.metrics = BotMetrics(self.config.get_metrics_host(), self.config.get_metrics_port('publish'))
+        self.recorder = recorder_from_config(self.config, 'publish')
+        self.db = AsyncDatabaseManager(DatabaseManager(db_file))
+        self.optimizer.task_queue.register_handler(PUBLISH_TASK, self._publish_task, on_dead=self._publish_dead)
         
         # 初始化广告管理器
         try:
@@ -71,17 +89,23 @@ class PublishBot:
             await update.message.reply_text("❌ 您没有权限执行此操作。")
             return
         
-        pending_submissions = self.db.get_pending_submissions()
+        # 认领第一个待审核投稿，其他审核员翻页时不会拿到同一个投稿
+        submission = await self.db.claim_next_pending(user_id)
         
-        if not pending_submissions:
+        if not submission:
             await update.message.reply_text("✅ 暂无待审核投稿。")
             return
         
-        # 发送第一个待审核投稿
-        await self.send_submission_for_review(update, pending_submissions[0])
+        pending_count = await self.db.count_pending()
+        await update.message.reply_text(f"📋 当前待审核投稿：{pending_count} 条")
+        
+        await self.send_submission_for_review(update, submission)
     
     async def send_submission_for_review(self, update, submission):
         """发送投稿供审核"""
+        # update 可能是 Update（命令）或 CallbackQuery（按钮）
+        chat = update.effective_chat if isinstance(update, Update) else update.message.chat
+        
         user_info = f"👤 投稿用户：{submission['username']} (ID: {submission['user_id']})"
         time_info = f"⏰ 投稿时间：{submission['submit_time']}"
         type_info = f"📝 内容类型：{submission['content_type']}"
@@ -101,7 +125,7 @@ class PublishBot:
                 InlineKeyboardButton("❌ 拒绝", callback_data=f"reject_{submission['id']}")
             ],
             [
-                InlineKeyboardButton("⏭️ 下一个", callback_data="next_submission"),
+                InlineKeyboardButton("⏭️ 下一个", callback_data=f"next_submission_{submission['id']}"),
                 InlineKeyboardButton("📊 统计", callback_data="show_stats")
             ]
         ]
@@ -110,7 +134,7 @@ class PublishBot:
         # 根据内容类型发送对应的消息
         if submission['content_type'] == 'text':
             full_text = header_text + f"\n📄 <b>内容：</b>\n{submission['content']}"
-            await update.effective_chat.send_message(
+            await chat.send_message(
                 text=full_text,
                 parse_mode=ParseMode.HTML,
                 reply_markup=reply_markup
@@ -120,7 +144,7 @@ class PublishBot:
             if submission['caption']:
                 caption_text += f"\n📝 <b>图片说明：</b>\n{submission['caption']}"
             
-            await update.effective_chat.send_photo(
+            await chat.send_photo(
                 photo=submission['media_file_id'],
                 caption=caption_text,
                 parse_mode=ParseMode.HTML,
@@ -131,7 +155,7 @@ class PublishBot:
             if submission['caption']:
                 caption_text += f"\n📝 <b>视频说明：</b>\n{submission['caption']}"
             
-            await update.effective_chat.send_video(
+            await chat.send_video(
                 video=submission['media_file_id'],
                 caption=caption_text,
                 parse_mode=ParseMode.HTML,
@@ -142,7 +166,7 @@ class PublishBot:
             if submission['caption']:
                 caption_text += f"\n📝 <b>文档说明：</b>\n{submission['caption']}"
             
-            await update.effective_chat.send_document(
+            await chat.send_document(
                 document=submission['media_file_id'],
                 caption=caption_text,
                 parse_mode=ParseMode.HTML,
@@ -154,22 +178,23 @@ class PublishBot:
                 caption_text += f"\n📝 <b>音频说明：</b>\n{submission['caption']}"
             
             if submission['content_type'] == 'voice':
-                await update.effective_chat.send_voice(
+                await chat.send_voice(
                     voice=submission['media_file_id'],
                     caption=caption_text,
                     parse_mode=ParseMode.HTML,
                     reply_markup=reply_markup
                 )
             else:
-                await update.effective_chat.send_audio(
+                await chat.send_audio(
                     audio=submission['media_file_id'],
                     caption=caption_text,
                     parse_mode=ParseMode.HTML,
                     reply_markup=reply_markup
                 )
     
+    @prioritized(Priority.HIGH)
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """处理回调按钮"""
+        """处理回调按钮（审核操作发出的请求优先于其他消息）"""
         query = update.callback_query
         user_id = update.effective_user.id
         user_name = update.effective_user.first_name or update.effective_user.username or "管理员"
@@ -197,47 +222,47 @@ class PublishBot:
             user_target_id = int(data.split("_")[2])
             await self.ban_user_action(query, user_target_id, user_id)
         
-        elif data == "next_submission":
-            await self.show_next_submission(query)
+        elif data.startswith("next_submission"):
+            # next_submission_<id> 携带当前投稿ID作为游标；旧按钮没有游标
+            after_id = data[len("next_submission_"):]
+            await self.show_next_submission(query, int(after_id) if after_id else None)
         
         elif data == "show_stats":
             await self.show_stats(query)
     
-    async def approve_submission(self, query, submission_id, reviewer_id):
-        """批准投稿"""
-        submission = self.db.get_submission_by_id(submission_id)
+    @staticmethod
+    def is_review_card(query) -> bool:
+        """回调是否来自审核群中的审核卡片（所有审核员可见，操作时接管私聊中的认领）"""
+        return query.message is not None and query.message.chat.type != ChatType.PRIVATE
+    
+    async def report_unavailable_submission(self, query, submission_id):
+        """状态转换未生效时说明原因"""
+        submission = await self.db.get_submission_by_id(submission_id)
         if not submission:
             await query.edit_message_text("❌ 投稿不存在或已被处理。")
-            return
-        
-        if submission['status'] != 'pending':
+        elif submission['status'] == 'claimed':
+            remaining = claim_remaining_seconds(submission) or 0
+            await query.edit_message_text(
+                f"❌ 该投稿正在由审核员 {submission['claimed_by']} 处理，"
+                f"认领约 {max(1, (remaining + 59) // 60)} 分钟后超时，也可以在审核群的审核卡片上直接处理。"
+            )
+        else:
             await query.edit_message_text(f"❌ 投稿状态已变更：{submission['status']}")
+    
+    async def approve_submission(self, query, submission_id, reviewer_id):
+        """批准投稿"""
+        # 一条语句完成状态检查和批准，并返回投稿内容
+        submission = await self.db.approve_submission(submission_id, reviewer_id)
+        if not submission:
+            await self.report_unavailable_submission(query, submission_id)
             return
         
-        # 批准投稿
-        success = self.db.approve_submission(submission_id, reviewer_id)
-        if not success:
-            await query.edit_message_text("❌ 批准失败，请重试。")
+        # 排队发布到频道，发布结果由任务更新到这条消息
+        if not await self.schedule_publish(query, submission):
             return
         
-        # 发布到频道
-        await self.publish_to_channel(submission)
-        
-        # 标记为已发布
-        self.db.mark_published(submission_id)
-        
-        success_text = f"""
-✅ <b>投稿已批准并发布</b>
-
-📄 投稿ID：{submission_id}
-👤 投稿用户：{submission['username']}
-📢 状态：已发布到频道
-
-投稿已成功发布到频道。
-        """
-        
         await query.edit_message_text(
-            success_text,
+            self._approved_text(submission, None, "⏳ 正在发布到频道..."),
             parse_mode=ParseMode.HTML
         )
         
@@ -249,19 +274,9 @@ class PublishBot:
     
     async def reject_submission(self, query, submission_id, reviewer_id):
         """拒绝投稿"""
-        submission = self.db.get_submission_by_id(submission_id)
+        submission = await self.db.reject_submission(submission_id, reviewer_id, "管理员拒绝")
         if not submission:
-            await query.edit_message_text("❌ 投稿不存在或已被处理。")
-            return
-        
-        if submission['status'] != 'pending':
-            await query.edit_message_text(f"❌ 投稿状态已变更：{submission['status']}")
-            return
-        
-        # 拒绝投稿
-        success = self.db.reject_submission(submission_id, reviewer_id, "管理员拒绝")
-        if not success:
-            await query.edit_message_text("❌ 拒绝失败，请重试。")
+            await self.report_unavailable_submission(query, submission_id)
             return
         
         success_text = f"""
@@ -286,67 +301,30 @@ class PublishBot:
         logger.info(f"管理员 {reviewer_id} 拒绝了投稿 #{submission_id}")
     
     async def approve_submission_in_group(self, query, submission_id, reviewer_id, reviewer_name):
-        """在审核群中批准投稿"""
-        submission = self.db.get_submission_by_id(submission_id)
+        """在审核群中批准投稿（多名审核员同时点击时只有一人生效）"""
+        submission = await self.db.approve_submission(submission_id, reviewer_id,
+                                                      takeover=self.is_review_card(query))
         if not submission:
-            await query.edit_message_text("❌ 投稿不存在或已被处理。")
+            await self.report_unavailable_submission(query, submission_id)
             return
         
-        if submission['status'] != 'pending':
-            await query.edit_message_text(f"❌ 投稿状态已变更：{submission['status']}")
+        # 排队发布到频道，发布结果由任务更新到这条消息
+        if not await self.schedule_publish(query, submission, reviewer_name):
             return
         
-        # 批准投稿
-        success = self.db.approve_submission(submission_id, reviewer_id)
-        if not success:
-            await query.edit_message_text("❌ 批准失败，请重试。")
-            return
+        await query.edit_message_text(
+            self._approved_text(submission, reviewer_name, "⏳ 正在发布到频道..."),
+            parse_mode=ParseMode.HTML
+        )
         
-        # 发布到频道
-        try:
-            await self.publish_to_channel(submission)
-            # 标记为已发布
-            self.db.mark_published(submission_id)
-            
-            # 更新消息显示审核结果
-            success_text = f"""
-✅ <b>投稿已批准并发布</b>
-
-📄 投稿ID：{submission_id}
-👤 投稿用户：{submission['username']}
-👨‍💼 审核员：{reviewer_name}
-📢 状态：已发布到频道
-⏰ 处理时间：{self.get_current_time()}
-
-投稿已成功发布到频道。
-            """
-            
-            await query.edit_message_text(
-                success_text,
-                parse_mode=ParseMode.HTML
-            )
-            
-            logger.info(f"管理员 {reviewer_id} ({reviewer_name}) 在审核群中批准了投稿 #{submission_id}")
-            
-        except Exception as e:
-            logger.error(f"发布投稿 #{submission_id} 失败: {e}")
-            await query.edit_message_text(f"❌ 发布失败: {str(e)}")
+        logger.info(f"管理员 {reviewer_id} ({reviewer_name}) 在审核群中批准了投稿 #{submission_id}")
     
     async def reject_submission_in_group(self, query, submission_id, reviewer_id, reviewer_name):
-        """在审核群中拒绝投稿"""
-        submission = self.db.get_submission_by_id(submission_id)
+        """在审核群中拒绝投稿（多名审核员同时点击时只有一人生效）"""
+        submission = await self.db.reject_submission(submission_id, reviewer_id, "管理员拒绝",
+                                                     takeover=self.is_review_card(query))
         if not submission:
-            await query.edit_message_text("❌ 投稿不存在或已被处理。")
-            return
-        
-        if submission['status'] != 'pending':
-            await query.edit_message_text(f"❌ 投稿状态已变更：{submission['status']}")
-            return
-        
-        # 拒绝投稿
-        success = self.db.reject_submission(submission_id, reviewer_id, "管理员拒绝")
-        if not success:
-            await query.edit_message_text("❌ 拒绝失败，请重试。")
+            await self.report_unavailable_submission(query, submission_id)
             return
         
         # 更新消息显示审核结果
@@ -371,8 +349,8 @@ class PublishBot:
     
     async def show_user_stats(self, query, user_id):
         """显示用户统计信息"""
-        stats = self.db.get_user_stats(user_id)
-        is_banned = self.db.is_user_banned(user_id)
+        stats = await self.db.get_user_stats(user_id)
+        is_banned = await self.db.is_user_banned(user_id)
         
         stats_text = f"""
 👤 <b>用户统计信息</b>
@@ -397,11 +375,11 @@ class PublishBot:
     
     async def ban_user_action(self, query, user_target_id, admin_id):
         """封禁用户操作"""
-        if self.db.is_user_banned(user_target_id):
+        if await self.db.is_user_banned(user_target_id):
             await query.message.reply_text(f"⚠️ 用户 {user_target_id} 已经被封禁。")
             return
         
-        success = self.db.ban_user(user_target_id, admin_id)
+        success = await self.db.ban_user(user_target_id, admin_id)
         if success:
             await query.message.reply_text(f"🚫 用户 {user_target_id} 已被封禁。")
         else:
@@ -412,19 +390,120 @@ class PublishBot:
         from datetime import datetime
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
+    def _approved_text(self, submission, reviewer_name, status: str, note: str = '') -> str:
+        """审核消息中显示的批准和发布状态"""
+        reviewer_line = f"👨‍💼 审核员：{reviewer_name}\n" if reviewer_name else ''
+        return f"""
+✅ <b>投稿已批准</b>
+
+📄 投稿ID：{submission['id']}
+👤 投稿用户：{submission['username']}
+{reviewer_line}📢 状态：{status}
+⏰ 处理时间：{self.get_current_time()}
+{note}"""
+    
+    async def schedule_publish(self, query, submission, reviewer_name=None) -> bool:
+        """
+        把发布任务加入持久化队列（批准后立即返回，不等待发布完成）
+        
+        Returns:
+            bool: 是否已加入队列；失败时投稿标记为发布失败
+        """
+        payload = {
+            'submission_id': submission['id'],
+            'reviewer_name': reviewer_name,
+            'chat_id': query.message.chat_id if query.message else None,
+            'message_id': query.message.message_id if query.message else None,
+        }
+        try:
+            await self.optimizer.task_queue.submit_durable(
+                PUBLISH_TASK, payload, priority=1, max_attempts=PUBLISH_MAX_ATTEMPTS
+            )
+            return True
+        except Exception as e:
+            logger.error(f"投稿 #{submission['id']} 加入发布队列失败: {e}")
+            await self.db.mark_publish_failed(submission['id'], str(e))
+            await query.edit_message_text(f"❌ 发布失败: {str(e)}")
+            return False
+    
+    async def _update_review_message(self, payload: dict, text: str):
+        """更新发起批准的审核消息（失败只记录日志，不影响发布结果）"""
+        if not payload.get('chat_id') or not payload.get('message_id'):
+            return
+        try:
+            await self.app.bot.edit_message_text(
+                text, chat_id=payload['chat_id'], message_id=payload['message_id'], parse_mode=ParseMode.HTML
+            )
+        except Exception as e:
+            logger.warning(f"更新投稿 #{payload['submission_id']} 的审核消息失败: {e}")
+    
+    @prioritized(Priority.NORMAL)
+    async def _publish_task(self, payload: dict):
+        """
+        发布到频道（PUBLISH_TASK 的处理函数）
+        
+        限流（按 retry_after）、网络错误和数据库临时错误由任务队列稍后重试，
+        其他错误直接转入死信（_publish_dead）。
+        任务至少执行一次：发送成功后、标记已发布前进程退出时，重新执行会再次发布。
+        """
+        submission = await self.db.get_submission_by_id(payload['submission_id'])
+        if not submission or submission['status'] not in ('approved', 'failed'):
+            # 已发布，或者投稿已被删除
+            return
+        
+        try:
+            await self.publish_to_channel(submission)
+        except Exception as e:
+            updated = await self.db.record_publish_attempt(submission['id'], describe_send_error(e))
+            if is_retryable_send_error(e) and updated and updated['publish_attempts'] == 1:
+                await self._update_review_message(payload, self._approved_text(
+                    submission, payload['reviewer_name'], "⏳ 等待重试发布",
+                    f"\n{describe_send_error(e)}，稍后自动重试，无需再次批准。"
+                ))
+            raise_for_retry(e)
+        
+        published = await self.db.mark_published(submission['id'])
+        attempts = published['publish_attempts'] if published else 1
+        await self._update_review_message(payload, self._approved_text(
+            submission, payload['reviewer_name'], "已发布到频道",
+            f"\n投稿已成功发布到频道（第 {attempts} 次尝试）。" if attempts > 1 else "\n投稿已成功发布到频道。"
+        ))
+    
+    async def _publish_dead(self, payload: dict, error: Exception):
+        """发布任务不再重试（错误不可重试或超过最大尝试次数）：记录发布失败"""
+        submission_id = payload['submission_id']
+        # 重新执行的死信任务对应的投稿已经是发布失败状态
+        submission = (await self.db.mark_publish_failed(submission_id, describe_send_error(error))
+                      or await self.db.get_submission_by_id(submission_id))
+        if not submission or submission['status'] != 'failed':
+            return
+        await self._update_review_message(payload, self._approved_text(
+            submission, payload['reviewer_name'], "❌ 发布失败",
+            f"\n{describe_send_error(error)}（共尝试 {submission['publish_attempts']} 次）"
+        ))
+    
     async def publish_to_channel(self, submission):
         """发布到频道（含广告）"""
         if not self.publisher_bot:
-            self.publisher_bot = Bot(token=self.config.get_publish_bot_token())
+            # 与本机器人的 Application 使用同一个 token，共用限流器
+            token = self.config.get_publish_bot_token()
+            self.publisher_bot = ExtBot(token=token, base_url=self.config.get_api_base_url(),
+                                        request=InstrumentedHTTPXRequest(),
+                                        rate_limiter=rate_limiter_from_config(self.config, token))
         
         channel_id = self.config.get_channel_id()
         
         try:
-            # 选择合适的广告
-            ads_by_position = self.ad_manager.select_ads_for_content(
-                content_type=submission['content_type'],
-                target_positions=[AdPosition.BEFORE_CONTENT, AdPosition.AFTER_CONTENT]
-            )
+            # 选择合适的广告（失败时不带广告发布，不影响投稿发布）
+            try:
+                ads_by_position = await self.db.run(
+                    self.ad_manager.select_ads_for_content,
+                    content_type=submission['content_type'],
+                    target_positions=[AdPosition.BEFORE_CONTENT, AdPosition.AFTER_CONTENT]
+                )
+            except Exception as e:
+                logger.warning(f"为投稿 #{submission['id']} 选择广告失败，不带广告发布: {e!r}")
+                ads_by_position = {}
             
             # 格式化广告
             formatted_ads = self.ad_manager.format_ads_for_display(ads_by_position)
@@ -536,36 +615,41 @@ class PublishBot:
             channel_message_id: 频道消息ID
         """
         try:
-            for position, ads in ads_by_position.items():
-                for ad in ads:
-                    self.ad_manager.record_ad_display(
-                        ad_id=ad.id,
-                        submission_id=submission_id,
-                        channel_message_id=channel_message_id,
-                        position=position
-                    )
+            # 同时提交，使同一条消息的展示记录落在同一批次中提交
+            await asyncio.gather(*[
+                self.db.run(
+                    self.ad_manager.record_ad_display,
+                    ad_id=ad.id,
+                    submission_id=submission_id,
+                    channel_message_id=channel_message_id,
+                    position=position
+                )
+                for position, ads in ads_by_position.items()
+                for ad in ads
+            ])
         except Exception as e:
             logger.warning(f"记录广告展示失败: {e}")
     
-    async def show_next_submission(self, query):
-        """显示下一个待审核投稿"""
-        pending_submissions = self.db.get_pending_submissions()
+    async def show_next_submission(self, query, after_id: int = None):
+        """显示下一个待审核投稿（到达队尾后从队首重新开始）"""
+        # 释放当前投稿的认领并认领下一个
+        submission = await self.db.claim_next_pending(query.from_user.id, after_id=after_id)
         
-        if not pending_submissions:
+        if not submission:
             await query.edit_message_text("✅ 暂无待审核投稿。")
             return
         
-        await self.send_submission_for_review(query, pending_submissions[0])
+        await self.send_submission_for_review(query, submission)
     
     async def show_next_submission_inline(self, query):
         """内联显示下一个待审核投稿"""
-        pending_submissions = self.db.get_pending_submissions()
+        submission = await self.db.claim_next_pending(query.from_user.id)
         
-        if not pending_submissions:
+        if not submission:
             await query.message.reply_text("✅ 暂无更多待审核投稿。")
             return
         
-        await self.send_submission_for_review(query, pending_submissions[0])
+        await self.send_submission_for_review(query, submission)
     
     async def show_stats(self, query):
         """显示统计信息"""
@@ -590,51 +674,23 @@ class PublishBot:
             return
         
         # 获取各种统计数据
-        import sqlite3
-        conn = sqlite3.connect(self.config.get_db_file())
-        cursor = conn.cursor()
-        
-        # 获取投稿统计
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total,
-                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending,
-                COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved,
-                COUNT(CASE WHEN status = 'published' THEN 1 END) as published,
-                COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected
-            FROM submissions
-        ''')
-        
-        stats = cursor.fetchone()
-        
-        # 获取今日投稿数
-        cursor.execute('''
-            SELECT COUNT(*) FROM submissions 
-            WHERE DATE(submit_time) = DATE('now')
-        ''')
-        today_submissions = cursor.fetchone()[0]
-        
-        # 获取活跃用户数
-        cursor.execute('SELECT COUNT(DISTINCT user_id) FROM submissions')
-        unique_users = cursor.fetchone()[0]
-        
-        conn.close()
+        stats = await self.db.get_global_stats()
         
         stats_text = f"""
 📊 <b>系统统计信息</b>
 
 📝 <b>投稿统计：</b>
-• 总投稿数：{stats[0]}
-• 待审核：{stats[1]}
-• 已批准：{stats[2]}
-• 已发布：{stats[3]}
-• 已拒绝：{stats[4]}
+• 总投稿数：{stats['total']}
+• 待审核：{stats['pending']}
+• 已批准：{stats['approved']}
+• 已发布：{stats['published']}
+• 已拒绝：{stats['rejected']}
 
 📅 <b>今日数据：</b>
-• 今日投稿：{today_submissions}
+• 今日投稿：{stats['today']}
 
 👥 <b>用户统计：</b>
-• 投稿用户数：{unique_users}
+• 投稿用户数：{stats['unique_users']}
 
 系统运行正常 ✅
         """
@@ -680,10 +736,34 @@ class PublishBot:
             parse_mode=ParseMode.HTML
         )
     
+    async def post_init(self, application: Application):
+        """应用启动后启动性能优化器和指标服务（任务队列需要在事件循环中启动）"""
+        await self.optimizer.start()
+        await self.metrics.start()
+    
+    async def post_shutdown(self, application: Application):
+        """应用关闭后停止指标服务和性能优化器，未完成的持久化任务交还给队列"""
+        await self.metrics.stop()
+        await shutdown_optimizer()
+        if self.recorder is not None:
+            self.recorder.close()
+    
     def run(self):
         """启动机器人"""
         # 创建应用
-        self.app = Application.builder().token(self.config.get_publish_bot_token()).build()
+        self.app = (
+            instrument_builder(Application.builder())
+            .token(self.config.get_publish_bot_token())
+            .base_url(self.config.get_api_base_url())
+            .rate_limiter(rate_limiter_from_config(self.config, self.config.get_publish_bot_token()))
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
+        
+        # 录制收到的更新（需要在配置中开启）
+        if self.recorder is not None:
+            self.recorder.attach(self.app)
         
         # 添加处理器
         self.app.add_handler(CommandHandler("start", self.start_command))
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bot API 限流模块
+Bot API Rate Limiter Module
+
+按 Telegram 的发送限制对同一 token 的全部请求做令牌桶限流（PTB 的 BaseRateLimiter，
+用于 Application 和 ExtBot）：
+
+- 全局: 每秒约 30 个请求（getUpdates 不经过限流）
+- 群组和频道: 每个聊天每分钟 20 条新消息
+- 私聊: 每个聊天每秒 1 条新消息
+
+编辑消息、回答回调只占用全局令牌。等待令牌的请求按优先级放行：
+审核操作（回调处理、回答回调、编辑消息）优先于普通消息，普通消息优先于批量通知。
+收到 RetryAfter 时对应的令牌桶暂停 retry_after 秒，异常继续抛出由调用方处理。
+
+同一进程内同一 token 的 Application、ExtBot 共用一个限流器（rate_limiter_from_config）；
+不同进程之间不协调：发布机器人的 token 在发布机器人和投稿机器人两个进程中使用，
+每个进程只使用配置速率的 publish_token_share（ConfigManager.get_rate_limits）。
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from enum import IntEnum
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import FLOOD_WAITS, RATE_LIMIT_WAIT
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """请求优先级（数值小的先放行）"""
+    HIGH = 0      # 审核操作
+    NORMAL = 1    # 普通消息
+    LOW = 2       # 批量通知
+
+# 默认优先级为 HIGH 的方法（对用户操作的即时响应）
+HIGH_PRIORITY_METHODS = {'answerCallbackQuery', 'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'}
+
+# 占用聊天令牌的方法（产生新消息）
+_NEW_MESSAGE_PREFIXES = ('send', 'copyMessage', 'forwardMessage')
+
+# 聊天令牌桶数量超过此值时清理空闲的令牌桶
+MAX_CHAT_BUCKETS = 1000
+
+_priority: ContextVar[Optional[Priority]] = ContextVar('send_priority', default=None)
+
+@contextmanager
+def send_priority(priority: Priority):
+    """在 with 块内发出的请求使用指定优先级"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def prioritized(priority: Priority):
+    """处理器装饰器：处理器内发出的请求使用指定优先级"""
+    def decorator(callback):
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            with send_priority(priority):
+                return await callback(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class TokenBucket:
+    """
+    令牌桶
+    Token Bucket
+
+    令牌不足时按 (优先级, 到达顺序) 排队，只在事件循环线程中使用。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 令牌桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.paused_until = 0.0          # time.monotonic()，RetryAfter 暂停结束时间
+        self._updated = time.monotonic()
+        self._waiters: list = []          # (priority, seq, future)
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def idle(self) -> bool:
+        """没有排队的请求且令牌已满"""
+        self._refill(time.monotonic())
+        return not self._waiters and self.tokens >= self.capacity and time.monotonic() >= self.paused_until
+
+    async def acquire(self, priority: Priority = Priority.NORMAL):
+        """取得一个令牌，必要时等待"""
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and self.tokens >= 1 and now >= self.paused_until:
+            self.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        self._schedule()
+        await future
+
+    def pause(self, seconds: float):
+        """暂停发放令牌（收到 RetryAfter 时），暂停期间不补充令牌，结束后最多立即放行一个请求"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 1.0)
+        self._updated = self.paused_until
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None or not self._waiters:
+            return
+        now = time.monotonic()
+        delay = max(self.paused_until - now, 0.0, (1 - self.tokens) / self.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        now = time.monotonic()
+        if now >= self.paused_until:
+            self._refill(now)
+            while self._waiters and self.tokens >= 1:
+                _, _, future = heapq.heappop(self._waiters)
+                # 等待中被取消的请求不占用令牌
+                if not future.done():
+                    self.tokens -= 1
+                    future.set_result(None)
+            # 清理队首已取消的请求
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+        self._schedule()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+def _chat_key(chat_id: Any) -> Optional[str]:
+    if chat_id is None:
+        return None
+    return str(chat_id)
+
+def _is_group(chat_key: str) -> bool:
+    """群组、频道的ID为负数，频道也可以用 @用户名"""
+    return chat_key.startswith('-') or chat_key.startswith('@')
+
+def _seconds(retry_after: Union[int, float, timedelta]) -> float:
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class PriorityRateLimiter(BaseRateLimiter[Dict[str, Any]]):
+    """
+    按优先级排队的令牌桶限流器
+    Priority Token Bucket Rate Limiter
+
+    rate_limit_args 可以是 {'priority': Priority.LOW}，否则使用 send_priority() 设置的优先级，
+    都没有时回答回调和编辑消息为 HIGH，其他为 NORMAL。
+    """
+
+    def __init__(self, global_per_second: float = 30.0, group_per_minute: float = 20.0,
+                 chat_per_second: float = 1.0):
+        """
+        Args:
+            global_per_second: 全局每秒请求数
+            group_per_minute: 每个群组/频道每分钟消息数
+            chat_per_second: 每个私聊每秒消息数
+        """
+        self.global_per_second = global_per_second
+        self.group_per_minute = group_per_minute
+        self.chat_per_second = chat_per_second
+
+        self._global = TokenBucket(global_per_second, global_per_second)
+        self._chats: Dict[str, TokenBucket] = {}
+        self._stats = {
+            'requests': 0,
+            'delayed': 0,
+            'flood_waits': 0,
+        }
+
+    async def initialize(self) -> None:
+        """多个 Bot 共用同一个限流器，无需初始化"""
+
+    async def shutdown(self) -> None:
+        """令牌桶不持有资源，无需关闭"""
+
+    def _chat_bucket(self, chat_key: str) -> TokenBucket:
+        bucket = self._chats.get(chat_key)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                for key in [key for key, b in self._chats.items() if b.idle]:
+                    del self._chats[key]
+            if _is_group(chat_key):
+                bucket = TokenBucket(self.group_per_minute / 60, self.group_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_per_second, 1)
+            self._chats[chat_key] = bucket
+        return bucket
+
+    @staticmethod
+    def _priority(endpoint: str, rate_limit_args: Optional[Dict[str, Any]]) -> Priority:
+        if rate_limit_args and 'priority' in rate_limit_args:
+            return Priority(rate_limit_args['priority'])
+        priority = _priority.get()
+        if priority is not None:
+            return priority
+        return Priority.HIGH if endpoint in HIGH_PRIORITY_METHODS else Priority.NORMAL
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        priority = self._priority(endpoint, rate_limit_args)
+        chat_key = _chat_key(data.get('chat_id')) if endpoint.startswith(_NEW_MESSAGE_PREFIXES) else None
+        chat_bucket = self._chat_bucket(chat_key) if chat_key is not None else None
+
+        start = time.monotonic()
+        if chat_bucket is not None:
+            await chat_bucket.acquire(priority)
+        await self._global.acquire(priority)
+        waited = time.monotonic() - start
+
+        self._stats['requests'] += 1
+        if waited > 0.001:
+            self._stats['delayed'] += 1
+        RATE_LIMIT_WAIT.observe(waited, priority.name.lower())
+
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter as e:
+            retry_after = _seconds(e.retry_after)
+            self._stats['flood_waits'] += 1
+            FLOOD_WAITS.inc(endpoint)
+            # 发送新消息时可能只是该聊天超限，其他请求暂停整个 token
+            (chat_bucket or self._global).pause(retry_after)
+            logger.warning(f"{endpoint} 触发限流 (chat={chat_key})，暂停 {retry_after:.0f} 秒")
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取限流统计信息
+
+        Returns:
+            Dict: 各项配置、排队数和累计请求/延迟/限流次数
+        """
+        return {
+            'global_per_second': self.global_per_second,
+            'group_per_minute': self.group_per_minute,
+            'chat_per_second': self.chat_per_second,
+            'waiting': self._global.waiting + sum(b.waiting for b in self._chats.values()),
+            'chat_buckets': len(self._chats),
+            'paused_for': round(max(0.0, self._global.paused_until - time.monotonic()), 3),
+            'stats': self._stats.copy(),
+        }
+
+# 每个 token 一个限流器（同一 token 的 Application 和 ExtBot 共用）
+_limiters: Dict[str, PriorityRateLimiter] = {}
+
+def get_rate_limiter(token: str, **limits) -> PriorityRateLimiter:
+    """
+    获取 token 对应的限流器，不存在时按 limits 创建
+
+    Args:
+        token: 机器人 token
+        **limits: PriorityRateLimiter 的参数
+    """
+    limiter = _limiters.get(token)
+    if limiter is None:
+        limiter = _limiters[token] = PriorityRateLimiter(**limits)
+    return limiter
+
+def rate_limiter_from_config(config, token: str) -> Optional[PriorityRateLimiter]:
+    """
+    按配置获取 token 对应的限流器
+
+    Args:
+        config: ConfigManager
+        token: 机器人 token
+
+    Returns:
+        Optional[PriorityRateLimiter]: 配置中关闭限流时返回None
+    """
+    limits = config.get_rate_limits(token)
+    if limits is None:
+        return None
+    return get_rate_limiter(token, **limits)
@@ -29,10 +29,13 @@ import threading
 from queue import Queue, Empty
 import weakref
 
+from config_manager import ConfigManager
+
 # 尝试导入Telegram相关库
 try:
-    from telegram import Bot
     from telegram.constants import ParseMode
+    from telegram.ext import ExtBot
+    from rate_limiter import Priority, rate_limiter_from_config, send_priority
     TELEGRAM_AVAILABLE = True
 except ImportError:
     TELEGRAM_AVAILABLE = False
@@ -381,19 +384,23 @@ class TelegramNotifier:
     通过Telegram发送通知消息
     """
     
-    def __init__(self, bot_token: str = None):
+    def __init__(self, bot_token: str = None, config: Optional[ConfigManager] = None):
         """
         初始化Telegram通知器
         
         Args:
             bot_token: 机器人Token
+            config: 配置管理器（Bot API 地址和限流配置），None表示加载默认配置
         """
         self.bot_token = bot_token
-        self.bot: Optional[Bot] = None
+        self.bot: Optional['ExtBot'] = None
         
         if TELEGRAM_AVAILABLE and bot_token:
             try:
-                self.bot = Bot(token=bot_token)
+                config = config or ConfigManager()
+                # 与同一 token 的其他 Bot 共用限流器，通知以最低优先级排队
+                self.bot = ExtBot(token=bot_token, base_url=config.get_api_base_url(),
+                                  rate_limiter=rate_limiter_from_config(config, bot_token))
                 logger.info("Telegram通知器初始化完成")
             except Exception as e:
                 logger.error(f"Telegram Bot初始化失败: {e}")
@@ -422,11 +429,12 @@ class TelegramNotifier:
             if event.target_users:
                 for user_id in event.target_users:
                     try:
-                        await self.bot.send_message(
-                            chat_id=user_id,
-                            text=message,
-                            parse_mode=ParseMode.HTML
-                        )
+                        with send_priority(Priority.LOW):
+                            await self.bot.send_message(
+                                chat_id=user_id,
+                                text=message,
+                                parse_mode=ParseMode.HTML
+                            )
                         logger.debug(f"通知已发送给用户: {user_id}")
                     except Exception as e:
                         logger.error(f"发送通知给用户失败: {user_id}: {e}")
@@ -436,11 +444,12 @@ class TelegramNotifier:
             if event.target_groups:
                 for group_id in event.target_groups:
                     try:
-                        await self.bot.send_message(
-                            chat_id=group_id,
-                            text=message,
-                            parse_mode=ParseMode.HTML
-                        )
+                        with send_priority(Priority.LOW):
+                            await self.bot.send_message(
+                                chat_id=group_id,
+                                text=message,
+                                parse_mode=ParseMode.HTML
+                            )
                         logger.debug(f"通知已发送给群组: {group_id}")
                     except Exception as e:
                         logger.error(f"发送通知给群组失败: {group_id}: {e}")
@@ -513,17 +522,18 @@ class NotificationManager:
     整合所有通知功能
     """
     
-    def __init__(self, bot_token: str = None):
+    def __init__(self, bot_token: str = None, config: Optional[ConfigManager] = None):
         """
         初始化通知管理器
         
         Args:
             bot_token: Telegram机器人Token
+            config: 配置管理器，None表示加载默认配置
         """
         # 初始化组件
         self.event_bus = EventBus()
         self.notification_queue = NotificationQueue()
-        self.telegram_notifier = TelegramNotifier(bot_token)
+        self.telegram_notifier = TelegramNotifier(bot_token, config)
         
         # 通知规则
         self.rules: Dict[str, NotificationRule] = {}
@@ -741,18 +751,20 @@ def get_notification_manager() -> NotificationManager:
         raise RuntimeError("通知管理器未初始化，请先调用 initialize_notification_manager()")
     return _notification_manager
 
-def initialize_notification_manager(bot_token: str = None) -> NotificationManager:
+def initialize_notification_manager(bot_token: str = None,
+                                    config: Optional[ConfigManager] = None) -> NotificationManager:
     """
     初始化全局通知管理器
     
     Args:
         bot_token: Telegram机器人Token
+        config: 配置管理器，None表示加载默认配置
         
     Returns:
         NotificationManager: 通知管理器实例
     """
     global _notification_manager
-    _notification_manager = NotificationManager(bot_token)
+    _notification_manager = NotificationManager(bot_token, config)
     return _notification_manager
 
 async def notify(type: NotificationType,
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+发送失败分类
+Send Error Classification
+
+持久化任务（AsyncTaskQueue.submit_durable）中发送 Telegram 消息失败时，
+按错误类型决定是否重试：
+
+- 可重试: RetryAfter（按 retry_after 重试）、超时和网络错误、
+  发送前的数据库超时和 sqlite3.OperationalError（例如 database is locked）（按队列的指数退避重试）
+- 不可重试: BadRequest、Forbidden（用户屏蔽机器人、机器人不在频道中）、
+  ChatMigrated、InvalidToken 以及其他异常
+
+不可重试的错误转换为 PermanentTaskError，任务直接转入死信，由 on_dead 记录最终结果。
+"""
+
+import asyncio
+import sqlite3
+from datetime import timedelta
+from typing import Optional
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from performance_optimizer import PermanentTaskError
+
+def is_retryable_send_error(error: BaseException) -> bool:
+    """发送失败是否可以稍后重试"""
+    if isinstance(error, RetryAfter):
+        return True
+    # AsyncDatabaseManager 调用超时、数据库被锁：稍后重试即可
+    if isinstance(error, (asyncio.TimeoutError, sqlite3.OperationalError)):
+        return True
+    # BadRequest 是 NetworkError 的子类，但请求本身有问题，重试不会成功
+    return isinstance(error, NetworkError) and not isinstance(error, BadRequest)
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """RetryAfter 要求的等待时间（秒），其他错误返回None"""
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        return None
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+def describe_send_error(error: BaseException) -> str:
+    """记录到数据库的错误说明"""
+    if isinstance(error, PermanentTaskError) and error.__cause__ is not None:
+        error = error.__cause__
+    seconds = retry_after_seconds(error)
+    if seconds is not None:
+        return f"触发 Telegram 限流，需等待 {seconds:.0f} 秒"
+    return f"{type(error).__name__}: {error}"
+
+def raise_for_retry(error: BaseException):
+    """
+    在持久化任务的处理函数中重新抛出发送异常
+
+    可重试的错误原样抛出（队列按 retry_after 或指数退避重试），
+    不可重试的错误转换为 PermanentTaskError。
+    """
+    if is_retryable_send_error(error):
+        raise error
+    raise PermanentTaskError(describe_send_error(error)) from error
@@ -6,7 +6,11 @@ import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from telegram.constants import ParseMode
-from database import DatabaseManager
+from database import DatabaseManager, AsyncDatabaseManager, get_shared_pool
+from performance_optimizer import initialize_optimizer, shutdown_optimizer
+from update_recorder import recorder_from_config
+from rate_limiter import rate_limiter_from_config
+from metrics import BotMetrics, instrument_builder
 from config_manager import ConfigManager
 from notification_service import NotificationService
 
@@ -24,8 +28,16 @@ logger = logging.getLogger(__name__)
 class SubmissionBot:
     def __init__(self):
         self.config = ConfigManager()
-        self.db = DatabaseManager(self.config.get_db_file())
-        self.notification_service = NotificationService()
+        db_file = self.config.get_db_file()
+        
+        # 性能优化器与 DatabaseManager、广告管理器共用进程级连接池，缓存使用内存+磁盘两级缓存
+        self.optimizer = initialize_optimizer(
+            db_file, self.config.get_cache_db_file(), worker_id='submission_bot', pool=get_shared_pool(db_file)
+        )
+        self.metrics = BotMetrics(self.config.get_metrics_host(), self.config.get_metrics_port('submission'))
+        self.recorder = recorder_from_config(self.config, 'submission')
+        self.db = AsyncDatabaseManager(DatabaseManager(db_file))
+        self.notification_service = NotificationService(db=self.db)
         self.app = None
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -67,11 +79,11 @@ class SubmissionBot:
         user_id = update.effective_user.id
         
         # 检查用户是否被封禁
-        if self.db.is_user_banned(user_id):
+        if await self.db.is_user_banned(user_id):
             await update.message.reply_text("❌ 您已被封禁，无法查看状态。")
             return
         
-        stats = self.db.get_user_stats(user_id)
+        stats = await self.db.get_user_stats(user_id)
         
         stats_text = f"""
 📊 <b>您的投稿统计</b>
@@ -137,14 +149,14 @@ class SubmissionBot:
         user = update.effective_user
         
         # 检查用户是否被封禁
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
         content = update.message.text
         
         # 添加到数据库
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='text',
@@ -176,7 +188,7 @@ class SubmissionBot:
         user = update.effective_user
         
         # 检查用户是否被封禁
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
@@ -184,7 +196,7 @@ class SubmissionBot:
         caption = update.message.caption or ""
         
         # 添加到数据库
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='photo',
@@ -218,7 +230,7 @@ class SubmissionBot:
         user = update.effective_user
         
         # 检查用户是否被封禁
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
@@ -226,7 +238,7 @@ class SubmissionBot:
         caption = update.message.caption or ""
         
         # 添加到数据库
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='video',
@@ -260,7 +272,7 @@ class SubmissionBot:
         user = update.effective_user
         
         # 检查用户是否被封禁
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
@@ -268,7 +280,7 @@ class SubmissionBot:
         caption = update.message.caption or ""
         
         # 添加到数据库
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='document',
@@ -303,7 +315,7 @@ class SubmissionBot:
         user = update.effective_user
         
         # 检查用户是否被封禁
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
@@ -312,7 +324,7 @@ class SubmissionBot:
         content_type = 'voice' if update.message.voice else 'audio'
         
         # 添加到数据库
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type=content_type,
@@ -345,13 +357,13 @@ class SubmissionBot:
         """处理视频消息投稿（圆形视频）"""
         user = update.effective_user
         
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
         video_note = update.message.video_note
         
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='video_note',
@@ -376,13 +388,13 @@ class SubmissionBot:
         """处理语音投稿"""
         user = update.effective_user
         
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
         voice = update.message.voice
         
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='voice',
@@ -407,13 +419,13 @@ class SubmissionBot:
         """处理贴纸投稿"""
         user = update.effective_user
         
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
         sticker = update.message.sticker
         
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='sticker',
@@ -438,14 +450,14 @@ class SubmissionBot:
         """处理动图投稿（GIF）"""
         user = update.effective_user
         
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
         animation = update.message.animation
         caption = update.message.caption or ""
         
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='animation',
@@ -472,7 +484,7 @@ class SubmissionBot:
         """处理位置投稿"""
         user = update.effective_user
         
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
@@ -481,7 +493,7 @@ class SubmissionBot:
         if location.live_period:
             location_text += f", 实时位置: {location.live_period}秒"
         
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='location',
@@ -507,7 +519,7 @@ class SubmissionBot:
         """处理联系人投稿"""
         user = update.effective_user
         
-        if self.db.is_user_banned(user.id):
+        if await self.db.is_user_banned(user.id):
             await update.message.reply_text("❌ 您已被封禁，无法投稿。")
             return
         
@@ -520,7 +532,7 @@ class SubmissionBot:
         if contact.user_id:
             contact_text += f", 用户ID: {contact.user_id}"
         
-        submission_id = self.db.add_submission(
+        submission_id = await self.db.add_submission(
             user_id=user.id,
             username=user.username or user.first_name,
             content_type='contact',
@@ -543,10 +555,34 @@ class SubmissionBot:
         logger.info(f"用户 {user.id} ({user.username}) 提交了联系人投稿 #{submission_id}")
     
 
+    async def post_init(self, application: Application):
+        """应用启动后启动性能优化器和指标服务（任务队列需要在事件循环中启动）"""
+        await self.optimizer.start()
+        await self.metrics.start()
+    
+    async def post_shutdown(self, application: Application):
+        """应用关闭后停止指标服务和性能优化器，未完成的持久化任务交还给队列"""
+        await self.metrics.stop()
+        await shutdown_optimizer()
+        if self.recorder is not None:
+            self.recorder.close()
+    
     def run(self):
         """启动机器人"""
         # 创建应用
-        self.app = Application.builder().token(self.config.get_submission_bot_token()).build()
+        self.app = (
+            instrument_builder(Application.builder())
+            .token(self.config.get_submission_bot_token())
+            .base_url(self.config.get_api_base_url())
+            .rate_limiter(rate_limiter_from_config(self.config, self.config.get_submission_bot_token()))
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
+        
+        # 录制收到的更新（需要在配置中开启）
+        if self.recorder is not None:
+            self.recorder.attach(self.app)
         
         # 添加处理器 - 只在私聊中响应命令
         self.app.add_handler(CommandHandler("start", self.start_command, filters=filters.ChatType.PRIVATE))
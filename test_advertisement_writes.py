@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+广告写入测试
+Test script for advertisement writes under lock contention
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from advertisement_manager import AdPosition, AdStatus, AdType, Advertisement, AdvertisementManager
+from database import close_shared_pool
+from db_retry import get_lock_stats
+
+def _hold_write_lock(db_file: str, seconds: float, locked: threading.Event):
+    """模拟另一个机器人进程持有写锁"""
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        locked.set()
+        time.sleep(seconds)
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+def test_writes_wait_for_the_write_lock(tmp_path):
+    """其他进程持有写锁时，创建、修改、删除广告等待写锁后成功，并计入锁等待统计"""
+    db_file = str(tmp_path / 'ads.db')
+    manager = AdvertisementManager(db_file)
+    get_lock_stats().reset()
+    try:
+        def contended(write):
+            locked = threading.Event()
+            holder = threading.Thread(target=_hold_write_lock, args=(db_file, 0.2, locked))
+            holder.start()
+            assert locked.wait(5)
+            try:
+                return write()
+            finally:
+                holder.join()
+
+        ad_id = contended(lambda: manager.create_advertisement(Advertisement(
+            id=0, name='测试广告', type=AdType.TEXT, position=AdPosition.AFTER_CONTENT,
+            content='广告内容', status=AdStatus.ACTIVE)))
+        assert contended(lambda: manager.update_advertisement(ad_id, {'priority': 5}))
+        assert manager.get_advertisement(ad_id).priority == 5
+        assert contended(lambda: manager.delete_advertisement(ad_id))
+        assert manager.get_advertisement(ad_id) is None
+
+        stats = get_lock_stats().get_stats()
+        for site in ('create_advertisement', 'update_advertisement', 'delete_advertisement'):
+            site_stats = stats[f'AdvertisementManager.{site}']
+            assert site_stats['acquisitions'] == 1 and site_stats['waits'] == 1, site
+            assert site_stats['failures'] == 0
+    finally:
+        close_shared_pool(db_file)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+权限检查测试
+Test script for admin authorization checks
+"""
+
+import os
+import sqlite3
+import sys
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from config_manager import ConfigManager
+
+SUPER_ADMIN = 123456789
+DYNAMIC_ADMIN = 555000111
+
+def _config(tmp_path, monkeypatch, db_file: str) -> ConfigManager:
+    # 切换目录，避免加载仓库中的 config.local.ini
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.ini').write_text(
+        f"[telegram]\nadmin_users = {SUPER_ADMIN}\n\n[database]\ndb_file = {db_file}\n", encoding='utf-8')
+    return ConfigManager(str(tmp_path / 'config.ini'))
+
+def test_unavailable_database_falls_back_to_super_admins(tmp_path, monkeypatch):
+    """数据库打不开时只有超级管理员通过检查，数据库恢复后重新加载动态管理员"""
+    db_dir = tmp_path / 'data'
+    config = _config(tmp_path, monkeypatch, str(db_dir / 'bot.db'))
+
+    assert config.is_super_admin(SUPER_ADMIN)
+    assert config.is_admin(SUPER_ADMIN) and not config.is_admin(DYNAMIC_ADMIN)
+    assert config.get_admin_level(SUPER_ADMIN) == 'super'
+    assert config.get_admin_level(DYNAMIC_ADMIN) == 'none'
+    assert config.authorization is None
+
+    # 数据库可用后，重试时间到达即重新创建权限检查服务
+    db_dir.mkdir()
+    conn = sqlite3.connect(str(db_dir / 'bot.db'))
+    conn.execute('CREATE TABLE dynamic_admins (user_id INTEGER UNIQUE NOT NULL, '
+                 "permissions TEXT DEFAULT 'basic', is_active BOOLEAN DEFAULT TRUE)")
+    conn.execute('INSERT INTO dynamic_admins (user_id) VALUES (?)', (DYNAMIC_ADMIN,))
+    conn.commit()
+    conn.close()
+    assert not config.is_admin(DYNAMIC_ADMIN)
+
+    config._authorization_retry_at = 0.0
+    try:
+        assert config.is_admin(DYNAMIC_ADMIN)
+        assert config.get_admin_level(DYNAMIC_ADMIN) == 'basic'
+        assert not config.is_super_admin(DYNAMIC_ADMIN)
+    finally:
+        config.authorization.close()
+
+def test_super_admin_check_does_not_touch_database(tmp_path, monkeypatch):
+    """超级管理员检查只读配置，不创建权限检查服务"""
+    config = _config(tmp_path, monkeypatch, str(tmp_path / 'bot.db'))
+    assert config.is_super_admin(SUPER_ADMIN) and not config.is_super_admin(DYNAMIC_ADMIN)
+    assert config._authorization is None
+    assert not (tmp_path / 'bot.db').exists()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+磁盘缓存和缓存装饰器测试
+Test script for the disk cache and the cached decorator
+"""
+
+import os
+import pickle
+import sys
+import threading
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from performance_optimizer import DiskCache, MemoryCache, TieredCache, cached
+
+class _Exploit:
+    """反序列化时执行代码的对象"""
+    ran = False
+
+    def __reduce__(self):
+        return (setattr, (_Exploit, 'ran', True))
+
+def test_values_are_stored_as_json(tmp_path):
+    """字典、列表和 cached 的结果可以跨进程缓存，其他类型的值不写入磁盘"""
+    cache = DiskCache(str(tmp_path / 'cache.db'))
+    try:
+        rows = [{'id': 1, 'name': '广告', 'weight': 1.5, 'tags': None}]
+        cache.set('rows', rows)
+        assert cache.get('rows') == rows
+
+        for key, value in (('tuple', (1, 2)), ('int_keys', {1: 'a'}), ('object', object())):
+            cache.set(key, value)
+            assert cache.get(key, 'missing') == 'missing', key
+    finally:
+        cache.close()
+
+def test_pickled_entries_are_never_loaded(tmp_path):
+    """缓存文件中的 pickle 数据（旧版本或被篡改）按未命中处理，不会被反序列化"""
+    cache = DiskCache(str(tmp_path / 'cache.db'))
+    try:
+        with cache._lock:
+            cache._conn.execute('INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, NULL)',
+                                ('evil', pickle.dumps(_Exploit())))
+            cache._conn.commit()
+        assert cache.get('evil', 'missing') == 'missing'
+        assert not _Exploit.ran
+        assert cache.get_stats()['current_size'] == 0
+    finally:
+        cache.close()
+
+def test_cached_result_survives_disk_round_trip(tmp_path):
+    """cached 写入两级缓存的结果在另一个进程（新的L1）中可以直接读取"""
+    path = str(tmp_path / 'cache.db')
+    calls = []
+
+    def make(l2):
+        @cached(ttl=60, cache=TieredCache(MemoryCache(), l2))
+        def load(key):
+            calls.append(key)
+            return {'key': key, 'items': [1, 2]}
+        return load
+
+    first, second = DiskCache(path), DiskCache(path)
+    try:
+        assert make(first)('a') == {'key': 'a', 'items': [1, 2]}
+        assert make(second)('a') == {'key': 'a', 'items': [1, 2]}
+        assert calls == ['a']
+    finally:
+        first.close()
+        second.close()
+
+def test_invalidation_during_compute_discards_result():
+    """计算期间缓存被清空时，读到旧数据的结果不写入缓存"""
+    data = {'value': 'old'}
+    started, proceed = threading.Event(), threading.Event()
+
+    @cached(ttl=60)
+    def load():
+        value = data['value']
+        started.set()
+        proceed.wait(5)
+        return value
+
+    result = []
+    reader = threading.Thread(target=lambda: result.append(load()))
+    reader.start()
+    assert started.wait(5)
+    # 计算读到旧值之后数据被修改，缓存随之清空
+    data['value'] = 'new'
+    load.clear_cache()
+    proceed.set()
+    reader.join(5)
+
+    assert result == ['old']
+    assert load() == 'new'
+    assert load.cache_stats()['single_flight']['discarded_writes'] == 1
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_values_are_stored_as_json, test_pickled_entries_are_never_loaded,
+                 test_cached_result_survives_disk_round_trip):
+        with tempfile.TemporaryDirectory() as directory:
+            test(Path(directory))
+    test_invalidation_during_compute_discards_result()
+    print("✅ 磁盘缓存测试通过")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bot API 限流测试
+Test script for the priority rate limiter
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from telegram.error import RetryAfter
+
+from rate_limiter import PriorityRateLimiter, Priority, TokenBucket, send_priority
+
+def test_waiters_are_released_by_priority():
+    """令牌不足时按优先级放行，同一优先级按到达顺序"""
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        await bucket.acquire()
+        order = []
+
+        async def request(name, priority):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        tasks = []
+        for name, priority in (('low', Priority.LOW), ('normal', Priority.NORMAL),
+                               ('high-1', Priority.HIGH), ('high-2', Priority.HIGH)):
+            tasks.append(asyncio.create_task(request(name, priority)))
+            await asyncio.sleep(0)
+        assert bucket.waiting == 4
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ['high-1', 'high-2', 'normal', 'low']
+
+def test_cancelled_waiter_does_not_take_a_token():
+    """等待中被取消的请求不占用令牌，后面的请求照常放行"""
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=1)
+        await bucket.acquire()
+        cancelled = asyncio.create_task(bucket.acquire(Priority.HIGH))
+        waiting = asyncio.create_task(bucket.acquire(Priority.LOW))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        start = time.monotonic()
+        await asyncio.wait_for(waiting, 1)
+        return time.monotonic() - start, bucket.waiting
+
+    elapsed, waiting = asyncio.run(run())
+    assert elapsed < 0.1 and waiting == 0
+
+def test_request_priority():
+    """rate_limit_args 优先，其次是 send_priority，最后按方法区分"""
+    resolve = PriorityRateLimiter._priority
+    assert resolve('answerCallbackQuery', None) is Priority.HIGH
+    assert resolve('sendMessage', None) is Priority.NORMAL
+    assert resolve('sendMessage', {'priority': Priority.LOW}) is Priority.LOW
+    with send_priority(Priority.LOW):
+        assert resolve('editMessageText', None) is Priority.LOW
+        assert resolve('editMessageText', {'priority': Priority.HIGH}) is Priority.HIGH
+
+def _call(limiter, endpoint, chat_id=None, error=None):
+    async def callback():
+        if error is not None:
+            raise error
+        return True
+    return limiter.process_request(callback, (), {}, endpoint, {'chat_id': chat_id}, None)
+
+def test_retry_after_pauses_only_that_chat():
+    """发送消息收到 RetryAfter 时只暂停该聊天，暂停结束后恢复发送"""
+    async def run():
+        limiter = PriorityRateLimiter(global_per_second=100, group_per_minute=600)
+        try:
+            await _call(limiter, 'sendMessage', -100, RetryAfter(0.3))
+            raise AssertionError("RetryAfter 应继续抛出")
+        except RetryAfter:
+            pass
+
+        start = time.monotonic()
+        await _call(limiter, 'sendMessage', -200)
+        await _call(limiter, 'editMessageText', -100)
+        other = time.monotonic() - start
+
+        await _call(limiter, 'sendMessage', -100)
+        paused = time.monotonic() - start
+        return other, paused, limiter.get_stats()
+
+    other, paused, stats = asyncio.run(run())
+    assert other < 0.05
+    assert 0.25 <= paused < 1.0
+    assert stats['stats']['flood_waits'] == 1 and stats['paused_for'] == 0
+
+def test_retry_after_pauses_whole_token():
+    """非发送消息的请求收到 RetryAfter 时暂停所有请求，暂停期间排队的请求仍按优先级放行"""
+    async def run():
+        limiter = PriorityRateLimiter(global_per_second=100)
+        try:
+            await _call(limiter, 'answerCallbackQuery', error=RetryAfter(0.3))
+        except RetryAfter:
+            pass
+        assert limiter.get_stats()['paused_for'] > 0.2
+
+        start = time.monotonic()
+        order = []
+
+        async def request(name, chat_id, priority):
+            with send_priority(priority):
+                await _call(limiter, 'sendMessage', chat_id)
+            order.append((name, time.monotonic() - start))
+
+        await asyncio.gather(request('notification', 42, Priority.LOW), request('review', 43, Priority.HIGH))
+        return order
+
+    order = asyncio.run(run())
+    assert [name for name, _ in order] == ['review', 'notification']
+    assert all(elapsed >= 0.25 for _, elapsed in order)
+
+if __name__ == "__main__":
+    test_waiters_are_released_by_priority()
+    test_cancelled_waiter_does_not_take_a_token()
+    test_request_priority()
+    test_retry_after_pauses_only_that_chat()
+    test_retry_after_pauses_whole_token()
+    print("✅ 限流测试通过")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+发布重试测试
+Test script for publish retry classification
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from performance_optimizer import AsyncTaskQueue, ConnectionPool, PermanentTaskError
+from publish_bot import PUBLISH_TASK, PublishBot
+from send_retry import is_retryable_send_error, raise_for_retry
+
+def test_error_classification():
+    """限流、网络错误和数据库临时错误可重试，请求本身有问题时不重试"""
+    for error in (RetryAfter(3), TimedOut(), NetworkError('reset'), asyncio.TimeoutError(),
+                  sqlite3.OperationalError('database is locked')):
+        assert is_retryable_send_error(error), error
+        try:
+            raise_for_retry(error)
+        except PermanentTaskError:
+            raise AssertionError(f"{error!r} 不应转入死信")
+        except Exception as raised:
+            assert raised is error
+
+    for error in (BadRequest('chat not found'), Forbidden('bot was blocked'), ValueError('bug')):
+        assert not is_retryable_send_error(error), error
+        try:
+            raise_for_retry(error)
+        except PermanentTaskError as raised:
+            assert raised.__cause__ is error
+
+class _FakeDatabase:
+    """只实现发布任务用到的方法的异步数据库"""
+
+    def __init__(self):
+        self.submission = {'id': 7, 'username': 'tester', 'status': 'approved', 'publish_attempts': 0,
+                           'publish_error': None}
+
+    async def get_submission_by_id(self, submission_id):
+        return dict(self.submission)
+
+    async def record_publish_attempt(self, submission_id, error):
+        self.submission.update(publish_attempts=self.submission['publish_attempts'] + 1, publish_error=error)
+        return dict(self.submission)
+
+    async def mark_published(self, submission_id):
+        self.submission.update(status='published', publish_error=None,
+                               publish_attempts=self.submission['publish_attempts'] + 1)
+        return dict(self.submission)
+
+    async def mark_publish_failed(self, submission_id, error):
+        self.submission.update(status='failed', publish_error=error)
+        return dict(self.submission)
+
+def test_transient_db_error_reschedules_publish(tmp_path):
+    """发布时数据库被锁：任务稍后重试并发布成功，不转入死信，投稿不标记为发布失败"""
+    bot = PublishBot.__new__(PublishBot)
+    bot.db = _FakeDatabase()
+    edits = []
+    sent = []
+
+    async def publish_to_channel(submission):
+        if not sent:
+            sent.append(None)
+            raise sqlite3.OperationalError('database is locked')
+        sent.append(submission['id'])
+
+    async def update_review_message(payload, text):
+        edits.append(text)
+
+    bot.publish_to_channel = publish_to_channel
+    bot._update_review_message = update_review_message
+
+    async def run():
+        pool = ConnectionPool(str(tmp_path / 'queue.db'))
+        queue = AsyncTaskQueue(pool=pool, retry_delay=0.05, poll_interval=0.05)
+        queue.register_handler(PUBLISH_TASK, bot._publish_task, on_dead=bot._publish_dead)
+        await queue.start()
+        try:
+            await queue.submit_durable(PUBLISH_TASK, {'submission_id': 7, 'reviewer_name': '审核员',
+                                                      'chat_id': -100, 'message_id': 1})
+            for _ in range(100):
+                if bot.db.submission['status'] != 'approved':
+                    break
+                await asyncio.sleep(0.05)
+            return queue.get_stats(), queue.get_dead_letters()
+        finally:
+            await queue.stop()
+            pool.close_all()
+
+    stats, dead = asyncio.run(run())
+    assert bot.db.submission['status'] == 'published'
+    assert bot.db.submission['publish_attempts'] == 2
+    assert sent == [None, 7]
+    assert dead == []
+    assert any('等待重试发布' in text for text in edits)
+    assert stats['durable']['retried'] == 1 and stats['durable']['dead_lettered'] == 0
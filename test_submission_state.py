@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+投稿状态机测试
+Test script for the submission state machine
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+import db_migrations
+from database import CLAIM_TIMEOUT, DatabaseManager, claim_remaining_seconds, close_shared_pool
+
+REVIEWER_A = 1001
+REVIEWER_B = 1002
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'state.db'))
+    yield manager
+    close_shared_pool(manager.db_file)
+
+def _submit(db) -> int:
+    return db.add_submission(42, 'tester', 'text', '测试投稿')
+
+def _expire_claim(db, submission_id: int):
+    with db.transaction() as conn:
+        conn.execute("UPDATE submissions SET claimed_at = datetime('now', ?) WHERE id = ?",
+                     (f'-{CLAIM_TIMEOUT + 1} seconds', submission_id))
+
+def _admin_log_count(db, action: str) -> int:
+    with db.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM admin_logs WHERE action = ?', (action,)).fetchone()[0]
+
+def test_double_approve(db):
+    """同一投稿只能批准一次，第二次点击不修改状态也不重复记录日志"""
+    submission_id = _submit(db)
+    assert db.approve_submission(submission_id, REVIEWER_A)['status'] == 'approved'
+    assert db.approve_submission(submission_id, REVIEWER_B) is None
+    assert db.reject_submission(submission_id, REVIEWER_B) is None
+    assert db.get_submission_by_id(submission_id)['reviewer_id'] == REVIEWER_A
+    assert _admin_log_count(db, 'approve') == 1
+
+def test_claim_blocks_other_reviewers(db):
+    """认领的投稿只有认领者可以处理，审核卡片上可以接管"""
+    submission_id = _submit(db)
+    claimed = db.claim_next_pending(REVIEWER_A)
+    assert claimed['id'] == submission_id and claimed['claimed_by'] == REVIEWER_A
+    assert 0 < claim_remaining_seconds(claimed) <= CLAIM_TIMEOUT
+
+    # 其他审核员不会认领到同一个投稿，也不能在私聊中处理
+    assert db.claim_next_pending(REVIEWER_B) is None
+    assert db.approve_submission(submission_id, REVIEWER_B) is None
+
+    rejected = db.reject_submission(submission_id, REVIEWER_B, '重复', takeover=True)
+    assert rejected['status'] == 'rejected'
+    assert rejected['claimed_by'] is None and claim_remaining_seconds(rejected) is None
+    assert db.approve_submission(submission_id, REVIEWER_A) is None
+
+def test_claimer_can_approve(db):
+    submission_id = _submit(db)
+    db.claim_next_pending(REVIEWER_A)
+    approved = db.approve_submission(submission_id, REVIEWER_A)
+    assert approved['status'] == 'approved' and approved['claimed_by'] is None
+
+def test_expired_claim(db):
+    """认领超时后其他审核员可以认领或直接处理"""
+    first, second = _submit(db), _submit(db)
+    assert db.claim_next_pending(REVIEWER_A)['id'] == first
+    _expire_claim(db, first)
+    assert claim_remaining_seconds(db.get_submission_by_id(first)) == 0
+
+    # 超时的认领被释放，B 从队首认领到同一个投稿
+    assert db.claim_next_pending(REVIEWER_B)['id'] == first
+    assert db.approve_submission(first, REVIEWER_A) is None
+
+    _expire_claim(db, first)
+    assert db.approve_submission(first, REVIEWER_A)['status'] == 'approved'
+    assert db.get_submission_by_id(second)['status'] == 'pending'
+
+def test_publish_failure_and_retry(db):
+    """approve → 发布失败 → 重试发布成功，已发布的投稿不能再标记失败"""
+    submission_id = _submit(db)
+    assert db.mark_published(submission_id) is None   # 未批准的投稿不能发布
+
+    db.approve_submission(submission_id, REVIEWER_A)
+    attempt = db.record_publish_attempt(submission_id, 'RetryAfter')
+    assert attempt['status'] == 'approved' and attempt['publish_attempts'] == 1
+
+    failed = db.mark_publish_failed(submission_id, 'BadRequest')
+    assert failed['status'] == 'failed' and failed['publish_error'] == 'BadRequest'
+    assert failed['publish_attempts'] == 1
+    assert db.mark_publish_failed(submission_id, 'again') is None
+
+    published = db.mark_published(submission_id)
+    assert published['status'] == 'published'
+    assert published['publish_error'] is None and published['publish_attempts'] == 2
+    assert db.mark_published(submission_id) is None
+    assert db.mark_publish_failed(submission_id, 'late') is None
+    assert db.record_publish_attempt(submission_id, 'late') is None
+
+def test_migrate_requires_returning_support(tmp_path, monkeypatch):
+    """SQLite 不支持 UPDATE ... RETURNING 时迁移直接失败"""
+    monkeypatch.setattr(db_migrations.sqlite3, 'sqlite_version_info', (3, 34, 1))
+    conn = sqlite3.connect(str(tmp_path / 'old.db'))
+    try:
+        with pytest.raises(RuntimeError):
+            db_migrations.migrate(conn)
+    finally:
+        conn.close()
+
+def test_user_stats_follow_state_machine(db):
+    """认领中的投稿计入待审核，发布失败的投稿计入已通过"""
+    first, second = _submit(db), _submit(db)
+    db.claim_next_pending(REVIEWER_A)
+    assert db.get_user_stats(42) == {'total': 2, 'pending': 2, 'approved': 0, 'published': 0, 'rejected': 0}
+
+    db.approve_submission(first, REVIEWER_A)
+    db.mark_publish_failed(first, 'BadRequest')
+    db.reject_submission(second, REVIEWER_B)
+    assert db.get_user_stats(42) == {'total': 2, 'pending': 0, 'approved': 1, 'published': 0, 'rejected': 1}
+
+    db.mark_published(first)
+    assert db.get_user_stats(42) == {'total': 2, 'pending': 0, 'approved': 0, 'published': 1, 'rejected': 1}
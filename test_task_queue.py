@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+持久化任务队列测试
+Test script for durable tasks in the async task queue
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from performance_optimizer import AsyncTaskQueue, ConnectionPool, PermanentTaskError
+
+async def _wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.02)
+
+def _queue(pool, worker_id: str, **kwargs) -> AsyncTaskQueue:
+    options = dict(retry_delay=0.02, poll_interval=0.02, shutdown_grace=1.0)
+    options.update(kwargs)
+    return AsyncTaskQueue(pool=pool, worker_id=worker_id, **options)
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    """领取任务的进程退出后，租约过期前其他进程不会领取，过期后重新领取执行"""
+    pool = ConnectionPool(str(tmp_path / 'queue.db'))
+    crashed = _queue(pool, 'crashed', visibility_timeout=0.3)
+    survivor = _queue(pool, 'survivor')
+    done = []
+
+    async def run():
+        task_id = await crashed.submit_durable('job', {'n': 1})
+        # 领取后不执行也不交还，模拟进程退出
+        leased = crashed._lease_tasks({'job': 1})
+        assert [row[0] for row in leased] == [task_id]
+        assert survivor._lease_tasks({'job': 1}) == []
+
+        survivor.register_handler('job', lambda payload: done.append(payload))
+        await survivor.start()
+        try:
+            await asyncio.sleep(0.1)
+            assert done == []
+            await _wait_for(lambda: done)
+            await _wait_for(lambda: survivor.get_stats()['durable']['completed'] == 1)
+        finally:
+            await survivor.stop()
+        # 原来的持有者已失去租约，不能再结束任务
+        assert not crashed._finish_task(task_id, None)
+        return survivor.get_stats()['durable']
+
+    try:
+        durable = asyncio.run(run())
+        assert done == [{'n': 1}]
+        assert durable['by_status'] == {}
+    finally:
+        pool.close_all()
+
+def test_restart_resumes_own_leases(tmp_path):
+    """同一 worker_id 重新启动时立即收回之前的租约，不等待过期"""
+    pool = ConnectionPool(str(tmp_path / 'queue.db'))
+    done = []
+
+    async def run():
+        before = _queue(pool, 'bot', visibility_timeout=3600)
+        await before.submit_durable('job', {'n': 2})
+        assert len(before._lease_tasks({'job': 1})) == 1
+
+        after = _queue(pool, 'bot', visibility_timeout=3600)
+        after.register_handler('job', lambda payload: done.append(payload))
+        await after.start()
+        try:
+            await _wait_for(lambda: done)
+        finally:
+            await after.stop()
+        return after.get_stats()['durable']
+
+    try:
+        durable = asyncio.run(run())
+        assert done == [{'n': 2}]
+        assert durable['resumed'] == 1 and durable['completed'] == 1
+    finally:
+        pool.close_all()
+
+def test_retry_then_dead_letter(tmp_path):
+    """失败的任务按次数重试，用完尝试次数后转入死信并调用 on_dead；重新入队后再次执行"""
+    pool = ConnectionPool(str(tmp_path / 'queue.db'))
+    attempts = []
+    dead = []
+    fail = [True]
+
+    def handler(payload):
+        attempts.append(time.monotonic())
+        if fail[0]:
+            raise ValueError(f"失败 {len(attempts)}")
+
+    async def run():
+        queue = _queue(pool, 'bot', max_attempts=3, retry_delay=0.05)
+        queue.register_handler('job', handler, on_dead=lambda payload, e: dead.append((payload, str(e))))
+        await queue.start()
+        try:
+            task_id = await queue.submit_durable('job', {'n': 3})
+            await _wait_for(lambda: dead)
+            durable = queue.get_stats()['durable']
+            letters = queue.get_dead_letters()
+
+            fail[0] = False
+            assert queue.requeue_dead_letter(task_id)
+            assert not queue.requeue_dead_letter(task_id)
+            await _wait_for(lambda: queue.get_stats()['durable']['completed'] == 1)
+            return task_id, durable, letters
+        finally:
+            await queue.stop()
+
+    try:
+        task_id, durable, letters = asyncio.run(run())
+        assert len(attempts) == 4
+        # 第二次重试的等待时间是第一次的两倍
+        assert attempts[2] - attempts[1] > attempts[1] - attempts[0] >= 0.045
+        assert dead == [({'n': 3}, '失败 3')]
+        assert durable['retried'] == 2 and durable['dead_lettered'] == 1
+        assert durable['by_status'] == {'dead': 1}
+        assert [(row['id'], row['attempts'], row['last_error']) for row in letters] == [
+            (task_id, 3, 'ValueError: 失败 3')]
+    finally:
+        pool.close_all()
+
+def test_permanent_error_and_retry_after(tmp_path):
+    """PermanentTaskError 直接转入死信；带 retry_after 的异常按该时间重试"""
+    pool = ConnectionPool(str(tmp_path / 'queue.db'))
+    calls = {'permanent': 0, 'limited': []}
+
+    def permanent(payload):
+        calls['permanent'] += 1
+        raise PermanentTaskError("请求无效")
+
+    class Limited(Exception):
+        retry_after = 0.3
+
+    def limited(payload):
+        calls['limited'].append(time.monotonic())
+        if len(calls['limited']) == 1:
+            raise Limited()
+
+    async def run():
+        queue = _queue(pool, 'bot', max_attempts=5)
+        queue.register_handler('permanent', permanent)
+        queue.register_handler('limited', limited)
+        await queue.start()
+        try:
+            await queue.submit_durable('permanent')
+            await queue.submit_durable('limited')
+            await _wait_for(lambda: len(calls['limited']) == 2)
+            await _wait_for(lambda: queue.get_stats()['durable']['dead_lettered'] == 1)
+            await _wait_for(lambda: queue.get_stats()['durable']['completed'] == 1)
+            return queue.get_stats()['durable']
+        finally:
+            await queue.stop()
+
+    try:
+        durable = asyncio.run(run())
+        assert calls['permanent'] == 1
+        assert calls['limited'][1] - calls['limited'][0] >= 0.28
+        assert durable['retried'] == 1 and durable['completed'] == 1
+    finally:
+        pool.close_all()
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_expired_lease_is_reclaimed, test_restart_resumes_own_leases,
+                 test_retry_then_dead_letter, test_permanent_error_and_retry_after):
+        with tempfile.TemporaryDirectory() as directory:
+            test(Path(directory))
+    print("✅ 持久化任务队列测试通过")
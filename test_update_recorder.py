@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+更新录制匿名化测试
+Test script for update recording anonymization
+"""
+
+import json
+import os
+import sys
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from update_recorder import UpdateAnonymizer
+
+USER_ID = 987654321
+FORWARD_USER_ID = 555666777
+BOT_ID = 444333222
+# 录制结果中不允许出现的原始数据
+SECRETS = [str(USER_ID), str(FORWARD_USER_ID), str(BOT_ID), 'alice_real', 'Alice', 'Wonder',
+           'bob_forward', 'Bob', 'Hidden Carol', 'helper_bot', '+8613800000000']
+
+def _user(user_id, first_name, username, is_bot=False):
+    return {'id': user_id, 'is_bot': is_bot, 'first_name': first_name, 'username': username}
+
+def _forwarded_message():
+    """用户私聊投稿机器人，转发了别人的消息"""
+    return {
+        'message': {
+            'message_id': 10,
+            'date': 1700000000,
+            'chat': {'id': USER_ID, 'type': 'private', 'first_name': 'Alice',
+                     'last_name': 'Wonder', 'username': 'alice_real'},
+            'from': _user(USER_ID, 'Alice', 'alice_real'),
+            'forward_from': _user(FORWARD_USER_ID, 'Bob', 'bob_forward'),
+            'forward_sender_name': 'Hidden Carol',
+            'forward_date': 1699999000,
+            'via_bot': _user(BOT_ID, 'Helper', 'helper_bot', is_bot=True),
+            'text': '一条投稿',
+            'contact': {'phone_number': '+8613800000000', 'first_name': 'Alice', 'user_id': USER_ID},
+        }
+    }
+
+def _review_card_callback():
+    """审核员在审核群组中点击审核卡片上的按钮"""
+    card_text = f"📝 新投稿 #42\n用户名：alice_real\n用户ID：{USER_ID}"
+    return {
+        'callback_query': {
+            'id': '1',
+            'chat_instance': 'x',
+            'from': _user(123123123, 'Reviewer', 'reviewer'),
+            'data': f'ban_user_{USER_ID}',
+            'message': {
+                'message_id': 77,
+                'date': 1700000000,
+                'chat': {'id': -1001234567890, 'type': 'supergroup', 'title': '审核群'},
+                'from': _user(BOT_ID, 'Helper', 'helper_bot', is_bot=True),
+                'text': card_text,
+                'entities': [{'type': 'bold', 'offset': 0, 'length': 8}],
+                'reply_markup': {'inline_keyboard': [
+                    [{'text': '✅ 通过', 'callback_data': 'approve_42'},
+                     {'text': '🚫 封禁', 'callback_data': f'ban_user_{USER_ID}'}],
+                    [{'text': '📊 统计', 'callback_data': f'user_stats_{USER_ID}'}],
+                ]},
+            },
+        }
+    }
+
+def test_no_personal_data_survives():
+    """转发来源、署名、审核卡片文字和按钮中的用户信息都不应写入录制"""
+    anonymizer = UpdateAnonymizer('test-salt')
+    for update in (_forwarded_message(), _review_card_callback()):
+        recorded = json.dumps(anonymizer.anonymize(update), ensure_ascii=False)
+        for secret in SECRETS:
+            assert secret not in recorded, f"{secret} 出现在录制结果中: {recorded}"
+
+def test_pseudonyms_are_consistent():
+    """同一用户在回调数据、按钮和私聊中对应同一个假名，群组ID和其他回调数据不变"""
+    anonymizer = UpdateAnonymizer('test-salt')
+    pseudonym = anonymizer.user_id(USER_ID)
+
+    message = anonymizer.anonymize(_forwarded_message())['message']
+    assert message['chat']['id'] == pseudonym
+    assert message['from']['id'] == pseudonym
+    assert message['forward_from']['id'] == anonymizer.user_id(FORWARD_USER_ID)
+    assert message['text'] == '一条投稿'
+
+    callback = anonymizer.anonymize(_review_card_callback())['callback_query']
+    assert callback['data'] == f'ban_user_{pseudonym}'
+    card = callback['message']
+    assert 'text' not in card and 'entities' not in card
+    assert card['chat']['id'] == -1001234567890
+    keyboard = card['reply_markup']['inline_keyboard']
+    assert keyboard[0][0]['callback_data'] == 'approve_42'
+    assert keyboard[0][1]['callback_data'] == f'ban_user_{pseudonym}'
+    assert keyboard[1][0]['callback_data'] == f'user_stats_{pseudonym}'
+
+if __name__ == "__main__":
+    test_no_personal_data_survives()
+    test_pseudonyms_are_consistent()
+    print("✅ 更新录制匿名化测试通过")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+写入批处理器测试
+Test script for the group-commit write batcher
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from performance_optimizer import ConnectionPool, WriteBatcher, get_pool_batcher
+
+def _pool(tmp_path) -> ConnectionPool:
+    pool = ConnectionPool(str(tmp_path / 'batcher.db'))
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)')
+        conn.commit()
+    return pool
+
+def test_one_batcher_per_pool(tmp_path):
+    """同一连接池上创建的 DatabaseManager 共用一个批处理器（一个写线程）"""
+    from database import DatabaseManager
+    pool = ConnectionPool(str(tmp_path / 'shared.db'))
+    first = DatabaseManager(str(tmp_path / 'shared.db'), pool=pool)
+    second = DatabaseManager(str(tmp_path / 'shared.db'), pool=pool)
+    try:
+        assert first.batcher is second.batcher is get_pool_batcher(pool)
+        assert get_pool_batcher(ConnectionPool(str(tmp_path / 'other.db'))) is not first.batcher
+    finally:
+        first.batcher.stop()
+        pool.close_all()
+
+def test_close_leaves_shared_resources_running(tmp_path):
+    """关闭一个 DatabaseManager 不影响共用连接池和批处理器的其他实例"""
+    from database import DatabaseManager, close_shared_pool
+    db_file = str(tmp_path / 'shared.db')
+    first = DatabaseManager(db_file)
+    second = DatabaseManager(db_file)
+    try:
+        assert first.pool is second.pool
+        first.add_submission(1, 'first', 'text', '关闭前')
+        first.close()
+        assert second.batcher._thread.is_alive()
+        submission_id = second.add_submission(2, 'second', 'text', '关闭后')
+        assert second.get_submission_by_id(submission_id)['username'] == 'second'
+    finally:
+        close_shared_pool(db_file)
+    assert not second.batcher._thread.is_alive()
+
+def test_concurrent_writes(tmp_path):
+    """多线程并发写入全部提交，且只有一个写线程"""
+    pool = _pool(tmp_path)
+    batcher = get_pool_batcher(pool)
+    writers_before = sum(1 for t in threading.enumerate() if t.name == 'db-writer')
+    try:
+        def write(i):
+            return batcher.execute('INSERT INTO items (value) VALUES (?)', (f'v{i}',)).result(timeout=10)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            ids = list(executor.map(write, range(400)))
+
+        assert len(set(ids)) == 400
+        with pool.connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 400
+        writers = sum(1 for t in threading.enumerate() if t.name == 'db-writer')
+        assert writers == writers_before + 1
+        assert batcher.get_stats()['stats']['batches'] < 400
+    finally:
+        batcher.stop()
+        pool.close_all()
+
+def test_nested_submit_does_not_deadlock(tmp_path):
+    """批量写入函数内再次提交写入时在同一事务中执行"""
+    pool = _pool(tmp_path)
+    batcher = WriteBatcher(pool)
+    try:
+        def outer(conn):
+            conn.execute("INSERT INTO items (value) VALUES ('outer')")
+            return batcher.execute("INSERT INTO items (value) VALUES ('inner')").result(timeout=5)
+
+        def failing(conn):
+            raise sqlite3.IntegrityError('失败的嵌套写入')
+
+        def outer_with_failed_inner(conn):
+            conn.execute("INSERT INTO items (value) VALUES ('kept')")
+            return batcher.submit(failing).exception(timeout=5)
+
+        assert batcher.submit(outer).result(timeout=5) is not None
+        assert isinstance(batcher.submit(outer_with_failed_inner).result(timeout=5), sqlite3.IntegrityError)
+        with pool.connection() as conn:
+            values = [row[0] for row in conn.execute('SELECT value FROM items ORDER BY id')]
+        assert values == ['outer', 'inner', 'kept']
+    finally:
+        batcher.stop()
+        pool.close_all()
+
+def test_single_write_commits_without_waiting(tmp_path):
+    """队列中只有一个写操作时不等待合并时间窗口"""
+    pool = _pool(tmp_path)
+    batcher = WriteBatcher(pool, max_delay=1.0)
+    try:
+        batcher.execute("INSERT INTO items (value) VALUES ('warmup')").result(timeout=5)
+        start = time.monotonic()
+        batcher.execute("INSERT INTO items (value) VALUES ('single')").result(timeout=5)
+        assert time.monotonic() - start < 0.5
+    finally:
+        batcher.stop()
+        pool.close_all()
+
+def test_submit_racing_stop_always_resolves(tmp_path):
+    """与 stop() 并发提交的写操作要么被执行，要么立即失败，Future 不会一直挂起"""
+    pool = _pool(tmp_path)
+    batcher = WriteBatcher(pool)
+    try:
+        def write(i):
+            future = batcher.execute('INSERT INTO items (value) VALUES (?)', (f'v{i}',))
+            if i % 50 == 0:
+                batcher.stop()
+            return future
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = list(executor.map(write, range(500)))
+        committed = 0
+        for future in futures:
+            try:
+                future.result(timeout=10)
+                committed += 1
+            except RuntimeError:
+                pass
+        with pool.connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == committed
+    finally:
+        batcher.stop()
+        pool.close_all()
+
+def test_no_restart_while_old_writer_is_committing(tmp_path):
+    """stop() 超时返回后，旧写线程退出前不会启动第二个写线程"""
+    pool = _pool(tmp_path)
+    batcher = WriteBatcher(pool)
+    release = threading.Event()
+    try:
+        def slow(conn):
+            release.wait(5)
+            return conn.execute("INSERT INTO items (value) VALUES ('slow')").lastrowid
+
+        slow_future = batcher.submit(slow)
+        time.sleep(0.05)
+        batcher.stop(timeout=0.05)
+        rejected = batcher.execute("INSERT INTO items (value) VALUES ('rejected')")
+        assert isinstance(rejected.exception(timeout=1), RuntimeError)
+
+        release.set()
+        slow_future.result(timeout=5)
+        batcher._thread.join(5)
+        assert batcher.execute("INSERT INTO items (value) VALUES ('after')").result(timeout=5)
+        with pool.connection() as conn:
+            values = [row[0] for row in conn.execute('SELECT value FROM items ORDER BY id')]
+        assert values == ['slow', 'after']
+    finally:
+        release.set()
+        batcher.stop()
+        pool.close_all()
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_one_batcher_per_pool, test_close_leaves_shared_resources_running, test_concurrent_writes,
+                 test_nested_submit_does_not_deadlock, test_single_write_commits_without_waiting,
+                 test_submit_racing_stop_always_resolves, test_no_restart_while_old_writer_is_committing):
+        with tempfile.TemporaryDirectory() as directory:
+            test(Path(directory))
+    print("✅ 写入批处理器测试通过")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+更新录制模块
+Update Recorder Module
+
+把机器人收到的更新匿名化后追加到 JSONL 文件，供 benchmarks/replay.py 按原始节奏回放，
+复现实际的媒体类型比例、相册连发和审核员点击模式：
+
+- 用户ID（含私聊ID、转发来源和按钮回调数据中的用户ID）替换为带盐的哈希，同一用户在三个机器人中一致
+- 姓名、用户名、转发署名替换为哈希派生的名字，电话号码删除，位置只保留一位小数
+- 文字和说明截断到 text_limit 个字符，file_id 替换为短哈希，图片只保留最大尺寸
+- 回调所在的消息（机器人发出的审核卡片等，含投稿人信息）不保留文字和说明
+- 群组和频道ID（负数）保留
+
+文件格式（每行一个 JSON 对象）:
+    {"type": "header", "bot": "publish", "started_at": 1700000000.0, "max_submission_id": 1234}
+    {"t": 1700000001.25, "bot": "publish", "admin": true, "u": {...Update.to_dict()...}}
+
+header 在每次开始录制时写入，max_submission_id 用于回放时把回调数据中的投稿ID
+对应到回放数据库中新产生的投稿。
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Callable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+logger = logging.getLogger(__name__)
+
+# 最先执行的处理器组，录制不影响其他处理器
+RECORDER_GROUP = -100
+
+# 回调数据中携带用户ID的按钮（例如 ban_user_<用户ID>）
+USER_ID_CALLBACK = re.compile(r'^((?:ban_user|unban_user|user_stats)_)(\d+)$')
+
+# 表示用户或私聊的对象
+_PERSON_KEYS = ('from', 'user', 'chat', 'sender_chat', 'contact', 'new_chat_member', 'left_chat_member',
+                'forward_from', 'forward_from_chat', 'via_bot')
+_NAME_FIELDS = ('first_name', 'last_name', 'username', 'title')
+# 消息中直接记录的署名
+_SIGNATURE_FIELDS = ('forward_sender_name', 'forward_signature', 'author_signature')
+# 回调所在消息中不保留的字段
+_CALLBACK_MESSAGE_FIELDS = ('text', 'caption', 'entities', 'caption_entities')
+_DROPPED_FIELDS = ('reply_to_message', 'thumbnail', 'thumb', 'phone_number', 'vcard', 'bio')
+
+class UpdateAnonymizer:
+    """
+    更新匿名化
+    Update Anonymizer
+    """
+
+    def __init__(self, salt: str, text_limit: int = 64):
+        """
+        Args:
+            salt: 哈希用户ID使用的盐
+            text_limit: 文字和说明保留的最大字符数
+        """
+        self._key = salt.encode('utf-8')
+        self.text_limit = text_limit
+
+    def _digest(self, value: str) -> str:
+        return hmac.new(self._key, value.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def user_id(self, user_id: int) -> int:
+        """用户ID的假名（稳定的十位正整数）"""
+        return 1_000_000_000 + int(self._digest(str(user_id))[:12], 16) % 9_000_000_000
+
+    def file_id(self, file_id: str) -> str:
+        return 'f' + self._digest(file_id)[:16]
+
+    def anonymize(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """匿名化 Update.to_dict() 的结果（返回新对象）"""
+        return self._walk(data, None)
+
+    def _callback_data(self, data: str) -> str:
+        match = USER_ID_CALLBACK.match(data)
+        if match:
+            return f'{match.group(1)}{self.user_id(int(match.group(2)))}'
+        return data
+
+    def _walk(self, value: Any, key: Optional[str]) -> Any:
+        if isinstance(value, list):
+            if key == 'photo' and value:
+                value = value[-1:]
+            return [self._walk(item, key) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        result = {}
+        person = key in _PERSON_KEYS
+        for k, v in value.items():
+            if k in _DROPPED_FIELDS:
+                continue
+            if key == 'callback_query' and k == 'message' and isinstance(v, dict):
+                # 审核卡片等机器人消息的文字包含投稿人的用户名和ID，截断后仍会保留
+                v = {mk: mv for mk, mv in v.items() if mk not in _CALLBACK_MESSAGE_FIELDS}
+            elif person and k in ('id', 'user_id') and isinstance(v, int) and v > 0:
+                v = self.user_id(v)
+            elif k == 'user_id' and isinstance(v, int):
+                v = self.user_id(v)
+            elif person and k in _NAME_FIELDS and isinstance(v, str) and not (k == 'title' and value.get('id', 0) < 0):
+                # 群组和频道的标题保留
+                v = 'u' + self._digest(v)[:8]
+            elif k in _SIGNATURE_FIELDS and isinstance(v, str):
+                v = 'u' + self._digest(v)[:8]
+            elif k in ('file_id', 'file_unique_id') and isinstance(v, str):
+                v = self.file_id(v)
+            elif k in ('text', 'caption') and isinstance(v, str):
+                v = v[:self.text_limit]
+            elif k in ('entities', 'caption_entities') and isinstance(v, list):
+                text = value.get('text' if k == 'entities' else 'caption') or ''
+                limit = min(len(text), self.text_limit)
+                v = [e for e in v if e.get('offset', 0) + e.get('length', 0) <= limit]
+            elif k in ('latitude', 'longitude') and isinstance(v, float):
+                v = round(v, 1)
+            elif (k == 'callback_data' or (k == 'data' and key == 'callback_query')) and isinstance(v, str):
+                # 回调本身和消息按钮（inline_keyboard）中的回调数据
+                v = self._callback_data(v)
+            result[k] = self._walk(v, k)
+        return result
+
+class UpdateRecorder:
+    """
+    更新录制
+    Update Recorder
+    """
+
+    def __init__(self, path: str, bot_name: str, anonymizer: UpdateAnonymizer,
+                 is_admin: Optional[Callable[[int], bool]] = None, db_file: Optional[str] = None):
+        """
+        Args:
+            path: JSONL 文件路径（追加写入）
+            bot_name: submission、publish 或 control
+            anonymizer: 匿名化规则
+            is_admin: 判断用户是否为管理员，结果写入记录，回放时据此配置管理员
+            db_file: 数据库文件，用于在 header 中记录当前最大投稿ID
+        """
+        self.path = path
+        self.bot_name = bot_name
+        self.anonymizer = anonymizer
+        self.is_admin = is_admin
+        self.db_file = db_file
+
+        self._file = None
+        self._lock = threading.Lock()
+        self._stats = {'recorded': 0, 'errors': 0}
+
+    def _max_submission_id(self) -> Optional[int]:
+        if not self.db_file:
+            return None
+        try:
+            with closing(sqlite3.connect(self.db_file)) as conn:
+                return conn.execute('SELECT MAX(id) FROM submissions').fetchone()[0] or 0
+        except sqlite3.Error as e:
+            logger.warning(f"读取最大投稿ID失败: {e}")
+            return None
+
+    def open(self):
+        """打开录制文件并写入 header"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._write({
+            'type': 'header',
+            'bot': self.bot_name,
+            'started_at': time.time(),
+            'max_submission_id': self._max_submission_id(),
+        })
+        logger.info(f"更新录制已开启: {self.path}")
+
+    def close(self):
+        """关闭录制文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + '\n')
+                self._file.flush()
+
+    def record(self, update: Update):
+        """录制一个更新（匿名化失败时只计数，不影响处理）"""
+        try:
+            record = {'t': round(time.time(), 3), 'bot': self.bot_name}
+            user = update.effective_user
+            if user is not None and self.is_admin is not None and self.is_admin(user.id):
+                record['admin'] = True
+            data = update.to_dict()
+            data.pop('update_id', None)
+            record['u'] = self.anonymizer.anonymize(data)
+            self._write(record)
+            self._stats['recorded'] += 1
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"录制更新失败: {e}")
+
+    async def _handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        self.record(update)
+
+    def attach(self, application: Application):
+        """注册为最先执行的处理器（不阻断后续处理器）"""
+        if self._file is None:
+            self.open()
+        application.add_handler(TypeHandler(Update, self._handle), group=RECORDER_GROUP)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+def recorder_from_config(config, bot_name: str) -> Optional[UpdateRecorder]:
+    """
+    按配置创建录制器
+
+    Args:
+        config: ConfigManager
+        bot_name: submission、publish 或 control
+
+    Returns:
+        Optional[UpdateRecorder]: 未启用录制时返回None
+    """
+    path = config.get_recording_path(bot_name)
+    if path is None:
+        return None
+    anonymizer = UpdateAnonymizer(config.get_recording_salt(), config.get_recording_text_limit())
+    return UpdateRecorder(path, bot_name, anonymizer, is_admin=config.is_admin, db_file=config.get_db_file())